@@ -1,61 +1,190 @@
 import streamlit as st
 import pandas as pd
-from bokeh.models import ColumnDataSource, HoverTool
+from bokeh.layouts import column
+from bokeh.models import HoverTool
 from bokeh.plotting import figure
 import os
+import threading
+import time
+from collections import OrderedDict
 
-def load_data_for_stock(directory, stock, period):
+from pages.utils.cache import cached, show_cache_stats, stock_key
+from pages.utils.chart_payload import shared_source
+from pages.utils.detector import DIRECTIONS, Rule, SharpMoveDetector
+from pages.utils.downsample import CHART_WIDTH, target_points
+from pages.utils.ingest import IngestWatcher
+from pages.utils.rolling import RollingStats
+from pages.utils.tick_store import STOCKS, list_periods, load_stock
+
+OVERVIEW_FEATURES = ("midPrice", "std_30s", "std_60s")
+ALERT_HORIZONS = ("tick", "1s", "10s", "60s")
+LIVE_REFRESH_SECONDS = 2
+# Alert settings whose detector stays subscribed to a live feed
+MAX_LIVE_DETECTORS = 8
+
+
+def add_overview_features(data):
+    """
+    Add the mid price and rolling std features to a stock's ticks.
+    """
+    if not data.empty:
+        data["midPrice"] = (data["bidPrice"] + data["askPrice"]) / 2
+        stats = RollingStats(("30s", "60s")).push_many(data["time_ns"].to_numpy(), data["midPrice"].to_numpy())
+        data["std_30s"] = stats[("30s", "std")]
+        data["std_60s"] = stats[("60s", "std")]
+    return data
+
+
+def load_overview_data(directory, stock, period):
+    """
+    Load a stock's data for a period and add the mid price and rolling std features.
+    """
+    return add_overview_features(load_stock(directory, stock, period))
+
+
+def detect_sharp_moves(data, stock, period, horizons, threshold, direction):
+    """
+    Replay a stock's mid prices in a period through the sharp move detector and return its alerts.
+    """
+    detector = SharpMoveDetector([Rule(horizon, threshold, direction) for horizon in horizons], keep=None)
+    detector.push_many(stock, data["timestamp"].to_numpy(), data["midPrice"].to_numpy(), period)
+    return detector.alerts_frame()
+
+
+@st.cache_resource
+def live_feed(directory):
     """
-    Load data for a single stock in a selected period.
+    One watcher per live directory, shared by every session and polling in the background.
     """
-    period_path = os.path.join(directory, period, period, stock)  # Double nested `Period` folder
-    column_names = ['bidVolume', 'bidPrice', 'askVolume', 'askPrice', 'timestamp']
-    combined_data = pd.DataFrame()
-    if os.path.exists(period_path):
-        for file in sorted(os.listdir(period_path)):
-            if file.startswith("market_data"):
-                data = pd.read_csv(
-                    os.path.join(period_path, file),
-                    header=None if "market_data_A_1.csv" in file else "infer",
-                )
-                if "market_data_A_1.csv" in file:
-                    data.columns = column_names
-                if "timestamp" in data.columns:
-                    data["timestamp"] = pd.to_datetime(data["timestamp"], errors="coerce")
-                    data = data.dropna(subset=["timestamp"])
-                    combined_data = pd.concat([combined_data, data], ignore_index=True)
-    return combined_data
+    return IngestWatcher(directory).start()
+
+
+@st.cache_resource
+def live_detectors(directory):
+    """
+    The detectors subscribed to a directory's watcher, least recently used first.
+    """
+    return OrderedDict(), threading.Lock()
+
+
+def live_alerts(directory, horizons, threshold, direction):
+    """
+    A detector fed by the live watcher as rows arrive, starting with those already ingested.
+    Only the MAX_LIVE_DETECTORS most recently used settings keep one; the
+    others are unsubscribed, so changing the settings does not feed ever more
+    detectors.
+    """
+    detectors, lock = live_detectors(directory)
+    settings = (horizons, threshold, direction)
+    with lock:
+        if settings in detectors:
+            detectors.move_to_end(settings)
+            return detectors[settings][0]
+        detector = SharpMoveDetector([Rule(horizon, threshold, direction) for horizon in horizons])
+
+        def feed(stock, period, rows):
+            detector.push_many(
+                stock, rows["timestamp"].to_numpy(), ((rows["bidPrice"] + rows["askPrice"]) / 2).to_numpy(), period
+            )
+
+        # A rewritten file sends the rows of its stock and period again from the start
+        live_feed(directory).subscribe(feed, reset=lambda stock, period: detector.reset(stock, period, alerts=True))
+        detectors[settings] = (detector, feed)
+        while len(detectors) > MAX_LIVE_DETECTORS:
+            _, (_, evicted) = detectors.popitem(last=False)
+            live_feed(directory).unsubscribe(evicted)
+        return detector
+
 
 st.title("Interactive Overview: Prices, Volumes, and Analysis")
 
 # Directory setup
 test_data_dir = "./TestData"  # Changed directory to TestData
-stocks = ["A", "B", "C", "D", "E"]
-periods = sorted(os.listdir(test_data_dir)) if os.path.exists(test_data_dir) else []
+stocks = STOCKS
+# A live feed is a directory laid out like TestData whose files are still being written
+live = st.sidebar.checkbox("Follow a live feed", value=False)
+if live:
+    test_data_dir = st.sidebar.text_input("Live data directory:", "./LiveData")
+    feed = live_feed(test_data_dir)
+    periods = feed.periods()
+    st.sidebar.caption(f"Ingested {feed.stats['rows']:,} rows from {feed.stats['files']} files")
+else:
+    periods = list_periods(test_data_dir)
 
 if os.path.exists(test_data_dir):
     selected_period = st.selectbox("Select a period:", periods)
     selected_stock = st.selectbox("Select a stock:", stocks)
 
     if selected_period and selected_stock:
-        # Load data for the selected stock
-        data = load_data_for_stock(test_data_dir, selected_stock, selected_period)
+        # Load data for the selected stock; shared with other sessions, so read-only
+        if live:
+            # The watcher's version changes with every batch it ingests for this stock
+            data = cached(
+                ("live_overview", selected_stock, selected_period, feed.version(selected_stock, selected_period),
+                 (test_data_dir, *OVERVIEW_FEATURES)),
+                lambda: add_overview_features(feed.frame(selected_stock, selected_period).copy()),
+            )
+        else:
+            data = cached(
+                stock_key("overview", test_data_dir, selected_stock, selected_period, OVERVIEW_FEATURES),
+                lambda: load_overview_data(test_data_dir, selected_stock, selected_period),
+            )
+
+        # Sharp move alerts, as the streaming detector raises them tick by tick
+        st.sidebar.subheader("Sharp move alerts")
+        alert_horizons = st.sidebar.multiselect("Horizons:", ALERT_HORIZONS, default=["10s", "60s"])
+        alert_bp = st.sidebar.number_input("Threshold (basis points):", min_value=0.1, value=2.0, step=0.5)
+        alert_direction = st.sidebar.selectbox("Direction:", DIRECTIONS, index=0)
+        alerts = None
+        if live and alert_horizons:
+            detector = live_alerts(test_data_dir, tuple(alert_horizons), alert_bp / 10000, alert_direction)
+            alerts = detector.alerts_frame(selected_stock, selected_period)
+        elif not data.empty and alert_horizons:
+            alerts = cached(
+                stock_key(
+                    "overview_alerts", test_data_dir, selected_stock, selected_period,
+                    (*alert_horizons, alert_bp, alert_direction),
+                ),
+                lambda: detect_sharp_moves(
+                    data, selected_stock, selected_period, alert_horizons, alert_bp / 10000, alert_direction
+                ),
+            )
+        show_cache_stats()
 
         if not data.empty:
-            # Compute additional features
-            data["midPrice"] = (data["bidPrice"] + data["askPrice"]) / 2
-            data.set_index("timestamp", inplace=True)
-            data["std_30s"] = data["midPrice"].rolling("30s").std()
-            data["std_60s"] = data["midPrice"].rolling("60s").std()
-            data.reset_index(inplace=True)
+            # Charts only get a few points per pixel of the visible range, so narrowing
+            # the range re-downsamples it and brings back the detail
+            min_time = data["timestamp"].iloc[0].floor("s").to_pydatetime()
+            max_time = data["timestamp"].iloc[-1].ceil("s").to_pydatetime()
+            visible_time = st.slider(
+                "Visible time range:",
+                min_value=min_time,
+                max_value=max_time,
+                value=(min_time, max_time),
+                format="HH:mm:ss",
+            )
+            visible_data = data[
+                (data["timestamp"] >= pd.Timestamp(visible_time[0])) &
+                (data["timestamp"] <= pd.Timestamp(visible_time[1]))
+            ]
+            n_points = target_points(CHART_WIDTH)
+
+            # One source with just the plotted columns, shared by every chart below
+            overview_source = shared_source(
+                visible_data,
+                {
+                    "lttb": ["bidPrice", "askPrice", "midPrice", "std_30s", "std_60s"],
+                    # Volumes are spiky, so keep each pixel's min/max rather than the LTTB shape
+                    "minmax": ["bidVolume", "askVolume"],
+                },
+                n_points,
+            )
 
             # Main graph for prices
-            st.subheader("Price Data (Bid, Ask, Mid-Price)")
-            bokeh_source_prices = ColumnDataSource(data)
             price_fig = figure(
                 x_axis_type="datetime",
                 title=f"Price Data for Stock {selected_stock} ({selected_period})",
-                plot_width=900, plot_height=400,
+                width=CHART_WIDTH, height=400,
                 tools="pan,wheel_zoom,box_zoom,reset"
             )
             hover_price = HoverTool(
@@ -68,19 +197,28 @@ if os.path.exists(test_data_dir):
                 formatters={"@timestamp": "datetime"}
             )
             price_fig.add_tools(hover_price)
-            price_fig.line("timestamp", "bidPrice", source=bokeh_source_prices, color="blue", legend_label="Bid Price")
-            price_fig.line("timestamp", "askPrice", source=bokeh_source_prices, color="red", legend_label="Ask Price")
-            price_fig.line("timestamp", "midPrice", source=bokeh_source_prices, color="green", legend_label="Mid Price")
+            price_fig.line("timestamp", "bidPrice", source=overview_source, color="blue", legend_label="Bid Price")
+            price_fig.line("timestamp", "askPrice", source=overview_source, color="red", legend_label="Ask Price")
+            price_fig.line("timestamp", "midPrice", source=overview_source, color="green", legend_label="Mid Price")
+            if alerts is not None:
+                visible_alerts = alerts[
+                    (alerts["timestamp"] >= pd.Timestamp(visible_time[0])) &
+                    (alerts["timestamp"] <= pd.Timestamp(visible_time[1]))
+                ]
+                for direction, marker, color in (("down", "inverted_triangle", "red"), ("up", "triangle", "green")):
+                    moves = visible_alerts[visible_alerts["direction"] == direction]
+                    if not moves.empty:
+                        price_fig.scatter(
+                            moves["timestamp"], moves["price"], marker=marker, size=9, color=color,
+                            legend_label=f"Sharp move {direction}",
+                        )
             price_fig.legend.location = "top_left"
-            st.bokeh_chart(price_fig, use_container_width=True)
 
             # Standard deviation graph
-            st.subheader("Standard Deviation (30s and 60s)")
-            bokeh_source_std = ColumnDataSource(data)
             std_fig = figure(
                 x_axis_type="datetime",
-                title=f"Standard Deviation for Stock {selected_stock} ({selected_period})",
-                plot_width=900, plot_height=400,
+                title=f"Standard Deviation (30s and 60s) for Stock {selected_stock} ({selected_period})",
+                width=CHART_WIDTH, height=400, x_range=price_fig.x_range,
                 tools="pan,wheel_zoom,box_zoom,reset"
             )
             hover_std = HoverTool(
@@ -92,18 +230,15 @@ if os.path.exists(test_data_dir):
                 formatters={"@timestamp": "datetime"}
             )
             std_fig.add_tools(hover_std)
-            std_fig.line("timestamp", "std_30s", source=bokeh_source_std, color="purple", legend_label="30s Std Dev", line_dash="dotted")
-            std_fig.line("timestamp", "std_60s", source=bokeh_source_std, color="orange", legend_label="60s Std Dev", line_dash="dotted")
+            std_fig.line("timestamp", "std_30s", source=overview_source, color="purple", legend_label="30s Std Dev", line_dash="dotted")
+            std_fig.line("timestamp", "std_60s", source=overview_source, color="orange", legend_label="60s Std Dev", line_dash="dotted")
             std_fig.legend.location = "top_left"
-            st.bokeh_chart(std_fig, use_container_width=True)
 
             # Volume graph
-            st.subheader("Volume Data (Bid and Ask)")
-            bokeh_source_volumes = ColumnDataSource(data)
             volume_fig = figure(
                 x_axis_type="datetime",
-                title=f"Volume Data for Stock {selected_stock} ({selected_period})",
-                plot_width=900, plot_height=400,
+                title=f"Volume Data (Bid and Ask) for Stock {selected_stock} ({selected_period})",
+                width=CHART_WIDTH, height=400, x_range=price_fig.x_range,
                 tools="pan,wheel_zoom,box_zoom,reset"
             )
             hover_volume = HoverTool(
@@ -115,20 +250,17 @@ if os.path.exists(test_data_dir):
                 formatters={"@timestamp": "datetime"}
             )
             volume_fig.add_tools(hover_volume)
-            volume_fig.line("timestamp", "bidVolume", source=bokeh_source_volumes, color="gray", legend_label="Bid Volume")
-            volume_fig.line("timestamp", "askVolume", source=bokeh_source_volumes, color="lightblue", legend_label="Ask Volume")
+            volume_fig.line("timestamp", "bidVolume", source=overview_source, color="gray", legend_label="Bid Volume")
+            volume_fig.line("timestamp", "askVolume", source=overview_source, color="lightblue", legend_label="Ask Volume")
             volume_fig.legend.location = "top_left"
-            st.bokeh_chart(volume_fig, use_container_width=True)
 
-            # Highlight low/high points
-            st.subheader("Daily Low and High Highlights")
-            low_high_source = ColumnDataSource(data)
+            # Highlight low/high points; the downsampled line always keeps the visible min/max
             daily_low = data["midPrice"].min()
             daily_high = data["midPrice"].max()
             low_high_fig = figure(
                 x_axis_type="datetime",
                 title=f"Daily Low and High for Stock {selected_stock} ({selected_period})",
-                plot_width=900, plot_height=400,
+                width=CHART_WIDTH, height=400, x_range=price_fig.x_range,
                 tools="pan,wheel_zoom,box_zoom,reset"
             )
             hover_low_high = HoverTool(
@@ -139,20 +271,34 @@ if os.path.exists(test_data_dir):
                 formatters={"@timestamp": "datetime"}
             )
             low_high_fig.add_tools(hover_low_high)
-            low_high_fig.line("timestamp", "midPrice", source=low_high_source, color="green", legend_label="Mid Price")
+            low_high_fig.line("timestamp", "midPrice", source=overview_source, color="green", legend_label="Mid Price")
             low_high_fig.circle(
-                x=data[data["midPrice"] == daily_low]["timestamp"],
+                x=data[data["midPrice"] == daily_low]["timestamp"].iloc[:1],
                 y=[daily_low],
                 size=10, color="cyan", legend_label="Daily Low"
             )
             low_high_fig.circle(
-                x=data[data["midPrice"] == daily_high]["timestamp"],
+                x=data[data["midPrice"] == daily_high]["timestamp"].iloc[:1],
                 y=[daily_high],
                 size=10, color="magenta", legend_label="Daily High"
             )
             low_high_fig.legend.location = "top_left"
-            st.bokeh_chart(low_high_fig, use_container_width=True)
+
+            # A single chart element, so the shared source is serialised once rather than per figure
+            st.subheader("Prices, Standard Deviation, Volumes and Daily Low/High")
+            st.bokeh_chart(column(price_fig, std_fig, volume_fig, low_high_fig), use_container_width=True)
+
+            if alerts is not None:
+                st.subheader(f"Sharp Move Alerts ({len(alerts)})")
+                st.dataframe(alerts.drop(columns=["time_ns"]), use_container_width=True)
         else:
             st.warning(f"No data found for Stock {selected_stock} in {selected_period}.")
+elif live:
+    st.info(f"Waiting for data in {test_data_dir}...")
 else:
     st.error("TestData directory does not exist. Please check the path.")
+
+if live:
+    # Rerun to pick up what the watcher ingested in the meantime
+    time.sleep(LIVE_REFRESH_SECONDS)
+    st.experimental_rerun()
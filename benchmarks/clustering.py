@@ -0,0 +1,61 @@
+"""
+Time the Trade Clustering fits as periods are added: the previous KMeans on
+every tick against the sampled and mini-batch fits of `cluster_ticks`, and
+how many ticks end up in the same cluster as with the full fit.
+
+Run from the repository root:
+    python -m benchmarks.clustering --directory ./TestData --stock C
+"""
+import argparse
+import itertools
+import os
+import time
+
+import numpy as np
+from sklearn.cluster import KMeans
+
+from pages.utils.clustering import METHODS, cluster_ticks
+from pages.utils.compact import load_compact
+
+
+def agreement(reference, labels, n_clusters):
+    """Share of rows with the same cluster under the best matching of cluster ids."""
+    counts = np.zeros((n_clusters, n_clusters), dtype=np.int64)
+    np.add.at(counts, (reference, labels), 1)
+    best = max(sum(counts[i, p] for i, p in enumerate(perm)) for perm in itertools.permutations(range(n_clusters)))
+    return best / len(reference)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--directory", default="./TestData")
+    parser.add_argument("--stock", default="C")
+    parser.add_argument("--clusters", type=int, default=3)
+    parser.add_argument("--skip-full", action="store_true", help="Skip the KMeans fit on every tick")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.directory):
+        raise SystemExit(f"{args.directory} does not exist")
+    stock_ticks = load_compact(args.directory, [args.stock])
+    print(f"{'periods':>8}{'ticks':>12}{'full KMeans s':>15}" + "".join(f"{m + ' s':>13}{'agree':>8}" for m in METHODS))
+    for count in range(1, len(stock_ticks.periods) + 1):
+        ticks = stock_ticks._take(np.isin(stock_ticks.period_codes, np.arange(count)))
+        X = np.column_stack([ticks.mid_price(), ticks.column("bidVolume")])
+        line = f"{count:>8}{len(X):>12,}"
+        reference = None
+        if not args.skip_full:
+            start = time.perf_counter()
+            reference = KMeans(n_clusters=args.clusters, n_init=10, random_state=42).fit(X).labels_
+            line += f"{time.perf_counter() - start:>15.2f}"
+        else:
+            line += f"{'-':>15}"
+        for method in METHODS:
+            start = time.perf_counter()
+            result = cluster_ticks(ticks, args.clusters, method)
+            took = time.perf_counter() - start
+            share = "-"
+            if reference is not None:
+                labels = result["model"].predict(X)
+                share = f"{agreement(reference, labels, args.clusters):.1%}"
+            line += f"{took:>13.2f}{share:>8}"
+        print(line)
@@ -0,0 +1,71 @@
+"""
+Replay every stock of a period through the sharp move detector in time
+order, tick by tick and in batches, and compare its throughput with the rate
+the ticks arrived at.
+
+Run from the repository root:
+    python -m benchmarks.detector --directory ./TestData --period Period16
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from pages.utils.detector import Rule, SharpMoveDetector
+from pages.utils.tick_store import list_periods, list_stocks, load_stock
+
+RULES = [Rule("tick", 4e-5), Rule("1s", 1e-4), Rule("10s", 1.5e-4), Rule("60s", 2e-4)]
+
+
+def merged_feed(directory, period):
+    """(stock, time_ns, mid) of every stock's ticks, merged in time order."""
+    stocks, times, mids = [], [], []
+    for stock in list_stocks(directory, period):
+        data = load_stock(directory, stock, period)
+        if data.empty:
+            continue
+        stocks.append(np.full(len(data), stock, dtype=object))
+        times.append(data["time_ns"].to_numpy())
+        mids.append(((data["bidPrice"] + data["askPrice"]) / 2).to_numpy())
+    stocks, times, mids = np.concatenate(stocks), np.concatenate(times), np.concatenate(mids)
+    order = np.argsort(times, kind="stable")
+    return stocks[order], times[order], mids[order]
+
+
+def replay(stocks, times, mids, batch):
+    """Feed runs of up to `batch` ticks, each run from a single stock."""
+    detector = SharpMoveDetector(RULES)
+    start = time.perf_counter()
+    if batch == 1:
+        for stock, timestamp, mid in zip(stocks, times.tolist(), mids.tolist()):
+            detector.push(stock, timestamp, mid)
+    else:
+        for first in range(0, len(times), batch):
+            chunk = slice(first, first + batch)
+            chunk_stocks = stocks[chunk]
+            for stock in dict.fromkeys(chunk_stocks):
+                rows = chunk_stocks == stock
+                detector.push_many(stock, times[chunk][rows], mids[chunk][rows])
+    return detector, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--directory", default="./TestData")
+    parser.add_argument("--period", default=None, help="Defaults to the first period")
+    parser.add_argument("--batch", type=int, default=1000, help="Ticks per batch in the batched replay")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.directory):
+        raise SystemExit(f"{args.directory} does not exist")
+    period = args.period or list_periods(args.directory)[0]
+    stocks, times, mids = merged_feed(args.directory, period)
+    feed_rate = len(times) / ((times[-1] - times[0]) / 1e9)
+    print(f"{len(times):,} ticks of {len(set(stocks))} stocks in {period}, {len(RULES)} rules per stock")
+    print(f"  feed rate:  {feed_rate:>12,.0f} ticks/s")
+    for batch in (1, args.batch):
+        detector, elapsed = replay(stocks, times, mids, batch)
+        rate = detector.ticks / elapsed
+        print(f"  {f'batch {batch}:':<11} {rate:>12,.0f} ticks/s on one core, {rate / feed_rate:,.0f}x the feed, "
+              f"{detector.alerts} alerts")
@@ -0,0 +1,79 @@
+"""
+Time the grouped feature engine against the old whole-frame features and a
+per-group pandas reference, and check it matches the reference exactly.
+
+Run from the repository root:
+    python -m benchmarks.features --directory ./TestData
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from pages.utils.features import WINDOWS, compute_features, feature_columns
+from pages.utils.tick_store import load_all_data
+
+
+def whole_frame_features(data):
+    """The previous generate_features: windows run across stock/period boundaries."""
+    data = data.copy()
+    data["midPrice"] = (data["bidPrice"] + data["askPrice"]) / 2
+    for w in WINDOWS:
+        data[f"rolling_avg_{w}"] = data["midPrice"].rolling(window=w).mean()
+    for w in WINDOWS:
+        data[f"rolling_std_{w}"] = data["midPrice"].rolling(window=w).std()
+    data["momentum"] = data["midPrice"].pct_change()
+    data["sharp_change"] = (abs(data["momentum"]) > 0.05).astype(int)
+    return data.dropna()
+
+
+def grouped_reference(data):
+    """Straightforward pandas groupby version of the same features."""
+    data = data.copy()
+    data["midPrice"] = (data["bidPrice"] + data["askPrice"]) / 2
+    groups = data.groupby(["stock", "period"], sort=False, observed=True)["midPrice"]
+    for w in WINDOWS:
+        data[f"rolling_avg_{w}"] = groups.transform(lambda s: s.rolling(window=w).mean())
+    for w in WINDOWS:
+        data[f"rolling_std_{w}"] = groups.transform(lambda s: s.rolling(window=w).std())
+    data["momentum"] = groups.pct_change()
+    data["sharp_change"] = (abs(data["momentum"]) > 0.05).astype(int)
+    return data.dropna()
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--directory", default="./TestData")
+    parser.add_argument("--stocks", nargs="*", default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if not os.path.exists(args.directory):
+        raise SystemExit(f"{args.directory} does not exist")
+    data = load_all_data(args.directory, args.stocks)
+    print(f"{len(data):,} ticks in {data.groupby(['stock', 'period'], observed=True).ngroups} stock/period groups")
+
+    # Only the reference is kept around, so one feature frame exists at a time
+    _, whole = timed(whole_frame_features, data)
+    reference, grouped = timed(grouped_reference, data)
+    timings = {}
+    for workers in (1, args.workers):
+        result, timings[workers] = timed(compute_features, data, max_workers=workers)
+        assert result.index.equals(reference.index)
+        for name in feature_columns():
+            assert np.array_equal(result[name].to_numpy(), reference[name].to_numpy()), name
+        del result
+    serial, parallel = timings[1], timings[args.workers]
+    print("  grouped engine matches the per-group pandas reference exactly")
+    print(f"  whole frame (leaks across groups): {whole:8.2f} s")
+    print(f"  per-group pandas reference:        {grouped:8.2f} s")
+    print(f"  engine, 1 thread:                  {serial:8.2f} s")
+    print(f"  {f'engine, {args.workers} threads:':<35}{parallel:8.2f} s")
+    print(f"  speedup over the reference:        {grouped / parallel:8.1f}x")
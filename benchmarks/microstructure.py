@@ -0,0 +1,78 @@
+"""
+Throughput of every order book feature in rows/s over the whole data
+directory, computed per (stock, period) like the feature store does, and of
+`compute_microstructure` as a whole.
+
+Run from the repository root:
+    python -m benchmarks.microstructure --directory ./TestData
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from pages.utils.features import WINDOWS, group_indices
+from pages.utils.microstructure import (
+    TIME_WINDOWS,
+    compute_microstructure,
+    microprice,
+    order_flow_imbalance,
+    queue_imbalance,
+    quote_intensity,
+    realized_volatility,
+    realized_volatility_time,
+    spread,
+    tick_window_sum,
+)
+from pages.utils.tick_store import load_all_data
+
+
+def feature_functions():
+    """Feature name -> function of one group's arrays."""
+    functions = {
+        "spread": lambda g: spread(g["bidPrice"], g["askPrice"]),
+        "queue_imbalance": lambda g: queue_imbalance(g["bidVolume"], g["askVolume"]),
+        "microprice": lambda g: microprice(g["bidPrice"], g["askPrice"], g["bidVolume"], g["askVolume"]),
+    }
+    for w in WINDOWS:
+        functions[f"ofi_{w}"] = lambda g, w=w: tick_window_sum(
+            order_flow_imbalance(g["bidPrice"], g["askPrice"], g["bidVolume"], g["askVolume"]), w)
+        functions[f"realized_vol_{w}"] = lambda g, w=w: realized_volatility(g["mid"], w)
+    for t in TIME_WINDOWS:
+        functions[f"quote_rate_{t}"] = lambda g, t=t: quote_intensity(g["time_ns"], t)
+        functions[f"realized_vol_{t}"] = lambda g, t=t: realized_volatility_time(g["mid"], g["time_ns"], t)
+    return functions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--directory", default="./TestData")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per feature; the best one counts")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.directory):
+        raise SystemExit(f"{args.directory} does not exist")
+    data = load_all_data(args.directory)
+    n = len(data)
+    columns = {name: data[name].to_numpy(dtype=np.float64) for name in ("bidPrice", "askPrice", "bidVolume", "askVolume")}
+    columns["mid"] = (columns["bidPrice"] + columns["askPrice"]) / 2
+    columns["time_ns"] = data["time_ns"].to_numpy()
+    groups = [{name: values[rows] for name, values in columns.items()} for rows in group_indices(data)]
+    print(f"{n:,} quotes in {len(groups)} stock/period groups")
+
+    for name, function in feature_functions().items():
+        best = np.inf
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for group in groups:
+                function(group)
+            best = min(best, time.perf_counter() - start)
+        print(f"  {name:<20}{best * 1000:9.1f} ms {n / best:>16,.0f} rows/s")
+
+    best = np.inf
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        compute_microstructure(data)
+        best = min(best, time.perf_counter() - start)
+    print(f"  {'all, as a frame':<20}{best * 1000:9.1f} ms {n / best:>16,.0f} rows/s")
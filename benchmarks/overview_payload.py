@@ -0,0 +1,79 @@
+"""
+Compare the Bokeh payload of the Overview page before and after the shared,
+column-projected source.
+
+Run from the repository root:
+    python -m benchmarks.overview_payload --stock C --period Period19
+"""
+import argparse
+import os
+
+from bokeh.layouts import column
+from bokeh.models import ColumnDataSource
+from bokeh.plotting import figure
+
+from pages.utils.chart_payload import payload_bytes, shared_source
+from pages.utils.downsample import CHART_WIDTH, target_points
+from pages.utils.tick_store import load_stock
+
+CHART_SERIES = [
+    ["bidPrice", "askPrice", "midPrice"],
+    ["std_30s", "std_60s"],
+    ["bidVolume", "askVolume"],
+    ["midPrice"],
+]
+
+
+def load_overview_frame(directory, stock, period):
+    data = load_stock(directory, stock, period)
+    data["midPrice"] = (data["bidPrice"] + data["askPrice"]) / 2
+    data.set_index("timestamp", inplace=True)
+    data["std_30s"] = data["midPrice"].rolling("30s").std()
+    data["std_60s"] = data["midPrice"].rolling("60s").std()
+    return data.reset_index()
+
+
+def full_frame_payload(data):
+    """Four figures, each with its own ColumnDataSource(data), one chart element each."""
+    total = 0
+    for columns in CHART_SERIES:
+        source = ColumnDataSource(data)
+        fig = figure(x_axis_type="datetime", width=CHART_WIDTH, height=400)
+        for name in columns:
+            fig.line("timestamp", name, source=source)
+        total += payload_bytes(fig)
+    return total
+
+
+def shared_payload(data):
+    """Four figures on one projected, downsampled source in a single layout."""
+    source = shared_source(
+        data,
+        {"lttb": ["bidPrice", "askPrice", "midPrice", "std_30s", "std_60s"], "minmax": ["bidVolume", "askVolume"]},
+        target_points(CHART_WIDTH),
+    )
+    figures = []
+    for columns in CHART_SERIES:
+        fig = figure(x_axis_type="datetime", width=CHART_WIDTH, height=400)
+        for name in columns:
+            fig.line("timestamp", name, source=source)
+        figures.append(fig)
+    return payload_bytes(column(*figures)), len(source.data["timestamp"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--directory", default="./TestData")
+    parser.add_argument("--stock", default="A")
+    parser.add_argument("--period", default="Period16")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.directory):
+        raise SystemExit(f"{args.directory} does not exist")
+    data = load_overview_frame(args.directory, args.stock, args.period)
+    before = full_frame_payload(data)
+    after, points = shared_payload(data)
+    print(f"Stock {args.stock} {args.period}: {len(data):,} ticks")
+    print(f"  four full-frame sources: {before / 1024 ** 2:10.2f} MB")
+    print(f"  one shared source:       {after / 1024 ** 2:10.2f} MB ({points:,} points)")
+    print(f"  reduction:               {before / after:10.1f}x")
@@ -0,0 +1,78 @@
+"""
+Time the Volume vs. Price Change chart as points are added: binning into a
+`DensityGrid` against `np.histogram2d`, drawing the density image against
+the previous scatter of every point, and binning at several image sizes.
+
+Run from the repository root:
+    python -m benchmarks.raster --points 100000 1000000 5000000
+"""
+import argparse
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import seaborn as sns  # noqa: E402
+
+from pages.utils.raster import HEIGHT, WIDTH, density_grid, render_density, sparse_points  # noqa: E402
+
+
+def timed(function, repeat):
+    """Best wall time of `repeat` calls, and the last result."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def draw(plot):
+    """Draw on a fresh figure and render it to pixels, as st.pyplot would."""
+    fig, ax = plt.subplots()
+    plot(ax)
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def render(x, y):
+    """Density image with its sparse points, as the page draws it."""
+    grid = density_grid(x, y)
+    sparse = sparse_points(grid, x, y)
+    draw(lambda ax: render_density(ax, grid, sparse=(x[sparse], y[sparse], None)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--points", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--scatter-limit", type=int, default=1_000_000,
+                        help="Skip the scatter above this many points")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs; the best one counts")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Heavy-tailed like bid volumes against price changes
+    x_all = rng.lognormal(3, 1, max(args.points))
+    y_all = rng.standard_t(3, max(args.points)) * 1e-4
+
+    print(f"{'points':>10}{'grid ms':>10}{'histogram2d ms':>16}{'image ms':>10}{'scatter ms':>12}")
+    for n in args.points:
+        x, y = x_all[:n], y_all[:n]
+        grid_s, grid = timed(lambda: density_grid(x, y), args.repeat)
+        histogram_s, (counts, _, _) = timed(
+            lambda: np.histogram2d(y, x, bins=(HEIGHT, WIDTH), range=(grid.y_range, grid.x_range)), args.repeat)
+        assert (counts == grid.counts[0]).all()
+        image_s, _ = timed(lambda: render(x, y), args.repeat)
+        scatter = "-"
+        if n <= args.scatter_limit:
+            scatter_s, _ = timed(lambda: draw(lambda ax: sns.scatterplot(x=x, y=y, alpha=0.5, ax=ax)), 1)
+            scatter = f"{scatter_s * 1000:.0f}"
+        print(f"{n:>10,}{grid_s * 1000:>10.1f}{histogram_s * 1000:>16.1f}{image_s * 1000:>10.0f}{scatter:>12}")
+
+    n = max(args.points)
+    print(f"\nbinning {n:,} points by image size")
+    for width, height in [(100, 75), (400, 300), (1600, 1200)]:
+        took, _ = timed(lambda: density_grid(x_all, y_all, width=width, height=height), args.repeat)
+        print(f"{width:>6}x{height:<6}{took * 1000:>10.1f} ms")
@@ -0,0 +1,153 @@
+"""
+Replay existing market_data CSVs into a fresh directory as if a live feed
+were writing them, optionally following it with the ingest watcher to
+measure the ingest lag and check every row arrived.
+
+The rows of all the selected stocks are written in time order, line by
+line, into files with the source's names and layout, `--speed` times faster
+than they were recorded (0 writes as fast as possible).
+
+Run from the repository root:
+    python -m benchmarks.replay_feed --period Period16 --target ./LiveData --speed 60
+    python -m benchmarks.replay_feed --period Period16 --target /tmp/live --speed 0 --watch
+"""
+import argparse
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from pages.utils.ingest import IngestWatcher
+from pages.utils.tick_store import list_files, list_stocks, load_stock, read_tick_file, sniff_header, stock_path
+
+
+def plan(source, period, stocks):
+    """
+    Every source row in time order.
+
+    Returns:
+        tuple: (files [(stock, source path, header bytes, row lines)], time_ns, file index, line index),
+        the last three with one entry per row in write order.
+    """
+    files, times, file_ids, line_ids = [], [], [], []
+    for stock in stocks or list_stocks(source, period):
+        for path in list_files(source, period, stock, "market_data"):
+            with open(path, "rb") as f:
+                lines = f.read().splitlines(keepends=True)
+            has_header, _ = sniff_header(path)
+            header, lines = (lines[:1], lines[1:]) if has_header else ([], lines)
+            file_times = read_tick_file(path, ["time_ns"])["time_ns"].to_numpy()
+            if len(file_times) != len(lines):
+                raise SystemExit(f"{path}: {len(lines) - len(file_times)} malformed rows, cannot replay it")
+            files.append((stock, path, b"".join(header), lines))
+            times.append(file_times)
+            file_ids.append(np.full(len(lines), len(files) - 1))
+            line_ids.append(np.arange(len(lines)))
+    times, file_ids, line_ids = np.concatenate(times), np.concatenate(file_ids), np.concatenate(line_ids)
+    order = np.argsort(times, kind="stable")
+    return files, times[order], file_ids[order], line_ids[order]
+
+
+def replay(files, times, file_ids, line_ids, source, target, period, speed, chunk, on_write=None):
+    """
+    Append the rows to files under `target`, pacing them by their timestamps.
+    on_write(stock, rows written so far for that stock) is called after each write.
+    """
+    handles, written = {}, {}
+    start_wall, start_feed = time.perf_counter(), times[0]
+    position = 0
+    while position < len(times):
+        if speed:
+            feed_now = start_feed + (time.perf_counter() - start_wall) * speed * 1e9
+            end = max(position + 1, int(np.searchsorted(times, feed_now, side="right")))
+        else:
+            end = position + chunk
+        rows = slice(position, min(end, len(times)))
+        for file_id in np.unique(file_ids[rows]):
+            stock, path, header, lines = files[file_id]
+            if file_id not in handles:
+                relative = os.path.relpath(path, stock_path(source, period, stock))
+                out = os.path.join(stock_path(target, period, stock), relative)
+                os.makedirs(os.path.dirname(out), exist_ok=True)
+                handles[file_id] = open(out, "wb")
+                handles[file_id].write(header)
+            selected = line_ids[rows][file_ids[rows] == file_id]
+            handles[file_id].write(b"".join(lines[i] for i in selected))
+            handles[file_id].flush()
+            written[stock] = written.get(stock, 0) + len(selected)
+            if on_write is not None:
+                on_write(stock, written[stock])
+        position = rows.stop
+        if speed:
+            time.sleep(0.01)
+    for handle in handles.values():
+        handle.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source", default="./TestData")
+    parser.add_argument("--period", default="Period16")
+    parser.add_argument("--stocks", nargs="*", default=None)
+    parser.add_argument("--target", default="./LiveData")
+    parser.add_argument("--speed", type=float, default=60.0, help="Feed seconds per wall second; 0 for no pacing")
+    parser.add_argument("--chunk", type=int, default=2000, help="Rows per write without pacing")
+    parser.add_argument("--watch", action="store_true", help="Follow the target with the ingest watcher")
+    parser.add_argument("--interval", type=float, default=0.1, help="Watcher poll interval in seconds")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        raise SystemExit(f"{args.source} does not exist")
+    shutil.rmtree(os.path.join(args.target, args.period), ignore_errors=True)
+    files, times, file_ids, line_ids = plan(args.source, args.period, args.stocks)
+    span = (times[-1] - times[0]) / 1e9
+    print(f"{len(times):,} rows of {len({f[0] for f in files})} stocks, {span:,.0f} s of feed "
+          f"into {args.target} at {'full speed' if not args.speed else f'{args.speed:g}x'}")
+
+    writes, deliveries = {}, []
+    watcher = None
+    if args.watch:
+        delivered = {}
+
+        def on_ticks(stock, period, rows):
+            delivered[stock] = delivered.get(stock, 0) + len(rows)
+            deliveries.append((time.perf_counter(), stock, delivered[stock]))
+
+        watcher = IngestWatcher(args.target)
+        watcher.subscribe(on_ticks)
+        watcher.start(args.interval)
+
+    lock = threading.Lock()
+
+    def on_write(stock, total):
+        with lock:
+            writes.setdefault(stock, []).append((total, time.perf_counter()))
+
+    start = time.perf_counter()
+    replay(files, times, file_ids, line_ids, args.source, args.target, args.period, args.speed, args.chunk,
+           on_write if args.watch else None)
+    print(f"  wrote in {time.perf_counter() - start:.1f} s")
+
+    if watcher is not None:
+        while sum(len(watcher.frame(s, args.period)) for s in writes) < len(times):
+            time.sleep(args.interval)
+        watcher.stop()
+        lags = []
+        for delivered_at, stock, total in deliveries:
+            counts = np.array([count for count, _ in writes[stock]])
+            written_at = writes[stock][int(np.searchsorted(counts, total))][1]
+            lags.append(delivered_at - written_at)
+        lags = np.array(lags) * 1000
+        stats = watcher.stats
+        print(f"  ingested {stats['rows']:,} rows, {stats['bytes'] / 1024 ** 2:.1f} MB in {len(deliveries)} batches "
+              f"over {stats['polls']} polls")
+        print(f"  ingest lag p50 {np.percentile(lags, 50):.1f} ms   p99 {np.percentile(lags, 99):.1f} ms   "
+              f"(poll interval {args.interval * 1000:.0f} ms)")
+        for stock in writes:
+            source = load_stock(args.source, stock, args.period)
+            ingested = watcher.frame(stock, args.period)
+            assert np.array_equal(ingested["time_ns"].to_numpy(), source["time_ns"].to_numpy()), stock
+            assert np.array_equal(ingested["bidPrice"].to_numpy(), source["bidPrice"].to_numpy()), stock
+        print("  every replayed row was ingested once, in order")
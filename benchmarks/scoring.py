@@ -0,0 +1,142 @@
+"""
+Replay one stock's quotes through the sharp change scorer in micro-batches,
+check its streaming features against `compute_microstructure` and
+`compute_features` (as the feature store runs them), and report
+throughput and batch latency percentiles (features alone, scored directly
+and over HTTP).
+
+Run from the repository root:
+    python -m benchmarks.scoring --directory ./TestData --stock A
+    python -m benchmarks.scoring --key <model key>   # score a registered model
+"""
+import argparse
+import json
+import os
+import time
+import urllib.request
+
+import numpy as np
+import xgboost as xgb
+
+from pages.utils.features import compute_features, feature_columns
+from pages.utils.microstructure import MICROSTRUCTURE_FEATURES, compute_microstructure
+from pages.utils.scoring import SharpChangeScorer, serve
+from pages.utils.tick_store import list_periods, load_stock
+
+# The inputs of the sharp change model the pages register
+FEATURES = [name for name in feature_columns() if name not in ("midPrice", "sharp_change")] + list(MICROSTRUCTURE_FEATURES)
+QUOTES = ["bidPrice", "askPrice", "bidVolume", "askVolume", "time_ns"]
+
+
+def stand_in_model(features, num_boost_round):
+    """
+    A booster of the production shape when no model is registered. The target
+    is the top 1% of |momentum|, since the real one may have a single class.
+    """
+    X = features[FEATURES].to_numpy()
+    momentum = np.abs(features["momentum"].to_numpy())
+    y = momentum > np.quantile(momentum, 0.99)
+    return xgb.train({"objective": "binary:logistic", "tree_method": "hist"}, xgb.DMatrix(X, label=y),
+                     num_boost_round=num_boost_round)
+
+
+def check_features(data, features, batch_size):
+    """
+    The streamed features of every batch of `batch_size` ticks match the
+    offline engines. pandas' rolling std updates one running sum over the whole
+    period and drifts up to ~1e-6 relative; the scorer restarts its sums on
+    every batch. The stored order book features are float32.
+    """
+    scorer = SharpChangeScorer(None, FEATURES)
+    columns = [data[name].to_numpy() for name in QUOTES]
+    streamed = np.concatenate([
+        scorer.transform(None, *(values[start:start + batch_size] for values in columns))
+        for start in range(0, len(data), batch_size)
+    ])[data.index.get_indexer(features.index)]
+    for i, name in enumerate(FEATURES):
+        expected = features[name].to_numpy()
+        if expected.dtype == np.float32:
+            assert np.allclose(streamed[:, i].astype(np.float32), expected, rtol=1e-5, atol=1e-7), name
+        else:
+            assert np.allclose(streamed[:, i], expected, rtol=1e-6, atol=1e-12), name
+
+
+def print_stats(label, stats):
+    print(f"  {label:<8} {stats['ticks_per_second']:>12,.0f} ticks/s   p50 {stats['p50_ms']:.3f} ms   "
+          f"p90 {stats['p90_ms']:.3f} ms   p99 {stats['p99_ms']:.3f} ms   max {stats['max_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--directory", default="./TestData")
+    parser.add_argument("--stock", default="A")
+    parser.add_argument("--period", default=None, help="Defaults to the first period")
+    parser.add_argument("--key", default=None, help="Registered model key; a stand-in booster otherwise")
+    parser.add_argument("--batch", type=int, default=1000, help="Ticks per micro-batch")
+    parser.add_argument("--rounds", type=int, default=100, help="Boosting rounds of the stand-in booster")
+    parser.add_argument("--http-batches", type=int, default=500, help="Batches also sent over HTTP")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.directory):
+        raise SystemExit(f"{args.directory} does not exist")
+    period = args.period or list_periods(args.directory)[0]
+    data = load_stock(args.directory, args.stock, period).reset_index(drop=True)
+    features = compute_features(compute_microstructure(data, keys=[], max_workers=1), keys=[], max_workers=1)
+    print(f"{len(data):,} {args.stock} ticks in {period}, batches of {args.batch}")
+
+    check_features(data, features, args.batch)
+    print("  streamed features match the feature store")
+
+    if args.key:
+        scorer = SharpChangeScorer.from_registry(args.key)
+    else:
+        scorer = SharpChangeScorer(stand_in_model(features, args.rounds), FEATURES)
+    columns = {name: data[name].to_numpy() for name in QUOTES}
+    starts = range(0, len(data) - args.batch + 1, args.batch)
+
+    def batch(i):
+        return [values[i:i + args.batch] for values in columns.values()]
+
+    # The features alone, without the model
+    feature_scorer = SharpChangeScorer(None, FEATURES)
+    feature_times = []
+    for i in starts:
+        sent = time.perf_counter()
+        feature_scorer.transform(args.stock, *batch(i))
+        feature_times.append(time.perf_counter() - sent)
+    feature_times = np.array(feature_times) * 1000
+    print(f"  {'features':<8} {'':>12}            p50 {np.percentile(feature_times, 50):.3f} ms   "
+          f"p90 {np.percentile(feature_times, 90):.3f} ms   p99 {np.percentile(feature_times, 99):.3f} ms")
+
+    # Warm up the predictor, then time full batches only
+    scorer.score(args.stock, *batch(0))
+    scorer.reset()
+    scorer.latencies.clear()
+    scorer.ticks, scorer.busy_seconds = 0, 0.0
+    start = time.perf_counter()
+    for i in starts:
+        scorer.score(args.stock, *batch(i))
+    wall = time.perf_counter() - start
+    print_stats("direct", scorer.stats())
+    print(f"  {'':<8} {scorer.ticks / wall:>12,.0f} ticks/s wall clock")
+
+    http_scorer = SharpChangeScorer(scorer.model, scorer.feature_columns)
+    server = serve(http_scorer, port=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    round_trips = []
+    for i in list(starts)[:args.http_batches]:
+        body = json.dumps({
+            "stock": args.stock,
+            **{name: values.tolist() for name, values in zip(QUOTES, batch(i))},
+        }).encode()
+        request = urllib.request.Request(f"{url}/score", data=body, headers={"Content-Type": "application/json"})
+        sent = time.perf_counter()
+        with urllib.request.urlopen(request) as response:
+            json.load(response)
+        round_trips.append(time.perf_counter() - sent)
+    with urllib.request.urlopen(f"{url}/stats") as response:
+        print_stats("server", json.load(response))
+    round_trips = np.array(round_trips) * 1000
+    print(f"  {'HTTP':<8} round trip p50 {np.percentile(round_trips, 50):.3f} ms   "
+          f"p99 {np.percentile(round_trips, 99):.3f} ms")
+    server.shutdown()
@@ -0,0 +1,75 @@
+"""
+Stream every stock's quotes (and trades) of a period through the k-way
+merge and compare it with loading the whole period and sorting it: same
+ticks in the same time order, time taken and peak memory held in NumPy
+arrays (Arrow's own buffers are not counted by tracemalloc).
+
+Run from the repository root:
+    python -m benchmarks.stream --directory ./TestData --period Period19 --trades
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from pages.utils.stream import CHUNK_ROWS, TickStream
+from pages.utils.tick_store import list_periods, list_stocks, load_stock, load_trades
+
+
+def load_and_sort(directory, period, trades):
+    """time_ns of the period the in-memory way: load everything, then sort."""
+    frames = []
+    for stock in list_stocks(directory, period):
+        frames.append(load_stock(directory, stock, period))
+        if trades:
+            frames.append(load_trades(directory, stock, period))
+    times = np.concatenate([frame["time_ns"].to_numpy() for frame in frames])
+    return times[np.argsort(times, kind="stable")]
+
+
+def measure(run):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = run()
+    took = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, took, peak / 1024 ** 2
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--directory", default="./TestData")
+    parser.add_argument("--period", default=None, help="Defaults to the last period")
+    parser.add_argument("--trades", action="store_true", help="Merge the trade files in too")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="Rows read from a file at a time")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.directory):
+        raise SystemExit(f"{args.directory} does not exist")
+    period = args.period or list_periods(args.directory)[-1]
+    stream = TickStream(args.directory, period, trades=args.trades, chunk_rows=args.chunk)
+    # Build the manifest and Parquet copies outside the timings
+    stream._entries()
+
+    def consume():
+        times, largest = [], 0
+        for batch in stream:
+            times.append(batch["time_ns"].to_numpy())
+            largest = max(largest, len(batch))
+        return np.concatenate(times), largest
+
+    (streamed, largest), stream_took, stream_peak = measure(consume)
+    loaded, load_took, load_peak = measure(lambda: load_and_sort(args.directory, period, args.trades))
+    assert np.array_equal(streamed, loaded), "the stream is not in time order"
+
+    stats = stream.stats
+    print(f"{period}: {stats['rows']:,} ticks from {stats['files']} files, same order as load + sort")
+    print(f"  stream       {stream_took:6.2f} s   {stats['rows'] / stream_took:>12,.0f} ticks/s   "
+          f"peak {stream_peak:7.1f} MB (incl. the {streamed.nbytes / 1024 ** 2:.1f} MB of collected times)")
+    print(f"  load + sort  {load_took:6.2f} s   {stats['rows'] / load_took:>12,.0f} ticks/s   peak {load_peak:7.1f} MB")
+    print(f"  {stats['batches']} batches of up to {largest:,} rows, at most {stats['peak_open']} files open "
+          f"and {stats['peak_buffered']:,} rows buffered")
+    print(f"  out-of-order ticks: {sum(stream.disorder.values())}")
@@ -0,0 +1,73 @@
+"""
+Join every stock's trades to its prevailing quotes, period by period, check
+the matches against pandas' merge_asof and time both.
+
+Run from the repository root:
+    python -m benchmarks.trades --directory ./TestData
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from pages.utils.tick_store import list_periods, list_stocks, load_stock, load_trades
+from pages.utils.trades import QUOTE_COLUMNS, add_trade_features, join_trades
+
+
+def merge_asof_positions(trades, quotes):
+    """Prevailing quote positions the pandas way, for reference."""
+    right = quotes[["time_ns"]].assign(quote=np.arange(len(quotes)))
+    merged = pd.merge_asof(trades[["time_ns"]], right, on="time_ns", direction="backward")
+    return merged["quote"].fillna(-1).to_numpy(dtype=np.int64)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--directory", default="./TestData")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stock and period; the best one counts")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.directory):
+        raise SystemExit(f"{args.directory} does not exist")
+
+    totals = {"trades": 0, "quotes": 0, "join": 0.0, "merge_asof": 0.0, "features": 0.0}
+    directions = np.zeros(3, dtype=np.int64)
+    spreads = []
+    print(f"{'period':<10}{'stock':<6}{'trades':>9}{'quotes':>11}{'join ms':>10}{'merge_asof ms':>15}")
+    for period in list_periods(args.directory):
+        for stock in list_stocks(args.directory, period):
+            quotes = load_stock(args.directory, stock, period, QUOTE_COLUMNS)
+            trades = load_trades(args.directory, stock, period)
+            if quotes.empty or trades.empty:
+                continue
+            timings = {"join": [], "merge_asof": [], "features": []}
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                joined = join_trades(trades, quotes)
+                timings["join"].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                reference = merge_asof_positions(trades, quotes)
+                timings["merge_asof"].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                add_trade_features(quotes, joined)
+                timings["features"].append(time.perf_counter() - start)
+            assert np.array_equal(joined["quote"].to_numpy(), reference), (period, stock)
+            best = {name: min(values) for name, values in timings.items()}
+            for name, value in best.items():
+                totals[name] += value
+            totals["trades"] += len(trades)
+            totals["quotes"] += len(quotes)
+            directions += np.bincount(joined["direction"].to_numpy() + 1, minlength=3)
+            spreads.append(joined["effective_spread"].dropna().to_numpy())
+            print(f"{period:<10}{stock:<6}{len(trades):>9,}{len(quotes):>11,}"
+                  f"{best['join'] * 1000:>10.2f}{best['merge_asof'] * 1000:>15.2f}")
+
+    print(f"\n{totals['trades']:,} trades against {totals['quotes']:,} quotes, same matches as merge_asof")
+    print(f"  join        {totals['join'] * 1000:8.1f} ms   {totals['trades'] / totals['join']:>14,.0f} trades/s")
+    print(f"  merge_asof  {totals['merge_asof'] * 1000:8.1f} ms   {totals['trades'] / totals['merge_asof']:>14,.0f} trades/s")
+    print(f"  quote features {totals['features'] * 1000:5.1f} ms   {totals['quotes'] / totals['features']:>14,.0f} quotes/s")
+    sell, unknown, buy = directions / directions.sum()
+    print(f"  buys {buy:.1%}   sells {sell:.1%}   unclassified {unknown:.1%}   "
+          f"median effective spread {np.median(np.concatenate(spreads)) * 1e4:.2f} bp")
@@ -1,6 +1,9 @@
 import pandas as pd
 import os
 
+from pages.utils.tick_store import assemble, list_periods, list_stocks, load_stock, load_trades
+from pages.utils.trades import TRADE_FIELDS, trade_features
+
 def load_and_preprocess(file_path):
     """
     Load and preprocess a CSV file.
@@ -23,16 +26,26 @@ def load_and_preprocess(file_path):
 def merge_files_in_training_data(directory):
     """
     Merge all CSV files in the TrainingData directory into a single DataFrame.
+    Every stock and period gives one row per market_data quote, read through
+    the shared Parquet cache; its trade_data files are joined to those quotes
+    and add the trade order flow columns (see pages/utils/trades.py) rather
+    than being stacked under them with another schema.
     Args:
         directory (str): Path to the TrainingData directory.
 
     Returns:
         pd.DataFrame: Combined DataFrame.
     """
-    dataframes = []
+    frames, labels = [], []
+    for period in list_periods(directory):
+        for stock in list_stocks(directory, period):
+            quotes = load_stock(directory, stock, period)
+            if not quotes.empty:
+                frames.append(trade_features(quotes, load_trades(directory, stock, period, TRADE_FIELDS)))
+                labels.append((stock, period))
+    dataframes = [assemble(frames, labels)] if frames else []
     for root, _, files in os.walk(directory):
         for file in files:
-            if file.endswith('.csv'):
-                file_path = os.path.join(root, file)
-                dataframes.append(load_and_preprocess(file_path))
-    return pd.concat(dataframes, ignore_index=True)
+            if file.endswith('.csv') and not file.startswith(("market_data", "trade_data")):
+                dataframes.append(load_and_preprocess(os.path.join(root, file)))
+    return pd.concat(dataframes, ignore_index=True) if dataframes else pd.DataFrame()
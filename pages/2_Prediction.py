@@ -1,78 +1,43 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from sklearn.model_selection import StratifiedKFold
-from sklearn.preprocessing import MinMaxScaler
-from imblearn.over_sampling import SMOTE
-from xgboost import XGBClassifier
 import plotly.graph_objects as go
 import os
+import time
 
-
-def load_all_data(directory, stocks):
-    """
-    Load and combine market data for all periods and selected stocks.
-    Args:
-        directory (str): Path to the TrainingData directory.
-        stocks (list): List of stock symbols (e.g., ["A", "B", "C"]).
-
-    Returns:
-        pd.DataFrame: Combined DataFrame for all stocks across all periods.
-    """
-    all_data = []
-    periods = sorted(os.listdir(directory))
-    for period in periods:
-        for stock in stocks:
-            period_path = os.path.join(directory, period, stock)
-            column_names = ['bidVolume', 'bidPrice', 'askVolume', 'askPrice', 'timestamp']
-            if os.path.exists(period_path):
-                for file in sorted(os.listdir(period_path)):
-                    if file.startswith("market_data"):
-                        data = pd.read_csv(
-                            os.path.join(period_path, file),
-                            header=None if "market_data_A_1.csv" in file else "infer",
-                        )
-                        if "market_data_A_1.csv" in file or len(data.columns) == 5:
-                            data.columns = column_names
-                        if "timestamp" in data.columns:
-                            data["timestamp"] = pd.to_datetime(data["timestamp"], errors="coerce")
-                            data = data.dropna(subset=["timestamp"])
-                            data["stock"] = stock
-                            data["period"] = period
-                            all_data.append(data)
-    return pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame()
-
-
-def generate_features(data):
-    """
-    Add rolling averages, standard deviations, and momentum features to the dataset.
-    """
-    data["midPrice"] = (data["bidPrice"] + data["askPrice"]) / 2
-    data["rolling_avg_30"] = data["midPrice"].rolling(window=30).mean()
-    data["rolling_avg_60"] = data["midPrice"].rolling(window=60).mean()
-    data["rolling_std_30"] = data["midPrice"].rolling(window=30).std()
-    data["rolling_std_60"] = data["midPrice"].rolling(window=60).std()
-    data["momentum"] = data["midPrice"].pct_change()
-    data["sharp_change"] = (abs(data["momentum"]) > 0.05).astype(int)  # Sharp change threshold
-    return data.dropna()
+from pages.utils.cache import get_cache, tree_fingerprint, tree_key
+from pages.utils.feature_store import definition_hash, materialize
+from pages.utils.jobs import background
+from pages.utils.microstructure import MICROSTRUCTURE_FEATURES
+from pages.utils.model_registry import get_or_train, model_key
+from pages.utils.out_of_core import DEFAULT_MEMORY_BUDGET, predict_chart, train_out_of_core
+from pages.utils.tick_store import STOCKS
+from pages.utils.trades import trade_feature_columns
 
 
 st.title("Improved Stock Movement Prediction with All Data")
 
 # Directory setup
 training_data_dir = "./TrainingData"
-stocks = ["A", "B", "C", "D", "E"]
+stocks = STOCKS
+# Streamed training: walk-forward over periods, negatives subsampled to fit the memory budget
+TRAINING_CONFIG = {"params": {}, "num_boost_round": 100, "memory_budget": DEFAULT_MEMORY_BUDGET, "random_state": 42}
+# Trade order flow columns are stored in their own feature partitions, built on first use
+use_trades = st.sidebar.checkbox("Use trade order flow features", value=False)
+# Files whose changes retrain the model
+training_files = ("market_data", "trade_data") if use_trades else ("market_data",)
 
 if os.path.exists(training_data_dir):
-    # Load all data for selected stocks
-    st.write("Loading and combining data...")
-    data = load_all_data(training_data_dir, stocks)
-
-    if not data.empty:
-        # Generate features
-        st.write("Generating features...")
-        data = generate_features(data)
-
+    # Features are stored per stock and period; only partitions whose files changed are recomputed.
+    # This runs as a background job, shared with other sessions asking for the same data, and the
+    # feature matrix itself is only ever streamed from the stored partitions
+    partitions, _ = background(
+        tree_key("sharp_change_partitions", training_data_dir, stocks, (definition_hash(trades=use_trades),)),
+        lambda: materialize(training_data_dir, stocks, trades=use_trades),
+        slot="prediction:features",
+        label="Computing features",
+    )
+
+    if partitions:
         # Prepare the dataset for modeling
         feature_columns = [
             "rolling_avg_30",
@@ -80,47 +45,66 @@ if os.path.exists(training_data_dir):
             "rolling_std_30",
             "rolling_std_60",
             "momentum",
+            # Spread, queue imbalance, microprice, order flow, quote rate and realized volatility
+            *MICROSTRUCTURE_FEATURES,
+            # Signed volume and number of trades over the tick windows, from the trades joined to the quotes
+            *(trade_feature_columns() if use_trades else []),
         ]
         target_column = "sharp_change"
-        X = data[feature_columns]
-        y = data[target_column]
-
-        # Balance the dataset using SMOTE
-        st.write("Balancing the dataset...")
-        smote = SMOTE(random_state=42)
-        X_resampled, y_resampled = smote.fit_resample(X, y)
-        st.write("Balanced Sharp Change Distribution:", pd.Series(y_resampled).value_counts())
 
-        # Convert to NumPy arrays for compatibility with StratifiedKFold
-        X_resampled_np = X_resampled.to_numpy()
-        y_resampled_np = y_resampled
-
-        # Train the model using k-fold cross-validation
-        st.write("Training the model with k-fold cross-validation...")
-        kfold = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-        model = XGBClassifier()
-        accuracies = []
-
-        for train_idx, test_idx in kfold.split(X_resampled_np, y_resampled_np):
-            X_train, X_test = X_resampled_np[train_idx], X_resampled_np[test_idx]
-            y_train, y_test = y_resampled_np[train_idx], y_resampled_np[test_idx]
-            model.fit(X_train, y_train)
-            accuracy = model.score(X_test, y_test)
-            accuracies.append(accuracy)
-
-        avg_accuracy = np.mean(accuracies)
-        st.write(f"Average Model Accuracy: {avg_accuracy:.2f}")
-
-        # Predict on the entire dataset for visualization
-        data["predicted_sharp_change"] = model.predict(X.to_numpy())
+        # The trained model is registered under its data, features and settings, and
+        # only retrained when one of those changes or on request
+        model_inputs = {
+            "name": "sharp_change",
+            "data_fingerprint": tree_fingerprint(training_data_dir, stocks, training_files),
+            "features": [definition_hash(trades=use_trades), feature_columns],
+            "params": TRAINING_CONFIG,
+        }
+        model_cache_key = ("sharp_change_model", model_key(**model_inputs))
+        # The request outlives the button's single rerun, so the training job is not superseded by the polling
+        if st.button("Retrain model"):
+            st.session_state["sharp_change_retrain"] = time.time()
+        retrain_request = st.session_state.get("sharp_change_retrain")
+        try:
+            artifact = background(
+                (*model_cache_key, retrain_request),
+                lambda cache=get_cache(): get_or_train(
+                    **model_inputs,
+                    train=lambda: train_out_of_core(
+                        training_data_dir, stocks, feature_columns, target_column, trades=use_trades, **TRAINING_CONFIG
+                    ),
+                    retrain=retrain_request is not None,
+                    cache=cache,
+                ),
+                slot="prediction:model",
+                label="Training model",
+            )
+        except ValueError as e:
+            st.warning(str(e))
+            st.stop()
+        if retrain_request is not None:
+            del st.session_state["sharp_change_retrain"]
+            get_cache().put((*model_cache_key, None), artifact)
+        st.write("Training sample:", pd.Series(artifact.metrics["sampling"]))
+        st.write(f"Average Model Accuracy: {artifact.metrics['avg_accuracy']:.2f}")
+        st.write("Walk-forward folds:", pd.DataFrame(artifact.metrics["folds"]))
+        st.caption(f"Model {artifact.key} trained {artifact.trained_at}")
+
+        # Predicted chunk by chunk over the stored rows, keeping a few points per pixel for the chart
+        chart = background(
+            ("sharp_change_chart", artifact.key),
+            lambda: predict_chart(artifact.model, partitions, feature_columns, target_column),
+            slot="prediction:chart",
+            label="Predicting",
+        )
 
         # Plot actual vs predicted sharp changes
         st.subheader("Sharp Change Predictions")
         fig = go.Figure()
         fig.add_trace(
             go.Scatter(
-                x=data["timestamp"],
-                y=data["sharp_change"],
+                x=chart["timestamp"],
+                y=chart["actual"],
                 mode="lines+markers",
                 name="Actual Sharp Changes",
                 marker=dict(color="red"),
@@ -128,8 +112,8 @@ if os.path.exists(training_data_dir):
         )
         fig.add_trace(
             go.Scatter(
-                x=data["timestamp"],
-                y=data["predicted_sharp_change"],
+                x=chart["timestamp"],
+                y=chart["predicted"],
                 mode="lines+markers",
                 name="Predicted Sharp Changes",
                 marker=dict(color="blue"),
@@ -1,26 +1,35 @@
+import os
 import streamlit as st
-from .utils.predicter_utils import load_all_data, generate_features
-from sklearn.model_selection import StratifiedKFold
-from imblearn.over_sampling import SMOTE
-from xgboost import XGBClassifier
-import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
+from pages.utils.cache import cached, tree_fingerprint
+from pages.utils.feature_store import definition_hash, materialize
+from pages.utils.microstructure import MICROSTRUCTURE_FEATURES
+from pages.utils.model_registry import get_or_train
+from pages.utils.out_of_core import DEFAULT_MEMORY_BUDGET, predict_chart, train_out_of_core
+from pages.utils.tick_store import STOCKS
+from pages.utils.trades import trade_feature_columns
+
 st.title("ML Model for Sharp Change Prediction")
 
 # Directory setup
 training_data_dir = "./TrainingData"
-stocks = ["A", "B", "C", "D", "E"]
+stocks = STOCKS
+# Streamed training: walk-forward over periods, negatives subsampled to fit the memory budget
+TRAINING_CONFIG = {"params": {}, "num_boost_round": 100, "memory_budget": DEFAULT_MEMORY_BUDGET, "random_state": 42}
+# Trade order flow columns are stored in their own feature partitions, built on first use
+use_trades = st.sidebar.checkbox("Use trade order flow features", value=False)
+# Files whose changes retrain the model
+training_files = ("market_data", "trade_data") if use_trades else ("market_data",)
 
 if os.path.exists(training_data_dir):
-    st.write("Loading and combining data...")
-    data = load_all_data(training_data_dir, stocks)
-
-    if not data.empty:
-        st.write("Generating features...")
-        data = generate_features(data)
+    # Features are stored per stock and period; only partitions whose files changed are recomputed.
+    # The feature matrix is streamed from them, never loaded whole
+    st.write("Computing features...")
+    partitions, _ = materialize(training_data_dir, stocks, trades=use_trades)
 
+    if partitions:
         # Feature and target setup
         feature_columns = [
             "rolling_avg_30",
@@ -28,38 +37,44 @@ if os.path.exists(training_data_dir):
             "rolling_std_30",
             "rolling_std_60",
             "momentum",
+            # Spread, queue imbalance, microprice, order flow, quote rate and realized volatility
+            *MICROSTRUCTURE_FEATURES,
+            # Signed volume and number of trades over the tick windows, from the trades joined to the quotes
+            *(trade_feature_columns() if use_trades else []),
         ]
         target_column = "sharp_change"
-        X = data[feature_columns]
-        y = data[target_column]
-
-        st.write("Balancing the dataset using SMOTE...")
-        smote = SMOTE(random_state=42)
-        X_resampled, y_resampled = smote.fit_resample(X, y)
-
-        # Train using k-fold cross-validation
-        st.write("Training model with k-fold cross-validation...")
-        kfold = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-        model = XGBClassifier()
-        accuracies = []
-
-        for train_idx, test_idx in kfold.split(X_resampled, y_resampled):
-            X_train, X_test = X_resampled[train_idx], X_resampled[test_idx]
-            y_train, y_test = y_resampled[train_idx], y_resampled[test_idx]
-            model.fit(X_train, y_train)
-            accuracies.append(model.score(X_test, y_test))
 
-        avg_accuracy = np.mean(accuracies)
-        st.write(f"Average Model Accuracy: {avg_accuracy:.2f}")
+        # Reuse the registered model unless the data, features or settings changed
+        retrain = st.button("Retrain model")
+        try:
+            artifact = get_or_train(
+                "sharp_change",
+                data_fingerprint=tree_fingerprint(training_data_dir, stocks, training_files),
+                features=[definition_hash(trades=use_trades), feature_columns],
+                params=TRAINING_CONFIG,
+                train=lambda: train_out_of_core(
+                    training_data_dir, stocks, feature_columns, target_column, trades=use_trades, **TRAINING_CONFIG
+                ),
+                retrain=retrain,
+            )
+        except ValueError as e:
+            st.warning(str(e))
+            st.stop()
+        st.write(f"Average Model Accuracy: {artifact.metrics['avg_accuracy']:.2f}")
+        st.write("Walk-forward folds:", pd.DataFrame(artifact.metrics["folds"]))
+        st.caption(f"Model {artifact.key} trained {artifact.trained_at}")
 
-        # Predict on the data
-        data["predicted_sharp_change"] = model.predict(X)
+        # Predicted chunk by chunk over the stored rows, keeping a few points per pixel for the chart
+        chart = cached(
+            ("sharp_change_chart", artifact.key),
+            lambda: predict_chart(artifact.model, partitions, feature_columns, target_column),
+        )
 
         # Visualize predictions
         st.subheader("Predicted vs Actual Sharp Changes")
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=data["timestamp"], y=data["sharp_change"], name="Actual"))
-        fig.add_trace(go.Scatter(x=data["timestamp"], y=data["predicted_sharp_change"], name="Predicted"))
+        fig.add_trace(go.Scatter(x=chart["timestamp"], y=chart["actual"], name="Actual"))
+        fig.add_trace(go.Scatter(x=chart["timestamp"], y=chart["predicted"], name="Predicted"))
         fig.update_layout(title="Sharp Change Predictions", xaxis_title="Timestamp", yaxis_title="Sharp Change")
         st.plotly_chart(fig)
     else:
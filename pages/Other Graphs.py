@@ -5,32 +5,34 @@ import seaborn as sns
 import plotly.graph_objects as go
 import streamlit as st
 
-# Utility functions
-def load_combined_data(directory):
-    """Load and combine stock data from a directory."""
-    all_data = []
-    column_names = ['bidVolume', 'bidPrice', 'askVolume', 'askPrice', 'timestamp']
-
-    periods = sorted(os.listdir(directory))
-    for period in periods:
-        for stock in os.listdir(os.path.join(directory, period)):
-            stock_path = os.path.join(directory, period, stock)
-            if os.path.isdir(stock_path):
-                for file in sorted(os.listdir(stock_path)):
-                    if file.startswith("market_data"):
-                        data = pd.read_csv(
-                            os.path.join(stock_path, file),
-                            header=None if "market_data_A_1.csv" in file else "infer",
-                        )
-                        if "market_data_A_1.csv" in file or len(data.columns) == 5:
-                            data.columns = column_names
-                        if "timestamp" in data.columns:
-                            data["timestamp"] = pd.to_datetime(data["timestamp"], errors="coerce")
-                            data = data.dropna(subset=["timestamp"])
-                            data["stock"] = stock
-                            data["period"] = period
-                            all_data.append(data)
-    return pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame()
+from pages.utils.bars import active_span, bar_pyramid, choose_resolution
+from pages.utils.cache import get_cache, stock_key, tree_key
+from pages.utils.clustering import METHODS, cluster_ticks
+from pages.utils.compact import load_compact
+from pages.utils.jobs import background
+from pages.utils.panel import lagged_correlation, panel_from_ticks, panel_returns, rolling_correlation
+from pages.utils.progress import advance, stage
+from pages.utils.raster import density_grid, render_density, sparse_points
+
+# Candles drawn by the candlestick chart at most
+MAX_CANDLES = 600
+# Seconds covered by each rolling correlation window
+ROLLING_WINDOW = 300
+N_CLUSTERS = 3
+
+
+def load_pyramids(directory, stock, period_keys, cache):
+    """
+    Bar pyramids of one stock for the periods with bars, each cached on its own.
+    """
+    stage(f"Building bars of stock {stock}", len(period_keys))
+    pyramids = {}
+    for period, key in period_keys.items():
+        pyramid = cache.get_or_compute(key, lambda: bar_pyramid(directory, stock, period))
+        advance()
+        if pyramid:
+            pyramids[period] = pyramid
+    return pyramids
 
 # Interactive page for new graphs
 st.title("Advanced Stock Visualizations")
@@ -39,93 +41,169 @@ st.title("Advanced Stock Visualizations")
 training_data_dir = "./TrainingData"
 
 if os.path.exists(training_data_dir):
-    data = load_combined_data(training_data_dir)
-
-    if not data.empty:
-        # Ensure midPrice is calculated
-        data["midPrice"] = (data["bidPrice"] + data["askPrice"]) / 2
+    # Heavy loads run as background jobs: the page shows their progress, and a newer
+    # selection cancels the work it no longer needs
+    ticks = background(
+        tree_key("compact", training_data_dir),
+        lambda: load_compact(training_data_dir),
+        slot="other_graphs:ticks",
+        label="Loading ticks",
+    )
 
+    if len(ticks):
         # Sidebar filters
-        stock_options = data["stock"].unique()
+        stock_options = ticks.stocks
         selected_stock = st.sidebar.selectbox("Select Stock", stock_options)
-        filtered_data = data[data["stock"] == selected_stock]
+        # Only the selected stock is expanded into a full DataFrame
+        filtered_data = ticks.select(stock=selected_stock).to_pandas(
+            ["timestamp", "bidVolume", "bidPrice", "askVolume", "askPrice", "period", "midPrice"]
+        )
+
+        # Precomputed bars of the selected stock, one pyramid per period
+        period_keys = {
+            period: stock_key("bars", training_data_dir, selected_stock, period, prefixes=("market_data", "trade_data"))
+            for period in ticks.periods
+        }
+        pyramids = background(
+            ("bar_pyramids", selected_stock, None, tuple(key[3] for key in period_keys.values()), ()),
+            lambda cache=get_cache(): load_pyramids(training_data_dir, selected_stock, period_keys, cache),
+            slot="other_graphs:bars",
+            label="Building bars",
+        )
 
         st.header(f"Visualizations for Stock {selected_stock}")
 
         # Price Heatmap
         st.subheader("Price Heatmap")
-        heatmap_data = filtered_data.copy()
-        heatmap_data["minute"] = heatmap_data["timestamp"].dt.floor("T")
-        heatmap_pivot = heatmap_data.pivot_table(
-            index="minute", columns="period", values="midPrice", aggfunc="mean"
-        )
-        sns.heatmap(heatmap_pivot, cmap="coolwarm", cbar_kws={"label": "Mid Price"})
-        st.pyplot(plt.gcf())
-        plt.clf()
+        if pyramids:
+            heatmap_data = pd.concat(
+                [pyramid["1m"][["bar", "midPrice"]].assign(period=period) for period, pyramid in pyramids.items()],
+                ignore_index=True,
+            )
+            heatmap_data["minute"] = pd.to_datetime(heatmap_data["bar"], unit="ns").dt.strftime("%H:%M")
+            heatmap_pivot = heatmap_data.pivot(index="minute", columns="period", values="midPrice")
+            sns.heatmap(heatmap_pivot, cmap="coolwarm", cbar_kws={"label": "Mid Price"})
+            st.pyplot(plt.gcf())
+            plt.clf()
+        else:
+            st.warning(f"No market data found for Stock {selected_stock}.")
 
         # Volume vs. Price Change Correlation
         st.subheader("Volume vs. Price Change Correlation")
         filtered_data["price_change"] = filtered_data["midPrice"].pct_change()
-        sns.scatterplot(
-            x=filtered_data["bidVolume"],
-            y=filtered_data["price_change"],
-            alpha=0.5
-        )
-        plt.xlabel("Bid Volume")
-        plt.ylabel("Price Change (%)")
-        st.pyplot(plt.gcf())
-        plt.clf()
+        # Every tick is binned into a fixed-size image rather than drawn as a marker;
+        # ticks in near-empty bins are still drawn as points
+        volume = filtered_data["bidVolume"].to_numpy(dtype="float64")
+        price_change = filtered_data["price_change"].to_numpy(dtype="float64")
+        volume_grid = density_grid(volume, price_change)
+        sparse = sparse_points(volume_grid, volume, price_change)
+        fig, ax = plt.subplots()
+        image = render_density(ax, volume_grid, sparse=(volume[sparse], price_change[sparse], None))
+        fig.colorbar(image, ax=ax, label="Ticks")
+        ax.set_xlabel("Bid Volume")
+        ax.set_ylabel("Price Change (%)")
+        st.pyplot(fig)
+        plt.close(fig)
 
         # Candlestick Chart with Momentum
         st.subheader("Candlestick Chart with Momentum")
-        candlestick_fig = go.Figure(
-            data=[
-                go.Candlestick(
-                    x=filtered_data["timestamp"],
-                    open=filtered_data["bidPrice"],
-                    high=filtered_data["askPrice"],
-                    low=filtered_data["bidPrice"],
-                    close=filtered_data["askPrice"],
-                    name="Candlestick"
-                ),
-                go.Scatter(
-                    x=filtered_data["timestamp"],
-                    y=filtered_data["midPrice"].pct_change(),
-                    mode="lines",
-                    name="Momentum"
-                )
-            ]
-        )
-        candlestick_fig.update_layout(title="Candlestick and Momentum", xaxis_title="Time", yaxis_title="Price")
-        st.plotly_chart(candlestick_fig)
+        if pyramids:
+            resolution = choose_resolution(sum(active_span(p) for p in pyramids.values()), MAX_CANDLES)
+            candles = pd.concat([pyramid[resolution] for pyramid in pyramids.values()], ignore_index=True)
+            candlestick_fig = go.Figure(
+                data=[
+                    go.Candlestick(
+                        x=candles["timestamp"],
+                        open=candles["open"],
+                        high=candles["high"],
+                        low=candles["low"],
+                        close=candles["close"],
+                        name=f"Candlestick ({resolution})"
+                    ),
+                    go.Scatter(
+                        x=candles["timestamp"],
+                        y=candles["close"].pct_change(),
+                        mode="lines",
+                        name="Momentum"
+                    )
+                ]
+            )
+            candlestick_fig.update_layout(title="Candlestick and Momentum", xaxis_title="Time", yaxis_title="Price")
+            st.plotly_chart(candlestick_fig)
+        else:
+            st.warning(f"No market data found for Stock {selected_stock}.")
 
         # Cross-Correlation Heatmap
         st.subheader("Cross-Correlation Heatmap")
-        correlation_matrix = data.pivot_table(
-            index="timestamp", columns="stock", values="midPrice"
-        ).corr()
+        # Mid prices of every stock on a shared 1s grid, correlated as 1s returns
+        panel = background(
+            tree_key("panel", training_data_dir, features=("midPrice", "1s")),
+            lambda: panel_from_ticks(ticks, "midPrice", "1s"),
+            slot="other_graphs:panel",
+            label="Aligning stocks on a 1s grid",
+        )
+        returns = panel_returns(panel, ticks.stocks)
+        lag = st.slider("Lag (seconds)", 0, 60, 0)
+        correlation_matrix = pd.DataFrame(
+            lagged_correlation(returns[ticks.stocks].to_numpy(), [lag], returns["period"].to_numpy())[0],
+            index=ticks.stocks,
+            columns=ticks.stocks,
+        )
         sns.heatmap(correlation_matrix, annot=True, cmap="coolwarm", cbar_kws={"label": "Correlation"})
+        plt.xlabel(f"Stock, {lag}s later")
+        plt.ylabel("Stock")
         st.pyplot(plt.gcf())
         plt.clf()
 
+        # Rolling correlation of the selected stock with the others, window by window within each period
+        st.subheader(f"Rolling {ROLLING_WINDOW}s Correlation with Stock {selected_stock}")
+        column_index = ticks.stocks.index(selected_stock)
+        rolling_frames = []
+        for _, period_returns in returns.groupby("period", sort=False, observed=True):
+            rolling = rolling_correlation(period_returns[ticks.stocks].to_numpy(), ROLLING_WINDOW)
+            if len(rolling):
+                rolling_frames.append(pd.DataFrame(
+                    rolling[:, column_index, :],
+                    index=period_returns["timestamp"].iloc[ROLLING_WINDOW - 1:],
+                    columns=ticks.stocks,
+                ))
+        if rolling_frames:
+            st.line_chart(pd.concat(rolling_frames).drop(columns=selected_stock))
+
         # Trade Clustering
         st.subheader("Trade Clustering")
-        from sklearn.cluster import KMeans
-        
-        cluster_data = filtered_data[["midPrice", "bidVolume"]].dropna()
-        kmeans = KMeans(n_clusters=3, random_state=42).fit(cluster_data)
-        filtered_data["cluster"] = kmeans.labels_
-
-        sns.scatterplot(
-            x=filtered_data["midPrice"],
-            y=filtered_data["bidVolume"],
-            hue=filtered_data["cluster"],
-            palette="Set1"
+        # Fitted on a sample (or in mini-batches) and cached per stock files, so the cost
+        # does not grow with the periods; every tick is shown through a per-cluster density image
+        fit_method = st.selectbox(
+            "Fit clusters on",
+            METHODS,
+            format_func={"sample": "A stratified sample", "minibatch": "Every tick, in mini-batches"}.get,
         )
-        plt.xlabel("Mid Price")
-        plt.ylabel("Bid Volume")
-        st.pyplot(plt.gcf())
-        plt.clf()
+        clusters = background(
+            tree_key("clusters", training_data_dir, [selected_stock], features=(fit_method, N_CLUSTERS)),
+            lambda: cluster_ticks(ticks.select(stock=selected_stock), N_CLUSTERS, fit_method),
+            slot="other_graphs:clusters",
+            label="Clustering ticks",
+        )
+        sparse = clusters["sparse"]
+        st.caption(
+            f"Fitted on {clusters['fit_rows']:,} of {clusters['rows']:,} ticks, "
+            f"{len(sparse):,} of them drawn as points. Ticks per cluster: "
+            + ", ".join(f"{cluster}: {size:,}" for cluster, size in enumerate(clusters["sizes"]))
+        )
+
+        fig, ax = plt.subplots()
+        render_density(
+            ax,
+            clusters["grid"],
+            colors=sns.color_palette("Set1", N_CLUSTERS),
+            labels=[f"Cluster {cluster}" for cluster in range(N_CLUSTERS)],
+            sparse=(sparse["midPrice"], sparse["bidVolume"], sparse["cluster"]),
+        )
+        ax.set_xlabel("Mid Price")
+        ax.set_ylabel("Bid Volume")
+        st.pyplot(fig)
+        plt.close(fig)
 
     else:
         st.warning("No data found in the specified directory.")
@@ -3,104 +3,99 @@ import pandas as pd
 import plotly.graph_objects as go
 import os
 
+from pages.utils.cache import cached, stock_key
+from pages.utils.downsample import downsample
+from pages.utils.manifest import load, time_bounds, to_time_ns
+from pages.utils.rolling import RollingStats
+from pages.utils.tick_store import STOCKS, list_periods
+from pages.utils.timestamps import NS_PER_SECOND, to_datetime64
 
-def load_and_combine_data(directory, stock, period):
-    
-    combined_data = pd.DataFrame()
-    period_path = os.path.join(directory, period, stock)
-    column_names = ['bidVolume', 'bidPrice', 'askVolume', 'askPrice', 'timestamp']
-    
-    if os.path.exists(period_path):
-        for file in sorted(os.listdir(period_path)):
-            if file.startswith("market_data"):
-                data = pd.read_csv(
-                    os.path.join(period_path, file),
-                    header=None if "market_data_A_1.csv" in file else "infer",
-                )
-                if "market_data_A_1.csv" in file:
-                    data.columns = column_names
-                combined_data = pd.concat([combined_data, data], ignore_index=True)
-    return combined_data
+WINDOW_FEATURES = ("midPrice", "30_sec_std", "60_sec_std")
+
+
+def load_window(directory, stock, period, t0, t1):
+    """
+    Load a stock's data between t0 and t1 (ns since midnight) with the mid
+    price and rolling std features.
+    """
+    # Only files overlapping the window are read; the extra minute warms up the rolling std
+    data = load(stock, period, t0 - 60 * NS_PER_SECOND, t1, directory)
+
+    # Add midPrice column
+    data["midPrice"] = (data["bidPrice"] + data["askPrice"]) / 2
+
+    # Rolling standard deviations
+    stats = RollingStats(("30s", "60s")).push_many(data["time_ns"].to_numpy(), data["bidPrice"].to_numpy())
+    data["30_sec_std"] = stats[("30s", "std")]
+    data["60_sec_std"] = stats[("60s", "std")]
+
+    return data[(data["time_ns"] >= t0) & (data["time_ns"] <= t1)]
 
 
 st.title("Interactive Stock Data Visualization")
 
 # Directory setup
 training_data_dir = "./TestData"
-stocks = ["A", "B", "C", "D", "E"]
-periods = sorted(os.listdir(training_data_dir))
+stocks = STOCKS
+periods = list_periods(training_data_dir)
 
 if os.path.exists(training_data_dir):
     selected_period = st.selectbox("Select a period:", periods)
     selected_stock = st.selectbox("Select a stock:", stocks)
 
     if selected_period and selected_stock:
-        # Load and combine data
-        data = load_and_combine_data(training_data_dir, selected_stock, selected_period)
-
-        if not data.empty:
-            # Ensure timestamp is in datetime format
-            data["timestamp"] = pd.to_datetime(data["timestamp"], errors="coerce")
-            data = data.dropna(subset=["timestamp"])  # Drop invalid timestamps
-
-            # Add midPrice column
-            data["midPrice"] = (data["bidPrice"] + data["askPrice"]) / 2
-
-            # Rolling standard deviations
-            data.set_index("timestamp", inplace=True)
-            data["30_sec_std"] = data["bidPrice"].rolling("30s").std()
-            data["60_sec_std"] = data["bidPrice"].rolling("60s").std()
-            data.reset_index(inplace=True)
-
-            # Time range selection
-            min_time = data["timestamp"].min()
-            max_time = data["timestamp"].max()
-
-            if pd.isnull(min_time) or pd.isnull(max_time):
-                st.warning("No valid timestamps found in the data.")
-            else:
-                # Convert min_time and max_time to Python datetime
-                min_time = min_time.to_pydatetime()
-                max_time = max_time.to_pydatetime()
-
-                # Debugging: Print min_time and max_time types
-                st.write(f"min_time: {min_time}, type: {type(min_time)}")
-                st.write(f"max_time: {max_time}, type: {type(max_time)}")
-
-                selected_time = st.slider(
-                    "Select a time range:",
-                    min_value=min_time,
-                    max_value=max_time,
-                    value=(min_time, max_time),
-                    format="HH:mm:ss",
-                )
-                filtered_data = data[
-                    (data["timestamp"] >= pd.Timestamp(selected_time[0])) &
-                    (data["timestamp"] <= pd.Timestamp(selected_time[1]))
-                ]
-
-                # Plot the graph
-                st.subheader("Stock Price Visualization")
-                fig = go.Figure()
-
-                fig.add_trace(
-                    go.Scatter(
-                        x=filtered_data["timestamp"],
-                        y=filtered_data["bidPrice"],
-                        mode="lines",
-                        name="Bid Price",
-                    )
+        # Time bounds come from the manifest, so nothing is read before the slider is set
+        min_ns, max_ns = time_bounds(selected_stock, selected_period, training_data_dir)
+
+        if min_ns is not None:
+            # Convert min_time and max_time to Python datetime
+            min_time = pd.Timestamp(to_datetime64(min_ns, selected_period)).to_pydatetime()
+            max_time = pd.Timestamp(to_datetime64(max_ns, selected_period)).to_pydatetime()
+
+            # Debugging: Print min_time and max_time types
+            st.write(f"min_time: {min_time}, type: {type(min_time)}")
+            st.write(f"max_time: {max_time}, type: {type(max_time)}")
+
+            selected_time = st.slider(
+                "Select a time range:",
+                min_value=min_time,
+                max_value=max_time,
+                value=(min_time, max_time),
+                format="HH:mm:ss",
+            )
+            t0 = to_time_ns(selected_time[0])
+            t1 = to_time_ns(selected_time[1])
+
+            filtered_data = cached(
+                stock_key("stock_plot", training_data_dir, selected_stock, selected_period, WINDOW_FEATURES)
+                + (t0, t1),
+                lambda: load_window(training_data_dir, selected_stock, selected_period, t0, t1),
+            )
+
+            # Plot the graph
+            st.subheader("Stock Price Visualization")
+            fig = go.Figure()
+
+            # Only a few points per pixel are sent; moving the slider re-downsamples the window
+            plot_data = downsample(filtered_data, "timestamp", ["bidPrice"])
+            fig.add_trace(
+                go.Scatter(
+                    x=plot_data["timestamp"],
+                    y=plot_data["bidPrice"],
+                    mode="lines",
+                    name="Bid Price",
                 )
+            )
 
-                fig.update_layout(
-                    title=f"Stock Data Visualization for {selected_stock} in {selected_period}",
-                    xaxis_title="Timestamp",
-                    yaxis_title="Value",
-                )
-                st.plotly_chart(fig)
+            fig.update_layout(
+                title=f"Stock Data Visualization for {selected_stock} in {selected_period}",
+                xaxis_title="Timestamp",
+                yaxis_title="Value",
+            )
+            st.plotly_chart(fig)
 
-                st.write("Filtered Data")
-                st.dataframe(filtered_data)
+            st.write("Filtered Data")
+            st.dataframe(filtered_data)
         else:
             st.warning(f"No data found for Stock {selected_stock} in {selected_period}.")
 else:
@@ -0,0 +1,205 @@
+"""
+Multi-resolution OHLCV bars (1s, 10s, 1m, 5m) per stock and period.
+
+Bars use the mid price for open/high/low/close and also carry the mean
+bid/ask/mid price, mean spread, mean quoted bid/ask volume, quote count and
+the traded volume and trade count from trade_data__*.csv.
+
+Each source file's 1s bars are persisted next to its Parquet copy and only
+rebuilt when that file changes. A stock's pyramid is then assembled by
+rolling the per-file 1s bars up level by level, so a new market_data file only
+costs its own bars. Charts read the finest resolution whose bar count fits
+the visible range, instead of raw ticks.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from pages.utils.tick_store import CACHE_VERSION, cache_path, is_fresh, list_files, read_tick_file, write_cache
+from pages.utils.timestamps import NS_PER_SECOND, to_datetime64
+
+RESOLUTIONS = {
+    "1s": NS_PER_SECOND,
+    "10s": 10 * NS_PER_SECOND,
+    "1m": 60 * NS_PER_SECOND,
+    "5m": 300 * NS_PER_SECOND,
+}
+# Bump whenever the stored bar layout changes so stale files get rebuilt
+BAR_VERSION = 1
+# Bars are built from parsed ticks, so a change to the tick parsing rebuilds them too
+_FILE_BARS_VERSION = f"{BAR_VERSION}.{CACHE_VERSION}"
+
+# How each stored column rolls up into a coarser bar; every other column is summed
+_ROLLUP = {"open": "first", "high": "max", "low": "min", "close": "last"}
+
+
+def rollup(bars, resolution_ns):
+    """
+    Aggregate bars (or tick rows shaped like bars) into `resolution_ns` buckets.
+    Args:
+        bars (pd.DataFrame): A `bar` column of ns since midnight plus value
+            columns; open/high/low/close roll up as first/max/min/last and
+            everything else is summed.
+        resolution_ns (int): Bucket width.
+
+    Returns:
+        pd.DataFrame: One row per non-empty bucket, ordered by `bar`.
+    """
+    bucket = bars["bar"].to_numpy() // resolution_ns * resolution_ns
+    order = None
+    if len(bucket) and (np.diff(bucket) < 0).any():
+        order = np.argsort(bucket, kind="stable")
+        bucket = bucket[order]
+    if len(bucket) == 0:
+        return bars.iloc[:0].copy()
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(bucket)] - 1
+
+    rolled = {"bar": bucket[starts]}
+    for name in bars.columns:
+        if name == "bar":
+            continue
+        values = bars[name].to_numpy()
+        if order is not None:
+            values = values[order]
+        how = _ROLLUP.get(name, "sum")
+        if how == "first":
+            rolled[name] = values[starts]
+        elif how == "last":
+            rolled[name] = values[ends]
+        elif how == "max":
+            rolled[name] = np.maximum.reduceat(values, starts)
+        elif how == "min":
+            rolled[name] = np.minimum.reduceat(values, starts)
+        else:
+            rolled[name] = np.add.reduceat(values, starts)
+    return pd.DataFrame(rolled)
+
+
+def quote_bars(data, resolution_ns=RESOLUTIONS["1s"]):
+    """
+    Bars of market_data quotes (needs time_ns, bid/ask prices and volumes).
+    """
+    bid = data["bidPrice"].to_numpy(dtype=np.float64)
+    ask = data["askPrice"].to_numpy(dtype=np.float64)
+    mid = (bid + ask) / 2
+    ticks = pd.DataFrame({
+        "bar": data["time_ns"].to_numpy(),
+        "open": mid, "high": mid, "low": mid, "close": mid,
+        "mid_sum": mid,
+        "bid_sum": bid,
+        "ask_sum": ask,
+        "spread_sum": ask - bid,
+        "bid_volume_sum": data["bidVolume"].to_numpy(dtype=np.float64),
+        "ask_volume_sum": data["askVolume"].to_numpy(dtype=np.float64),
+        "ticks": np.ones(len(mid), dtype=np.int64),
+    })
+    return rollup(ticks, resolution_ns)
+
+
+def trade_bars(data, resolution_ns=RESOLUTIONS["1s"]):
+    """
+    Bars of trade_data prints: traded volume and trade count.
+    """
+    ticks = pd.DataFrame({
+        "bar": data["time_ns"].to_numpy(),
+        "volume": data["volume"].to_numpy(dtype=np.float64),
+        "trades": np.ones(len(data), dtype=np.int64),
+    })
+    return rollup(ticks, resolution_ns)
+
+
+def _file_bars_path(path):
+    return os.path.splitext(cache_path(path))[0] + ".bars_1s.parquet"
+
+
+def file_bars(path):
+    """
+    1s bars of one source file, read from disk when still fresh.
+    """
+    cached = _file_bars_path(path)
+    if is_fresh(path, cached, _FILE_BARS_VERSION):
+        return pd.read_parquet(cached)
+    data = read_tick_file(path)
+    if os.path.basename(path).startswith("trade_data"):
+        bars = trade_bars(data)
+    else:
+        bars = quote_bars(data)
+    write_cache(path, bars, cached, _FILE_BARS_VERSION)
+    return bars
+
+
+def _finish(quotes, trades, period):
+    """
+    Join quote and trade bars and turn the sums into the displayed columns.
+    """
+    bars = quotes.merge(trades, on="bar", how="left") if not trades.empty else quotes.assign(volume=0.0, trades=0)
+    ticks = bars["ticks"].to_numpy()
+    return pd.DataFrame({
+        "timestamp": to_datetime64(bars["bar"].to_numpy(), period),
+        "bar": bars["bar"].to_numpy(),
+        "open": bars["open"].to_numpy(),
+        "high": bars["high"].to_numpy(),
+        "low": bars["low"].to_numpy(),
+        "close": bars["close"].to_numpy(),
+        "midPrice": bars["mid_sum"].to_numpy() / ticks,
+        "bidPrice": bars["bid_sum"].to_numpy() / ticks,
+        "askPrice": bars["ask_sum"].to_numpy() / ticks,
+        "spread": bars["spread_sum"].to_numpy() / ticks,
+        "bidVolume": bars["bid_volume_sum"].to_numpy() / ticks,
+        "askVolume": bars["ask_volume_sum"].to_numpy() / ticks,
+        "ticks": ticks,
+        "volume": bars["volume"].fillna(0).to_numpy(),
+        "trades": bars["trades"].fillna(0).to_numpy().astype(np.int64),
+    })
+
+
+def bar_pyramid(directory, stock, period):
+    """
+    Every resolution of bars for one stock in one period.
+
+    Returns:
+        dict: Resolution name ("1s", "10s", "1m", "5m") -> DataFrame with
+        timestamp, OHLC mid, mean prices/spread/quoted volumes, quote count,
+        traded volume and trade count. Empty dict when there are no quotes.
+    """
+    market = [file_bars(path) for path in list_files(directory, period, stock, "market_data")]
+    market = [bars for bars in market if not bars.empty]
+    if not market:
+        return {}
+    trade = [file_bars(path) for path in list_files(directory, period, stock, "trade_data")]
+    trade = [bars for bars in trade if not bars.empty]
+
+    # Rolling the concatenated per-file bars up again merges bars split across file boundaries
+    quotes = rollup(pd.concat(market, ignore_index=True), RESOLUTIONS["1s"])
+    trades = rollup(pd.concat(trade, ignore_index=True), RESOLUTIONS["1s"]) if trade else pd.DataFrame()
+
+    pyramid = {}
+    for name, resolution_ns in RESOLUTIONS.items():
+        quotes = rollup(quotes, resolution_ns)
+        if not trades.empty:
+            trades = rollup(trades, resolution_ns)
+        pyramid[name] = _finish(quotes, trades, period)
+    return pyramid
+
+
+def choose_resolution(span_ns, max_bars):
+    """
+    Finest resolution that needs no more than `max_bars` bars to cover
+    `span_ns`, or the coarsest one when none does.
+    """
+    for name, resolution_ns in RESOLUTIONS.items():
+        if span_ns / resolution_ns <= max_bars:
+            return name
+    return list(RESOLUTIONS)[-1]
+
+
+def active_span(pyramid):
+    """
+    Time actually covered by a pyramid's quotes, in ns.
+    """
+    bars = pyramid.get("1s")
+    if bars is None or bars.empty:
+        return 0
+    return int(bars["bar"].iloc[-1] - bars["bar"].iloc[0]) + RESOLUTIONS["1s"]
@@ -0,0 +1,180 @@
+"""
+Process-wide cache for loaded tick data and derived features.
+
+Streamlit reruns a page script on every widget change, and each session runs
+its own copy of the script. The cache here lives in a `st.cache_resource`
+singleton, so every session in the server process shares it. Entries are keyed
+by what they were built from:
+
+    (name, stock, period, file fingerprint, feature set)
+
+They are evicted least-recently-used once the total size goes over a byte
+budget. Cached values are shared between sessions, so callers must treat them
+as read-only.
+"""
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from pages.utils.tick_store import list_all_files, list_files
+
+# Total bytes kept in the cache; override with the TICK_CACHE_BYTES env variable
+DEFAULT_BUDGET = int(os.environ.get("TICK_CACHE_BYTES", 2 * 1024 ** 3))
+
+
+def sizeof(value):
+    """
+    Approximate number of bytes held by a cached value.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(sizeof(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def fingerprint(paths):
+    """
+    Short hash of a set of files' paths, mtimes and sizes. Changes whenever
+    any of the files is added, removed or rewritten.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        digest.update(f"{path}|{stat.st_mtime_ns}|{stat.st_size};".encode())
+    return digest.hexdigest()[:16]
+
+
+def stock_key(name, directory, stock, period, features=(), prefixes=("market_data",)):
+    """
+    Cache key for data derived from one stock's files in one period.
+    """
+    paths = [path for prefix in prefixes for path in list_files(directory, period, stock, prefix)]
+    return (name, stock, period, fingerprint(paths), tuple(features))
+
+
+def tree_fingerprint(directory, stocks=None, prefixes=("market_data",)):
+    """
+    Fingerprint of the files of every period of the selected stocks, of the
+    kinds in `prefixes` ("market_data", "trade_data").
+    """
+    paths = [path for prefix in prefixes for path in list_all_files(directory, stocks, prefix)[0]]
+    return fingerprint(paths)
+
+
+def tree_key(name, directory, stocks=None, features=()):
+    """
+    Cache key for data derived from every period of the selected stocks.
+    """
+    return (name, tuple(stocks or ()), None, tree_fingerprint(directory, stocks), tuple(features))
+
+
+class TickCache:
+    """
+    Thread-safe LRU cache bounded by the total size of its values.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            # Values bigger than the whole budget are returned but never stored
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for `key`, calling `compute()` and storing its
+        result on a miss.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+@st.cache_resource
+def get_cache():
+    """
+    The cache shared by every session of this server process.
+    """
+    return TickCache()
+
+
+def cached(key, compute):
+    """
+    Shorthand for `get_cache().get_or_compute(key, compute)`.
+    """
+    return get_cache().get_or_compute(key, compute)
+
+
+def show_cache_stats():
+    """
+    Print the cache counters in the sidebar.
+    """
+    stats = get_cache().stats()
+    st.sidebar.caption(
+        f"Cache: {stats['entries']} entries, {stats['bytes'] / 1024 ** 2:.0f} / "
+        f"{stats['max_bytes'] / 1024 ** 2:.0f} MB, {stats['hits']} hits, {stats['misses']} misses"
+    )
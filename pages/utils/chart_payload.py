@@ -0,0 +1,67 @@
+"""
+Builds slim Bokeh data sources for the Overview charts.
+
+`ColumnDataSource(data)` serialises every column of the frame, including ones
+no glyph uses, and the Overview page used to build four of them. Here a single
+source is built instead. It holds only the plotted columns of the downsampled
+rows, with the time axis as float64 milliseconds and the values as float32.
+Bokeh sends NumPy arrays of those dtypes as binary buffers instead of JSON
+number lists.
+"""
+import json
+
+import numpy as np
+from bokeh.embed import json_item
+from bokeh.models import ColumnDataSource
+
+from pages.utils.downsample import downsample_indices
+
+VALUE_DTYPE = np.float32
+
+
+def project(data, columns, x="timestamp"):
+    """
+    Column dict holding only `x` and `columns` as compact NumPy arrays.
+    Args:
+        data (pd.DataFrame): Source rows.
+        columns (list): Value columns to keep.
+        x (str): Datetime column, converted to float64 milliseconds (Bokeh's
+            datetime unit).
+
+    Returns:
+        dict: Column name -> np.ndarray.
+    """
+    x_values = data[x].to_numpy(dtype="datetime64[ns]").view(np.int64) / 1e6
+    projected = {x: x_values.astype(np.float64)}
+    for name in columns:
+        projected[name] = data[name].to_numpy(dtype=VALUE_DTYPE)
+    return projected
+
+
+def shared_source(data, series, n_out, x="timestamp"):
+    """
+    One ColumnDataSource for several charts sharing the same x axis.
+    Args:
+        data (pd.DataFrame): Rows sorted by `x`.
+        series (dict): Downsampling method ("lttb" / "minmax") -> columns it applies to.
+        n_out (int): Points kept per series.
+        x (str): Datetime column used as the x axis.
+
+    Returns:
+        ColumnDataSource: Union of the rows every series needs, with only the
+        plotted columns.
+    """
+    x_values = data[x].to_numpy()
+    indices = np.unique(np.concatenate([
+        downsample_indices(x_values, [data[name].to_numpy() for name in columns], n_out, method)
+        for method, columns in series.items()
+    ]))
+    columns = [name for names in series.values() for name in names]
+    return ColumnDataSource(project(data.iloc[indices], columns, x))
+
+
+def payload_bytes(model):
+    """
+    Size of the JSON Streamlit sends for a Bokeh figure or layout.
+    """
+    return len(json.dumps(json_item(model)).encode())
@@ -0,0 +1,151 @@
+"""
+Clustering of a stock's ticks without fitting KMeans on all of them.
+
+The Trade Clustering chart fitted KMeans on every tick of the stock across
+all periods and scattered all of them. Here:
+
+- the model is fitted either on a sample stratified by period (every period
+  contributes in proportion to its ticks), which costs the same whatever the
+  number of periods, or with MiniBatchKMeans over shuffled batches of every
+  tick, which grows linearly with them but stays far cheaper than a full fit;
+- every tick is then assigned to its cluster chunk by chunk, a linear pass
+  that gives the cluster sizes without holding a distance matrix of the
+  whole stock;
+- the chart is a per-cluster density image of every tick (see
+  `pages.utils.raster`), with the ticks of near-empty bins kept as points,
+  instead of a scatter of all of them.
+
+`cluster_ticks` does all three and returns a small summary that the page
+caches under the fingerprint of the stock's files.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from pages.utils.progress import advance, stage
+from pages.utils.raster import DensityGrid, data_range, sparse_points
+
+METHODS = ("sample", "minibatch")
+# Rows the sampled fit uses
+SAMPLE_ROWS = 200_000
+# Rows assigned at a time
+CHUNK_ROWS = 1 << 18
+# Rows per MiniBatchKMeans update, and rows of the sample its centres start from
+MINIBATCH_ROWS = 1 << 16
+SEED_ROWS = 20_000
+
+
+def stratified_sample(strata, size, rng):
+    """
+    Row positions of a sample of `size` rows, allocated to every stratum in
+    proportion to its rows (at least one row per stratum).
+    Args:
+        strata (np.ndarray): Stratum code of every row, e.g. the period.
+        size (int): Rows wanted in total.
+        rng (np.random.Generator): Source of randomness.
+
+    Returns:
+        np.ndarray: Sorted row positions.
+    """
+    n = len(strata)
+    if size >= n:
+        return np.arange(n)
+    order = np.argsort(strata, kind="stable")
+    _, starts, counts = np.unique(strata[order], return_index=True, return_counts=True)
+    quotas = np.maximum(1, np.round(counts * size / n).astype(np.int64))
+    picked = [order[start + rng.choice(count, min(quota, count), replace=False)]
+              for start, count, quota in zip(starts, counts, quotas)]
+    return np.sort(np.concatenate(picked))
+
+
+def fit_clusters(X, n_clusters=3, method="sample", strata=None, sample_rows=SAMPLE_ROWS, batch_rows=MINIBATCH_ROWS,
+                 random_state=42):
+    """
+    Fit a KMeans-style model without fitting on every row at once.
+    Args:
+        X (np.ndarray): Rows to cluster.
+        n_clusters (int): Number of clusters.
+        method (str): "sample" fits KMeans on a stratified sample of
+            `sample_rows` rows; "minibatch" runs MiniBatchKMeans over every row
+            in shuffled batches of `batch_rows`, starting from the centres of
+            a small sample.
+        strata (np.ndarray): Stratum code per row for the sample; one stratum by default.
+
+    Returns:
+        tuple: (fitted model, rows it was fitted on).
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, not {method!r}")
+    if len(X) < n_clusters:
+        raise ValueError(f"Need at least {n_clusters} rows to find {n_clusters} clusters")
+    rng = np.random.default_rng(random_state)
+    strata = np.zeros(len(X), dtype=np.int8) if strata is None else strata
+    if method == "sample":
+        rows = stratified_sample(strata, sample_rows, rng)
+        stage("Fitting clusters on a sample")
+        return KMeans(n_clusters=n_clusters, n_init=10, random_state=random_state).fit(X[rows]), len(rows)
+
+    # partial_fit alone initialises from its first batch and can settle in a poor split
+    seed = KMeans(n_clusters=n_clusters, n_init=10, random_state=random_state)
+    seed.fit(X[stratified_sample(strata, SEED_ROWS, rng)])
+    model = MiniBatchKMeans(n_clusters=n_clusters, init=seed.cluster_centers_, n_init=1, random_state=random_state)
+    order = rng.permutation(len(X))
+    batches = range(0, len(X), batch_rows)
+    stage("Fitting clusters in mini-batches", len(batches))
+    for start in batches:
+        rows = order[start:start + batch_rows]
+        if len(rows) >= n_clusters:
+            model.partial_fit(X[rows])
+        advance(rows=len(rows))
+    return model, len(X)
+
+
+def assign_clusters(model, X, chunk_rows=CHUNK_ROWS):
+    """
+    Cluster of every row, predicted one chunk at a time.
+    """
+    labels = np.empty(len(X), dtype=np.int8)
+    chunks = range(0, len(X), chunk_rows)
+    stage("Assigning clusters", len(chunks))
+    for start in chunks:
+        labels[start:start + chunk_rows] = model.predict(X[start:start + chunk_rows])
+        advance(rows=min(chunk_rows, len(X) - start))
+    return labels
+
+
+def cluster_ticks(ticks, n_clusters=3, method="sample", columns=("midPrice", "bidVolume"), random_state=42):
+    """
+    Cluster one stock's ticks on `columns` and summarise the result.
+    Args:
+        ticks (CompactTicks): The stock's ticks over every period.
+        n_clusters (int): Number of clusters.
+        method (str): See `fit_clusters`.
+        columns (tuple): Columns clustered on; "midPrice" or stored value columns.
+
+    Returns:
+        dict: "model", "rows" (ticks clustered), "fit_rows", "sizes" (ticks per
+        cluster), "grid", a `DensityGrid` of the first two columns with one
+        layer per cluster, and "sparse", a DataFrame of `columns` and cluster
+        for the ticks of its sparse bins.
+    """
+    X = np.column_stack([
+        ticks.mid_price() if name == "midPrice" else ticks.column(name) for name in columns
+    ])
+    finite = np.isfinite(X).all(axis=1)
+    X, periods = X[finite], ticks.period_codes[finite]
+    model, fit_rows = fit_clusters(X, n_clusters, method, strata=periods, random_state=random_state)
+    labels = assign_clusters(model, X)
+    stage("Rasterising clusters")
+    x, y = X[:, 0], X[:, 1]
+    grid = DensityGrid(data_range(x), data_range(y), categories=n_clusters).add(x, y, labels)
+    rows = sparse_points(grid, x, y, labels, seed=random_state)
+    sparse = pd.DataFrame(X[rows], columns=list(columns))
+    sparse["cluster"] = labels[rows]
+    return {
+        "model": model,
+        "rows": len(X),
+        "fit_rows": fit_rows,
+        "sizes": np.bincount(labels, minlength=n_clusters),
+        "grid": grid,
+        "sparse": sparse,
+    }
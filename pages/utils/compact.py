@@ -0,0 +1,314 @@
+"""
+Compact in-memory form of the combined tick data.
+
+`load_all_data` returns float64 columns plus a duplicated time column for every
+tick, which is several GB once every stock and period is loaded. CompactTicks
+keeps the same ticks as NumPy arrays in narrow dtypes:
+
+- timestamp: int64 nanoseconds since the epoch (the period date is included)
+- prices and volumes: int32 multiples of 1/scale, with one scale per stock and
+  column. Prices sit on 0.01 / 0.25 / 0.1 / 1/64 grids and a few volumes are
+  fractional; float32 would round about a fifth of the prices (by up to 1e-4),
+  while the scaled integers read back as the exact float64 values
+- stock and period: int8 codes into small category lists
+
+Pages keep a CompactTicks around and expand only the rows/columns they plot
+with `to_pandas`.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from pages.utils.progress import advance, stage
+from pages.utils.tick_store import (
+    build_caches,
+    cache_path,
+    list_all_files,
+    natural_sort,
+    read_tick_file,
+)
+
+VALUE_COLUMNS = ['bidVolume', 'bidPrice', 'askVolume', 'askPrice']
+CODE_DTYPE = np.int32
+# Scales tried for a stock's column, coarsest first; the first that holds every value exactly is kept
+SCALES = (1, 2, 4, 8, 10, 16, 32, 64, 100, 128, 256, 1_000, 10_000, 100_000, 1_000_000)
+# Code of a missing value
+MISSING = np.iinfo(CODE_DTYPE).min
+_LARGEST = np.iinfo(CODE_DTYPE).max
+
+
+def _peak(values):
+    """Largest finite |value|, 0 when there is none."""
+    return np.abs(values[np.isfinite(values)]).max(initial=0.0)
+
+
+def grid_scale(values):
+    """
+    Coarsest of SCALES that turns every finite value into an int32 without
+    loss, or None when there is none.
+    """
+    finite = values[np.isfinite(values)]
+    peak = _peak(values)
+    for scale in SCALES:
+        if peak * scale > _LARGEST:
+            return None
+        if np.array_equal(np.round(finite * scale) / scale, finite):
+            return scale
+    return None
+
+
+def _encode(values, scale):
+    codes = np.full(len(values), MISSING, dtype=CODE_DTYPE)
+    finite = np.isfinite(values)
+    codes[finite] = np.round(values[finite] * scale)
+    return codes
+
+
+class ScaledColumn:
+    """
+    A price or volume column held as int32 codes with one scale per stock code,
+    read back as float64. When some stock's values fit no grid, the column is
+    held as float64 instead and `scales` is None.
+    """
+
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    @classmethod
+    def empty(cls, rows, stocks):
+        """
+        A column of `rows` rows to `put` values into; a scale of 0 marks a stock
+        with no values yet.
+        """
+        return cls(np.empty(rows, dtype=CODE_DTYPE), np.zeros(stocks, dtype=np.int64))
+
+    @classmethod
+    def encode(cls, values, stock_codes, stocks):
+        """
+        Encode a whole column at once.
+        Args:
+            values (np.ndarray): float64 values.
+            stock_codes (np.ndarray): Stock code of every value.
+            stocks (int): Number of stock codes.
+        """
+        rows = [np.flatnonzero(stock_codes == code) for code in range(stocks)]
+        scales = [grid_scale(values[index]) for index in rows]
+        if None in scales:
+            return cls(values.astype(np.float64), None)
+        codes = np.empty(len(values), dtype=CODE_DTYPE)
+        for index, scale in zip(rows, scales):
+            codes[index] = _encode(values[index], scale)
+        return cls(codes, np.array(scales, dtype=np.int64))
+
+    def put(self, start, values, stock_code, stock_codes):
+        """
+        Store one stock's values at rows start:start + len(values). When they need
+        a finer grid than the stock's earlier rows, the stock's scale is refined
+        and those rows are recoded.
+        Args:
+            start (int): First row.
+            values (np.ndarray): float64 values.
+            stock_code (int): Their stock.
+            stock_codes (np.ndarray): Stock code of every row, at least up to `start`.
+        """
+        end = start + len(values)
+        if self.scales is not None:
+            current = int(self.scales[stock_code])
+            scale = grid_scale(values)
+            scale = scale and (math.lcm(current, scale) if current else scale)
+            # The refined scale can be finer than the one the new values were checked with
+            if scale and _peak(values) * scale > _LARGEST:
+                scale = None
+            if scale and current and scale != current and not self._rescale(stock_code, stock_codes[:start], scale):
+                scale = None
+            if scale is None:
+                self._to_float(stock_codes[:start])
+            else:
+                self.scales[stock_code] = scale
+                self.codes[start:end] = _encode(values, scale)
+                return
+        self.codes[start:end] = values
+
+    def _rescale(self, stock_code, stock_codes, scale):
+        """
+        Recode a stock's rows among the first len(stock_codes) onto a finer
+        scale; False, leaving them as they were, if they would overflow.
+        """
+        rows = np.flatnonzero(stock_codes == stock_code)
+        codes = self.codes[rows].astype(np.int64)
+        present = codes != MISSING
+        codes[present] *= scale // int(self.scales[stock_code])
+        if np.abs(codes[present]).max(initial=0) > _LARGEST:
+            return False
+        self.codes[rows] = codes
+        return True
+
+    def _to_float(self, stock_codes):
+        """
+        Switch the column to float64, decoding its first len(stock_codes) rows.
+        """
+        values = np.empty(len(self.codes), dtype=np.float64)
+        written = len(stock_codes)
+        values[:written] = ScaledColumn(self.codes[:written], self.scales).decode(stock_codes)
+        self.codes, self.scales = values, None
+
+    def decode(self, stock_codes):
+        """
+        float64 values of the rows, given their stock codes.
+        """
+        if self.scales is None:
+            return self.codes.astype(np.float64)
+        # Dividing the integer by the scale gives back the very float64 the value was parsed as
+        values = self.codes / self.scales[stock_codes].astype(np.float64)
+        values[self.codes == MISSING] = np.nan
+        return values
+
+    def take(self, index):
+        return ScaledColumn(self.codes[index], self.scales)
+
+
+class CompactTicks:
+    """
+    Market data of several stocks/periods held as narrow NumPy arrays.
+    """
+
+    def __init__(self, timestamp, values, stock_codes, stocks, period_codes, periods):
+        self.timestamp = timestamp
+        self.values = values
+        self.stock_codes = stock_codes
+        self.stocks = list(stocks)
+        self.period_codes = period_codes
+        self.periods = list(periods)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the arrays."""
+        return (
+            self.timestamp.nbytes
+            + sum(column.nbytes for column in self.values.values())
+            + self.stock_codes.nbytes
+            + self.period_codes.nbytes
+        )
+
+    @classmethod
+    def from_frame(cls, data):
+        """
+        Build from a frame shaped like the output of `load_all_data`.
+        """
+        stock = pd.Categorical(data["stock"])
+        period = pd.Categorical(data["period"])
+        stock_codes = stock.codes.astype(np.int8)
+        return cls(
+            timestamp=data["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64),
+            values={
+                name: ScaledColumn.encode(data[name].to_numpy(dtype=np.float64), stock_codes, len(stock.categories))
+                for name in VALUE_COLUMNS
+            },
+            stock_codes=stock_codes,
+            stocks=stock.categories,
+            period_codes=period.codes.astype(np.int8),
+            periods=period.categories,
+        )
+
+    def _take(self, index):
+        return CompactTicks(
+            self.timestamp[index],
+            {name: column.take(index) for name, column in self.values.items()},
+            self.stock_codes[index],
+            self.stocks,
+            self.period_codes[index],
+            self.periods,
+        )
+
+    def select(self, stock=None, period=None):
+        """
+        Ticks of one stock and/or period, still in compact form.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if stock is not None:
+            mask &= self.stock_codes == (self.stocks.index(stock) if stock in self.stocks else -1)
+        if period is not None:
+            mask &= self.period_codes == (self.periods.index(period) if period in self.periods else -1)
+        return self._take(mask)
+
+    def column(self, name):
+        """float64 values of one of VALUE_COLUMNS."""
+        return self.values[name].decode(self.stock_codes)
+
+    def mid_price(self):
+        """Mid price of every tick."""
+        return (self.column("bidPrice") + self.column("askPrice")) / 2
+
+    def to_pandas(self, columns=None):
+        """
+        Expand into a regular DataFrame with float64 values, a datetime64
+        `timestamp` and categorical `stock`/`period`.
+        Args:
+            columns (list): Columns to expand; "midPrice" is also accepted.
+                Defaults to every stored column.
+        """
+        columns = columns or ["timestamp", *VALUE_COLUMNS, "stock", "period"]
+        data = {}
+        for name in columns:
+            if name == "timestamp":
+                data[name] = self.timestamp.view("datetime64[ns]")
+            elif name == "midPrice":
+                data[name] = self.mid_price()
+            elif name == "stock":
+                data[name] = pd.Categorical.from_codes(self.stock_codes, categories=self.stocks)
+            elif name == "period":
+                data[name] = pd.Categorical.from_codes(self.period_codes, categories=self.periods)
+            else:
+                data[name] = self.column(name)
+        return pd.DataFrame(data)
+
+
+def load_compact(directory, stocks=None, max_workers=None):
+    """
+    Load market data for all periods and selected stocks straight into
+    CompactTicks, one file at a time, so the full-width frame never exists.
+    Args:
+        directory (str): Path to the data directory.
+        stocks (list): Stock symbols to load, or None for every stock folder found.
+        max_workers (int): Processes used to build missing Parquet copies.
+
+    Returns:
+        CompactTicks: Ticks ordered by (period, stock, file index).
+    """
+    paths, labels = list_all_files(directory, stocks)
+    build_caches(paths, max_workers)
+
+    # Row counts come from the Parquet footers, so the buffers are sized up front
+    lengths = [pq.read_metadata(cache_path(path)).num_rows for path in paths]
+    total = sum(lengths)
+    all_stocks = natural_sort({stock for stock, _ in labels})
+    all_periods = natural_sort({period for _, period in labels})
+    timestamp = np.empty(total, dtype=np.int64)
+    values = {name: ScaledColumn.empty(total, len(all_stocks)) for name in VALUE_COLUMNS}
+    stock_codes = np.empty(total, dtype=np.int8)
+    period_codes = np.empty(total, dtype=np.int8)
+
+    stage("Reading tick files", len(paths))
+    start = 0
+    for path, (stock, period), length in zip(paths, labels, lengths):
+        advance(rows=length)
+        end = start + length
+        data = read_tick_file(path, columns=["timestamp", *VALUE_COLUMNS])
+        timestamp[start:end] = data["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        code = all_stocks.index(stock)
+        for name in VALUE_COLUMNS:
+            values[name].put(start, data[name].to_numpy(dtype=np.float64), code, stock_codes)
+        stock_codes[start:end] = code
+        period_codes[start:end] = all_periods.index(period)
+        start = end
+    return CompactTicks(timestamp, values, stock_codes, all_stocks, period_codes, all_periods)
@@ -0,0 +1,269 @@
+"""
+Streaming detection of sharp price moves, tick by tick.
+
+The `sharp_change` label needs the whole history loaded before it exists.
+`SharpMoveDetector` instead takes ticks as they arrive, one at a time or in
+batches, and raises an alert as soon as a stock's price has moved more than
+a threshold within a horizon:
+
+- a drop when the price is more than `threshold` below the highest price
+  of the horizon, a rise when it is more than `threshold` above the lowest;
+- horizon "tick" compares with the previous tick only, which is exactly the
+  offline |momentum| > threshold label.
+
+Every (stock, period, rule) keeps the high and low of `buckets` time
+buckets that span the horizon, in monotonic deques, so the state per stock
+is bounded whatever the tick rate. The horizon is resolved to one bucket
+(horizon / buckets). A period starts from a clean state, so its first tick
+is not compared with the last tick of the previous one. Alerts go to a
+callback or a `queue.Queue`, and the latest ones of each stock and period
+are kept for display.
+"""
+import math
+import queue
+import threading
+from collections import deque
+
+import pandas as pd
+
+from pages.utils.features import SHARP_CHANGE_THRESHOLD
+from pages.utils.rolling import _to_ns, window_ns
+
+DIRECTIONS = ("down", "up", "both")
+BUCKETS = 64
+# Alerts kept per stock and period in `SharpMoveDetector.recent`
+RECENT_ALERTS = 1000
+
+
+class Rule:
+    """
+    One alerting rule.
+    Args:
+        horizon: "tick", or a window as ns or a pandas offset string like "10s".
+        threshold (float): Relative move that raises an alert, e.g. 0.05 for 5%.
+        direction (str): "down", "up" or "both".
+        cooldown: Minimum time between two alerts of the rule in the same
+            direction; defaults to the horizon, so a move that persists
+            alerts once per horizon.
+    """
+
+    def __init__(self, horizon="tick", threshold=SHARP_CHANGE_THRESHOLD, direction="both", cooldown=None):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}, not {direction!r}")
+        if threshold <= 0:
+            raise ValueError("threshold must be positive")
+        self.label = "tick" if horizon in ("tick", 0, None) else str(horizon)
+        self.horizon = 0 if self.label == "tick" else window_ns(horizon)
+        self.threshold = threshold
+        self.direction = direction
+        self.cooldown = self.horizon if cooldown is None else window_ns(cooldown)
+
+    def __repr__(self):
+        return f"Rule({self.label!r}, {self.threshold}, {self.direction!r})"
+
+
+class _Horizon:
+    """
+    Bucketed high/low of one stock over one rule's horizon.
+    """
+
+    def __init__(self, rule, buckets):
+        self.rule = rule
+        self.buckets = buckets
+        self.width = max(1, rule.horizon // buckets) if rule.horizon else 0
+        # (bucket, extreme) of completed buckets, best first
+        self.highs = deque()
+        self.lows = deque()
+        self.bucket = None
+        self.high = -math.inf
+        self.low = math.inf
+        self.last_alert = {"down": -math.inf, "up": -math.inf}
+
+    def reference(self, timestamp):
+        """
+        (high, low) of the horizon before `timestamp`, not counting it.
+        """
+        if not self.width:
+            return self.high, self.low
+        bucket = timestamp // self.width
+        if bucket != self.bucket:
+            if self.bucket is not None and self.high > -math.inf:
+                while self.highs and self.highs[-1][1] <= self.high:
+                    self.highs.pop()
+                self.highs.append((self.bucket, self.high))
+                while self.lows and self.lows[-1][1] >= self.low:
+                    self.lows.pop()
+                self.lows.append((self.bucket, self.low))
+            self.bucket, self.high, self.low = bucket, -math.inf, math.inf
+        oldest = bucket - self.buckets
+        while self.highs and self.highs[0][0] < oldest:
+            self.highs.popleft()
+        while self.lows and self.lows[0][0] < oldest:
+            self.lows.popleft()
+        high = max(self.highs[0][1], self.high) if self.highs else self.high
+        low = min(self.lows[0][1], self.low) if self.lows else self.low
+        return high, low
+
+    def add(self, price):
+        if self.width:
+            self.high = max(self.high, price)
+            self.low = min(self.low, price)
+        else:
+            self.high = self.low = price
+
+
+class SharpMoveDetector:
+    """
+    Flags sharp moves per stock over several horizons as ticks stream in.
+    Args:
+        rules: List of `Rule` applied to every stock, or a dict of
+            stock -> list of `Rule` where "*" covers the stocks not listed.
+            Defaults to the offline label: any tick-to-tick move over
+            SHARP_CHANGE_THRESHOLD.
+        on_alert: Callable given each alert dict, or a `queue.Queue` to put
+            them on.
+        buckets (int): Buckets per horizon.
+        keep (int): Latest alerts kept in `recent` per stock and period;
+            None keeps them all.
+    """
+
+    def __init__(self, rules=None, on_alert=None, buckets=BUCKETS, keep=RECENT_ALERTS):
+        if rules is None:
+            rules = [Rule()]
+        self.rules = rules if isinstance(rules, dict) else {"*": rules}
+        self.on_alert = on_alert
+        self.buckets = buckets
+        self.keep = keep
+        # (stock, period) -> latest alerts
+        self.recent = {}
+        self.states = {}
+        self.last_timestamp = {}
+        self.ticks = 0
+        self.alerts = 0
+        # Ticks may be pushed from an ingest thread while a page reads the alerts
+        self._lock = threading.Lock()
+
+    def rules_for(self, stock):
+        return self.rules.get(stock, self.rules.get("*", []))
+
+    @staticmethod
+    def _matches(key, stock, period):
+        return (stock is None or key[0] == stock) and (period is None or key[1] == period)
+
+    def reset(self, stock=None, period=None, alerts=False):
+        """
+        Forget the price history of a stock and period, or of all of them.
+        Args:
+            stock (str): Stock to reset, or None for every stock.
+            period (str): Period to reset, or None for every period.
+            alerts (bool): Also drop their alerts from `recent`, e.g. when the
+                ticks they came from are replaced.
+        """
+        for key in [key for key in self.states if self._matches(key, stock, period)]:
+            del self.states[key]
+        for key in [key for key in self.last_timestamp if self._matches(key, stock, period)]:
+            del self.last_timestamp[key]
+        if alerts:
+            with self._lock:
+                for key in [key for key in self.recent if self._matches(key, stock, period)]:
+                    del self.recent[key]
+
+    def _emit(self, alert):
+        with self._lock:
+            self.alerts += 1
+            self.recent.setdefault((alert["stock"], alert["period"]), deque(maxlen=self.keep)).append(alert)
+        if isinstance(self.on_alert, queue.Queue):
+            self.on_alert.put_nowait(alert)
+        elif self.on_alert is not None:
+            self.on_alert(alert)
+
+    def push(self, stock, timestamp, price, period=None):
+        """
+        Add one tick.
+        Args:
+            stock (str): Stock symbol.
+            timestamp: Tick time (ns int or datetime-like), not before the
+                previous tick of the stock in the period.
+            price (float): Price, e.g. the mid price.
+            period (str): Period of the tick, e.g. "Period16"; each period has
+                its own state.
+
+        Returns:
+            list: Alert dicts raised by this tick.
+        """
+        return self.push_many(stock, [_to_ns(timestamp)], [price], period)
+
+    def push_many(self, stock, timestamps, prices, period=None):
+        """
+        Add a time-ordered batch of one stock's ticks in a period.
+
+        Returns:
+            list: Alert dicts raised by the batch, oldest first.
+        """
+        timestamps = _to_ns(timestamps).tolist()
+        prices = [float(price) for price in prices]
+        if not timestamps:
+            return []
+        key = (stock, period)
+        last = self.last_timestamp.get(key, -math.inf)
+        if timestamps[0] < last or any(b < a for a, b in zip(timestamps, timestamps[1:])):
+            raise ValueError(f"Ticks of {stock} must arrive in time order")
+        states = self.states.get(key)
+        if states is None:
+            states = self.states[key] = [_Horizon(rule, self.buckets) for rule in self.rules_for(stock)]
+
+        alerts = []
+        for state in states:
+            rule = state.rule
+            threshold, cooldown, last_alert = rule.threshold, rule.cooldown, state.last_alert
+            check_down = rule.direction != "up"
+            check_up = rule.direction != "down"
+            for timestamp, price in zip(timestamps, prices):
+                high, low = state.reference(timestamp)
+                state.add(price)
+                if check_down and high > -math.inf:
+                    move = price / high - 1
+                    if move < -threshold and timestamp - last_alert["down"] >= cooldown:
+                        last_alert["down"] = timestamp
+                        alerts.append(self._alert(stock, period, timestamp, rule, "down", move, price, high))
+                if check_up and low < math.inf:
+                    move = price / low - 1
+                    if move > threshold and timestamp - last_alert["up"] >= cooldown:
+                        last_alert["up"] = timestamp
+                        alerts.append(self._alert(stock, period, timestamp, rule, "up", move, price, low))
+
+        self.last_timestamp[key] = timestamps[-1]
+        self.ticks += len(timestamps)
+        alerts.sort(key=lambda alert: alert["time_ns"])
+        for alert in alerts:
+            self._emit(alert)
+        return alerts
+
+    @staticmethod
+    def _alert(stock, period, timestamp, rule, direction, move, price, reference):
+        return {
+            "stock": stock,
+            "period": period,
+            "time_ns": timestamp,
+            "horizon": rule.label,
+            "direction": direction,
+            "move": move,
+            "threshold": rule.threshold,
+            "price": price,
+            "reference": reference,
+        }
+
+    def alerts_frame(self, stock=None, period=None):
+        """
+        The latest alerts of a stock and period (None for all of them) as a
+        DataFrame, newest first, with a `timestamp` column.
+        """
+        columns = ["stock", "period", "time_ns", "horizon", "direction", "move", "threshold", "price", "reference"]
+        with self._lock:
+            recent = [
+                alert for key, alerts in self.recent.items() if self._matches(key, stock, period)
+                for alert in alerts
+            ]
+        frame = pd.DataFrame(recent, columns=columns).sort_values("time_ns", kind="stable")
+        frame.insert(0, "timestamp", pd.to_datetime(frame["time_ns"]))
+        return frame.iloc[::-1].reset_index(drop=True)
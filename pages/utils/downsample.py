@@ -0,0 +1,140 @@
+"""
+Server-side downsampling of time series before they are sent to the browser.
+
+A stock/period has up to a few million ticks while a chart is ~900 px wide, so
+shipping every tick only costs serialisation and rendering time. `downsample`
+keeps a few points per pixel using Largest-Triangle-Three-Buckets (shape
+preserving) or min/max per pixel bucket (envelope preserving). The global
+min/max of every series are always kept, so low/high markers still sit on a
+plotted point.
+"""
+import numpy as np
+
+CHART_WIDTH = 900
+POINTS_PER_PIXEL = 2
+
+
+def target_points(width=CHART_WIDTH, points_per_pixel=POINTS_PER_PIXEL):
+    """
+    Number of points worth plotting on a chart `width` pixels wide.
+    """
+    return int(width * points_per_pixel)
+
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.view(np.int64)
+    return x.astype(np.float64)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices picked by Largest-Triangle-Three-Buckets.
+    Args:
+        x (np.ndarray): Increasing x values (numbers or datetime64).
+        y (np.ndarray): y values without NaNs.
+        n_out (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Sorted indices into x/y, always including the first and last point.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = _as_float(x)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket i covers [edges[i], edges[i + 1]); the first and last points are kept as is
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(x, y, n_out):
+    """
+    Indices of the min and max y in each of n_out // 2 equal-width x buckets,
+    plus the first and last point.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    x = _as_float(x)
+    y = np.asarray(y, dtype=np.float64)
+    n_buckets = n_out // 2
+    span = x[-1] - x[0]
+    if span <= 0:
+        buckets = np.zeros(n, dtype=np.int64)
+    else:
+        buckets = np.minimum(((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+
+    # Within each bucket rows are ordered by y, so the group ends are its min and max
+    order = np.lexsort((y, buckets))
+    sorted_buckets = buckets[order]
+    starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+
+METHODS = {"lttb": lttb_indices, "minmax": minmax_indices}
+
+
+def downsample_indices(x, ys, n_out, method="lttb"):
+    """
+    Row indices to keep so every series in `ys` is represented by about
+    n_out points sharing the same x.
+    Args:
+        x (np.ndarray): Increasing x values.
+        ys (list): y arrays of the same length as x; NaNs are skipped.
+        n_out (int): Points to keep per series.
+        method (str): "lttb" or "minmax".
+
+    Returns:
+        np.ndarray: Sorted, unique row indices including each series' global
+        min and max.
+    """
+    pick = METHODS[method]
+    keep = []
+    for y in ys:
+        y = np.asarray(y, dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(y))
+        if len(valid) == 0:
+            continue
+        keep.append(valid[pick(np.asarray(x)[valid], y[valid], n_out)])
+        keep.append(valid[[np.argmin(y[valid]), np.argmax(y[valid])]])
+    if not keep:
+        return np.arange(min(len(x), n_out))
+    return np.unique(np.concatenate(keep))
+
+
+def downsample(data, x, ys, n_out=None, method="lttb"):
+    """
+    Downsample a DataFrame for plotting.
+    Args:
+        data (pd.DataFrame): Rows sorted by `x`.
+        x (str): Column used as the x axis.
+        ys (list): Columns plotted against x.
+        n_out (int): Points per series; defaults to `target_points()`.
+        method (str): "lttb" or "minmax".
+
+    Returns:
+        pd.DataFrame: The kept rows, in their original order.
+    """
+    n_out = n_out or target_points()
+    if len(data) <= n_out:
+        return data
+    index = downsample_indices(data[x].to_numpy(), [data[y].to_numpy() for y in ys], n_out, method)
+    return data.iloc[index]
@@ -0,0 +1,187 @@
+"""
+Feature matrices persisted per (stock, period) as Parquet.
+
+Partitions live under CACHE_DIR/features/<data dir>/<definition>/<period>/<stock>.parquet,
+where <definition> hashes the feature windows, the sharp change threshold
+and the code that computes them, the order book features of
+`microstructure.py` included. Editing any of those starts a new set of
+partitions instead of mixing old and new features. Each partition also
+records a fingerprint of its stock's market_data files in that period, so
+adding or rewriting files only recomputes the partitions they belong to.
+The training pages read the stored features instead of rebuilding them from
+raw ticks on every load.
+
+With `trades=True` the partitions also hold the trade order flow columns of
+`trades.py` (signed volume and trade count over the tick windows), and their
+fingerprint covers the trade_data files too. Those partitions have their own
+definition, so the default ones are not rebuilt.
+"""
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pages.utils import features, microstructure
+from pages.utils.cache import fingerprint
+from pages.utils.features import SHARP_CHANGE_THRESHOLD, WINDOWS, compute_features, feature_columns
+from pages.utils.microstructure import TIME_WINDOWS, compute_microstructure, microstructure_columns
+from pages.utils.progress import advance, stage
+from pages.utils.tick_store import CACHE_DIR, assemble, list_files, list_periods, list_stocks, load_stock, load_trades
+from pages.utils.trades import TRADE_FIELDS, add_trade_features, asof_positions, classify_trades, join_trades, \
+    tick_test, trade_feature_columns, trade_features
+
+STORE_VERSION = 2
+# Functions that produce the stored values; editing any of them starts a new store
+_DEFINITION_CODE = (
+    features._fill_group,
+    features.compute_features,
+    microstructure.spread,
+    microstructure.queue_imbalance,
+    microstructure.microprice,
+    microstructure.order_flow_imbalance,
+    microstructure.log_returns,
+    microstructure.tick_window_sum,
+    microstructure.time_window_sum,
+    microstructure.quote_features,
+    microstructure._fill_group,
+    microstructure.compute_microstructure,
+)
+# And those of the trade columns, for partitions that have them
+_TRADE_CODE = (asof_positions, tick_test, classify_trades, join_trades, add_trade_features, trade_features)
+
+
+def definition_hash(windows=WINDOWS, threshold=SHARP_CHANGE_THRESHOLD, trades=False):
+    """
+    Short hash of everything that decides the stored feature values.
+    """
+    definition = {
+        "version": STORE_VERSION,
+        "columns": feature_columns(windows) + microstructure_columns(windows),
+        "windows": list(windows),
+        "time_windows": list(TIME_WINDOWS),
+        "threshold": threshold,
+        "code": [inspect.getsource(function) for function in _DEFINITION_CODE],
+    }
+    if trades:
+        definition["trades"] = {
+            "columns": trade_feature_columns(windows),
+            "code": [inspect.getsource(function) for function in _TRADE_CODE],
+        }
+    return hashlib.sha1(json.dumps(definition, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def partition_path(directory, stock, period, definition):
+    directory_key = hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, "features", directory_key, definition, period, f"{stock}.parquet")
+
+
+def _is_current(path, definition, source):
+    if not os.path.exists(path):
+        return False
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return (
+        metadata.get(b"feature_definition") == definition.encode()
+        and metadata.get(b"source_fingerprint") == source.encode()
+    )
+
+
+def _write_partition(path, data, definition, source):
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"feature_definition": definition.encode(),
+        b"source_fingerprint": source.encode(),
+    })
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _build_partition(directory, stock, period, path, definition, source, windows, threshold, trades):
+    data = compute_microstructure(load_stock(directory, stock, period), windows, keys=[], max_workers=1)
+    data = compute_features(data, windows, threshold, keys=[], max_workers=1)
+    if trades:
+        data = trade_features(data, load_trades(directory, stock, period, TRADE_FIELDS), windows)
+    _write_partition(path, data.drop(columns=["stock", "period"], errors="ignore"), definition, source)
+
+
+def materialize(directory, stocks=None, windows=WINDOWS, threshold=SHARP_CHANGE_THRESHOLD, max_workers=None,
+                trades=False):
+    """
+    Bring every (stock, period) partition up to date, recomputing only the
+    ones whose market_data files changed.
+    Args:
+        directory (str): Path to the data directory.
+        stocks (list): Stock symbols, or None for every stock folder found.
+        windows (tuple): Rolling window lengths in ticks.
+        threshold (float): Sharp change threshold on absolute momentum.
+        max_workers (int): Threads recomputing stale partitions.
+        trades (bool): Also store the trade order flow columns.
+
+    Returns:
+        tuple: ([(stock, period, path)] of partitions with data,
+        [(stock, period)] of the ones rebuilt by this call).
+    """
+    definition = definition_hash(windows, threshold, trades)
+    partitions, stale = [], []
+    for period in list_periods(directory):
+        for stock in stocks or list_stocks(directory, period):
+            files = list_files(directory, period, stock, "market_data")
+            if not files:
+                continue
+            path = partition_path(directory, stock, period, definition)
+            source = fingerprint(files + (list_files(directory, period, stock, "trade_data") if trades else []))
+            partitions.append((stock, period, path))
+            if not _is_current(path, definition, source):
+                stale.append((directory, stock, period, path, definition, source, windows, threshold, trades))
+
+    if stale:
+        stage("Computing features", len(stale))
+        max_workers = max_workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for _ in pool.map(lambda job: _build_partition(*job), stale):
+                advance()
+    return partitions, [(job[1], job[2]) for job in stale]
+
+
+def read_features(directory, stocks=None, columns=None, windows=WINDOWS, threshold=SHARP_CHANGE_THRESHOLD,
+                  max_workers=None, trades=False):
+    """
+    Stored features of every stock and period, refreshed where needed.
+    Args:
+        directory (str): Path to the data directory.
+        stocks (list): Stock symbols, or None for every stock folder found.
+        columns (list): Stored columns to read; every column by default.
+        windows (tuple): Rolling window lengths in ticks.
+        threshold (float): Sharp change threshold on absolute momentum.
+        max_workers (int): Threads recomputing stale partitions.
+        trades (bool): Also store and read the trade order flow columns.
+
+    Returns:
+        pd.DataFrame: Rows ordered by (period, stock) with categorical
+        `stock` and `period` columns, like `load_all_data`.
+    """
+    partitions, _ = materialize(directory, stocks, windows, threshold, max_workers, trades)
+    frames, labels = [], []
+    stage("Reading features", len(partitions))
+    for stock, period, path in partitions:
+        frame = pd.read_parquet(path, columns=columns)
+        advance(rows=len(frame))
+        if not frame.empty:
+            frames.append(frame)
+            labels.append((stock, period))
+    if not frames:
+        if columns is None:
+            columns = feature_columns(windows) + microstructure_columns(windows)
+            columns += trade_feature_columns(windows) if trades else []
+        return pd.DataFrame(columns=columns + ["stock", "period"])
+    return assemble(frames, labels)
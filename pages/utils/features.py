@@ -0,0 +1,104 @@
+"""
+Rolling price features computed per (stock, period) group.
+
+The combined frame from `load_all_data` holds every stock and period back to
+back. Rolling windows and pct_change over the whole frame run from the end of
+one stock/period into the start of the next. Here every group is computed on
+its own rows only. The groups run on a thread pool (pandas' rolling kernels
+release the GIL) and write into output arrays allocated once for the whole
+frame, so the frame is not regrown one column at a time.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+GROUP_KEYS = ["stock", "period"]
+WINDOWS = (30, 60)
+SHARP_CHANGE_THRESHOLD = 0.05
+
+
+def feature_columns(windows=WINDOWS):
+    """
+    Names of the columns `compute_features` adds, in order.
+    """
+    columns = ["midPrice"]
+    columns += [f"rolling_avg_{w}" for w in windows]
+    columns += [f"rolling_std_{w}" for w in windows]
+    return columns + ["momentum", "sharp_change"]
+
+
+def group_indices(data, keys=GROUP_KEYS):
+    """
+    Row positions of every group: slices when each group's rows are
+    contiguous (as `load_all_data` returns them), index arrays otherwise.
+    """
+    keys = [key for key in keys if key in data.columns]
+    if not keys or data.empty:
+        return [slice(0, len(data))]
+    codes = np.stack([
+        data[key].cat.codes.to_numpy() if isinstance(data[key].dtype, pd.CategoricalDtype) else pd.factorize(data[key])[0]
+        for key in keys
+    ])
+    starts = np.r_[0, np.flatnonzero((codes[:, 1:] != codes[:, :-1]).any(axis=0)) + 1]
+    if len(np.unique(codes[:, starts], axis=1)[0]) == len(starts):
+        ends = np.r_[starts[1:], len(data)]
+        return [slice(int(start), int(end)) for start, end in zip(starts, ends)]
+    return list(data.groupby(keys, sort=False, observed=True).indices.values())
+
+
+def _fill_group(rows, mid, out, windows, threshold):
+    """
+    Compute one group's features into `out` at `rows`.
+    """
+    group_mid = mid[rows]
+    series = pd.Series(group_mid)
+    out["midPrice"][rows] = group_mid
+    for w in windows:
+        rolling = series.rolling(window=w)
+        out[f"rolling_avg_{w}"][rows] = rolling.mean().to_numpy()
+        out[f"rolling_std_{w}"][rows] = rolling.std().to_numpy()
+    momentum = np.empty(len(group_mid))
+    momentum[:1] = np.nan
+    momentum[1:] = group_mid[1:] / group_mid[:-1] - 1
+    out["momentum"][rows] = momentum
+    out["sharp_change"][rows] = np.abs(momentum) > threshold
+
+
+def compute_features(data, windows=WINDOWS, threshold=SHARP_CHANGE_THRESHOLD, keys=GROUP_KEYS, max_workers=None):
+    """
+    Add midPrice, rolling averages/standard deviations, momentum and the
+    sharp change target, each computed within its (stock, period) group.
+    Args:
+        data (pd.DataFrame): Market data with bidPrice/askPrice, time ordered
+            within each group. It is not modified.
+        windows (tuple): Rolling window lengths in ticks.
+        threshold (float): Absolute momentum above which a tick counts as a sharp change.
+        keys (list): Grouping columns; missing ones are ignored.
+        max_workers (int): Threads used across groups; defaults to the CPU count.
+
+    Returns:
+        pd.DataFrame: The input rows with the feature columns added, without
+        the rows at the start of each group where a window is not yet full.
+    """
+    n = len(data)
+    mid = (data["bidPrice"].to_numpy(dtype=np.float64) + data["askPrice"].to_numpy(dtype=np.float64)) / 2
+    out = {name: np.empty(n) for name in feature_columns(windows)}
+    out["sharp_change"] = np.empty(n, dtype=np.int64)
+
+    groups = group_indices(data, keys)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(groups) == 1:
+        for rows in groups:
+            _fill_group(rows, mid, out, windows, threshold)
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(lambda rows: _fill_group(rows, mid, out, windows, threshold), groups))
+
+    keep = ~np.isnan(out["momentum"])
+    for w in windows:
+        keep &= ~np.isnan(out[f"rolling_std_{w}"])
+    features = pd.DataFrame(out, index=data.index)
+    overlap = [name for name in features.columns if name in data.columns]
+    return pd.concat([data.drop(columns=overlap), features], axis=1)[keep]
@@ -0,0 +1,295 @@
+"""
+Tail-following ingest of tick files while they are being written.
+
+The pages read each CSV in full, and only when a selectbox changes. A feed
+that keeps appending rows (or starts new market_data_<stock>_<n>.csv files)
+is invisible in the meantime, and every look at it reparses everything.
+`IngestWatcher` follows a data directory instead:
+
+- every poll lists the Period/stock folders and stats each file;
+- a file that grew is read from the byte offset where the previous read
+  stopped, up to its last complete line, so a half-written row waits for
+  the next poll;
+- new files are picked up from their first line;
+- a file that shrank was rewritten, so the rows of its (stock, period) are
+  dropped, subscribers are told to reset it, and its files are read again
+  from where following them started.
+
+The parsed rows are appended to an in-memory store per (stock, period) and
+handed to subscribers as they arrive, e.g. the sharp move detector. Each
+(stock, period) has a version number that pages can use in their cache keys;
+it only ever grows, so a key made before a rewrite never matches again.
+A subscriber that raises, or a poll that fails, is reported as a warning and
+the background polling carries on.
+
+The Parquet tick cache is left alone: it rebuilds a file once, on the next
+full read, when the file's size no longer matches.
+"""
+import os
+import threading
+import warnings
+
+import pandas as pd
+import pyarrow as pa
+
+from pages.utils.tick_store import MARKET_COLUMNS, TRADE_COLUMNS, list_files, list_periods, list_stocks, \
+    natural_sort, parse_ticks, sniff_header
+
+POLL_INTERVAL = 0.5
+# Bytes read back from the end of a file to find its last complete line
+_TAIL_PROBE = 1 << 16
+
+
+class _Tail:
+    """
+    Read position in one growing file.
+    """
+
+    def __init__(self, path, stock, period, at_end=False):
+        self.path = path
+        self.stock = stock
+        self.period = period
+        self.offset = 0
+        self.columns = None
+        self.has_header = False
+        self.failed = False
+        if at_end:
+            self.offset = self._last_line_end()
+            if self.offset:
+                self.has_header, self.columns = sniff_header(path)
+        # Where following started, to read the file again after its (stock, period) is rewritten
+        self.start = self.offset
+
+    def truncated(self):
+        """Whether the file is now shorter than what was read of it."""
+        return os.path.getsize(self.path) < self.offset
+
+    def restart(self, from_top=False):
+        """
+        Read again from where following started, or from the first line.
+        """
+        self.offset = 0 if from_top else self.start
+        self.columns = None if self.offset == 0 else self.columns
+        self.failed = False
+
+    def _last_line_end(self):
+        size = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            f.seek(max(0, size - _TAIL_PROBE))
+            block = f.read()
+        return size - len(block) + block.rfind(b"\n") + 1
+
+    def read_new(self):
+        """
+        Parse the complete lines written since the previous read.
+
+        Returns:
+            tuple: (DataFrame or None when there are no new rows, bytes consumed).
+        """
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            # Truncated or replaced: start over
+            self.restart(from_top=True)
+        if size == self.offset:
+            return None, 0
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            block = f.read(size - self.offset)
+        end = block.rfind(b"\n") + 1
+        if end == 0:
+            return None, 0
+        block = block[:end]
+        skip = 0
+        if self.columns is None:
+            self.has_header, self.columns = sniff_header(self.path)
+            skip = 1 if self.has_header else 0
+        self.offset += end
+        if block.count(b"\n") <= skip:
+            return None, end
+        return parse_ticks(pa.BufferReader(block), self.path, self.columns, skip_rows=skip), end
+
+
+class IngestWatcher:
+    """
+    Follows a data directory and ingests the rows appended to its tick files.
+    Args:
+        directory (str): Data directory laid out like TestData.
+        stocks (list): Stock symbols, or None for every stock folder found.
+        prefix (str): "market_data" or "trade_data".
+        from_start (bool): Ingest the files already present from their first
+            line; otherwise only what is written after the first poll.
+    """
+
+    def __init__(self, directory, stocks=None, prefix="market_data", from_start=True):
+        self.directory = directory
+        self.stocks = stocks
+        self.prefix = prefix
+        self.from_start = from_start
+        self.tails = {}
+        self.frames = {}
+        self.versions = {}
+        self.subscribers = []
+        self.stats = {"polls": 0, "files": 0, "bytes": 0, "rows": 0}
+        self._polled = False
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback, replay=True, reset=None):
+        """
+        Call callback(stock, period, rows) for every batch of new rows.
+        Args:
+            callback (callable): Receives the stock, the period and a DataFrame.
+            replay (bool): First hand over the rows ingested so far.
+            reset (callable): Receives the stock and the period when a file of
+                theirs was rewritten; their rows then arrive again from the start.
+        """
+        with self._lock:
+            if replay:
+                for (stock, period), frames in self.frames.items():
+                    for frame in frames:
+                        callback(stock, period, frame)
+            self.subscribers.append((callback, reset))
+
+    def unsubscribe(self, callback):
+        """
+        Stop calling a subscribed callback (and its reset).
+        """
+        with self._lock:
+            self.subscribers = [pair for pair in self.subscribers if pair[0] is not callback]
+
+    def _notify(self, stock, period, batch=None):
+        """
+        Hand a batch (or a reset when None) to every subscriber; one that raises
+        is reported and does not keep the others from their rows.
+        """
+        for callback, reset in self.subscribers:
+            try:
+                if batch is not None:
+                    callback(stock, period, batch)
+                elif reset is not None:
+                    reset(stock, period)
+            except Exception as e:
+                warnings.warn(f"Ingest subscriber failed on {stock} {period}: {e!r}")
+
+    def _restart(self, stock, period, paths):
+        """
+        Drop the rows of a (stock, period) with a rewritten file and read its files again.
+        """
+        for path in paths:
+            tail = self.tails.get(path)
+            if tail is not None:
+                tail.restart(from_top=self._truncated(path))
+        rows = sum(len(frame) for frame in self.frames.pop((stock, period), []))
+        self.stats["rows"] -= rows
+        self.versions[(stock, period)] = self.versions.get((stock, period), 0) + 1
+        self._notify(stock, period)
+
+    def poll(self):
+        """
+        Ingest whatever was written since the previous poll.
+
+        Returns:
+            list: (stock, period, DataFrame) of the new rows, in file order.
+        """
+        batches = []
+        with self._lock:
+            for period in list_periods(self.directory):
+                for stock in self.stocks or list_stocks(self.directory, period):
+                    paths = list_files(self.directory, period, stock, self.prefix)
+                    if any(self._truncated(path) for path in paths):
+                        self._restart(stock, period, paths)
+                    for path in paths:
+                        batch = self._read(path, stock, period)
+                        if batch is not None:
+                            batches.append((stock, period, batch))
+            self._polled = True
+            self.stats["polls"] += 1
+            for stock, period, batch in batches:
+                self.frames.setdefault((stock, period), []).append(batch)
+                self.versions[(stock, period)] = self.versions.get((stock, period), 0) + 1
+                self.stats["rows"] += len(batch)
+                self._notify(stock, period, batch)
+        return batches
+
+    def _truncated(self, path):
+        tail = self.tails.get(path)
+        try:
+            return tail is not None and tail.truncated()
+        except FileNotFoundError:
+            return False
+
+    def _read(self, path, stock, period):
+        tail = self.tails.get(path)
+        try:
+            if tail is None:
+                at_end = self._polled is False and not self.from_start
+                tail = self.tails[path] = _Tail(path, stock, period, at_end)
+                self.stats["files"] += 1
+            if tail.failed:
+                return None
+            batch, consumed = tail.read_new()
+        except FileNotFoundError:
+            # Removed between listing and reading; a new file with that name starts over
+            self.tails.pop(path, None)
+            return None
+        except (ValueError, pa.ArrowInvalid) as e:
+            if tail is None:
+                tail = self.tails[path] = _Tail(path, stock, period)
+            tail.failed = True
+            warnings.warn(f"{path}: stopped following the file ({e})")
+            return None
+        self.stats["bytes"] += consumed
+        return batch if batch is not None and not batch.empty else None
+
+    def version(self, stock, period):
+        """
+        Number of batches ingested for a stock and period so far.
+        """
+        return self.versions.get((stock, period), 0)
+
+    def periods(self):
+        """
+        Periods with ingested rows, in natural order.
+        """
+        with self._lock:
+            return natural_sort({period for _, period in self.frames})
+
+    def frame(self, stock, period):
+        """
+        Every row ingested for a stock and period, in arrival order.
+        """
+        with self._lock:
+            frames = self.frames.get((stock, period), [])
+            if len(frames) > 1:
+                # Keep the concatenation, so the next call only adds the newer batches
+                frames[:] = [pd.concat(frames, ignore_index=True)]
+        if not frames:
+            return pd.DataFrame(columns=TRADE_COLUMNS if self.prefix == "trade_data" else MARKET_COLUMNS)
+        return frames[0]
+
+    def start(self, interval=POLL_INTERVAL):
+        """
+        Poll in a background thread every `interval` seconds until `stop`.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.poll()
+                except Exception as e:
+                    # e.g. the directory went away for a moment; the next poll tries again
+                    warnings.warn(f"Ingest poll of {self.directory} failed: {e!r}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name=f"ingest:{self.directory}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
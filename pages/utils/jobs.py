@@ -0,0 +1,213 @@
+"""
+Background jobs for the slow loads and trainings of the pages.
+
+A heavy page used to run its loading in the Streamlit script thread: the
+page froze, and any widget change threw the work away and started again.
+With `background(key, compute, slot)` the computation runs on a shared
+worker pool instead, and the page shows its progress and reruns itself
+until the result is there:
+
+- jobs are keyed like cache entries, so sessions asking for the same data
+  share one job instead of each starting their own;
+- each session has one job per slot (e.g. "other_graphs:bars"); asking for a
+  different key in a slot releases the old job, which is cancelled once no
+  session waits for it any more;
+- a finished result goes into the shared cache, and the last few finished
+  jobs are also kept for results too big to be cached.
+
+Cancellation is cooperative: the job stops at its next `progress.advance`.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from pages.utils.cache import get_cache
+from pages.utils.progress import Cancelled, Progress, bind
+
+JOB_WORKERS = 2
+# Finished jobs kept for sessions that have not collected their result yet
+KEEP_FINISHED = 8
+POLL_SECONDS = 0.5
+
+
+class Job:
+    """
+    One computation on the pool, with its progress and outcome.
+    """
+
+    def __init__(self, key, label):
+        self.key = key
+        self.progress = Progress(label)
+        self.state = "queued"
+        self.owners = set()
+        self.result = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.state in ("done", "failed", "cancelled")
+
+    def cancel(self):
+        self.progress.cancelled.set()
+        if self.future is not None and self.future.cancel():
+            self.state = "cancelled"
+
+
+class JobManager:
+    """
+    Runs keyed jobs on a thread pool, deduplicating identical requests and
+    cancelling the ones nobody waits for.
+    Args:
+        max_workers (int): Jobs running at once.
+        keep_finished (int): Finished jobs kept until their results are collected.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, keep_finished=KEEP_FINISHED):
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self.finished = OrderedDict()
+        self.slots = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+
+    def submit(self, key, compute, owner, label="Working"):
+        """
+        The job computing `key` for `owner`, starting it unless one is already
+        running or finished. Any other job the owner held is released.
+        """
+        with self._lock:
+            self._release(owner, keep=key)
+            self.slots[owner] = key
+            job = self.jobs.get(key)
+            # A cancelled job may still be winding down; it is replaced rather than joined.
+            # A failed one is kept until a session has shown its error and forgotten it
+            if job is None or job.state == "cancelled" or job.progress.cancelled.is_set():
+                job = self.jobs[key] = Job(key, label)
+                self.finished.pop(key, None)
+                job.future = self._pool.submit(self._run, job, compute)
+            job.owners.add(owner)
+            return job
+
+    def release(self, owner):
+        """
+        Detach `owner` from its job, cancelling the job if nobody else waits for it.
+        """
+        with self._lock:
+            self._release(owner)
+
+    def _release(self, owner, keep=None):
+        key = self.slots.get(owner)
+        if key is None or key == keep:
+            return
+        del self.slots[owner]
+        job = self.jobs.get(key)
+        if job is not None:
+            job.owners.discard(owner)
+            if not job.owners and not job.finished:
+                job.cancel()
+                if job.state == "cancelled":
+                    del self.jobs[key]
+
+    def forget(self, key):
+        """
+        Drop a finished job, e.g. once its error was shown, so the next request retries.
+        """
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is not None and job.finished:
+                del self.jobs[key]
+                self.finished.pop(key, None)
+
+    def _run(self, job, compute):
+        if job.progress.cancelled.is_set():
+            outcome = "cancelled"
+        else:
+            job.state = "running"
+            bind(job.progress)
+            try:
+                job.result = compute()
+                outcome = "done"
+            except Cancelled:
+                outcome = "cancelled"
+            except Exception as e:
+                job.error = e
+                outcome = "failed"
+            finally:
+                bind(None)
+        with self._lock:
+            job.state = outcome
+            if outcome == "cancelled":
+                if self.jobs.get(job.key) is job:
+                    del self.jobs[job.key]
+                return
+            self.finished[job.key] = job
+            while len(self.finished) > self.keep_finished:
+                key, _ = self.finished.popitem(last=False)
+                self.jobs.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            states = [job.state for job in self.jobs.values()]
+        return {state: states.count(state) for state in ("queued", "running", "done", "failed")}
+
+
+@st.cache_resource
+def get_jobs():
+    """
+    The job pool shared by every session of this server process.
+    """
+    return JobManager()
+
+
+def _owner(slot):
+    if "job_session" not in st.session_state:
+        st.session_state["job_session"] = uuid.uuid4().hex
+    return st.session_state["job_session"], slot
+
+
+def background(key, compute, slot, label="Loading"):
+    """
+    Like `cached(key, compute)`, but computed by a background job.
+
+    Returns the value once it is available. Until then, shows the job's
+    progress and reruns the page every POLL_SECONDS, so this call does not
+    return. A failed job's exception is raised here.
+    Args:
+        key (tuple): Cache key of the result.
+        compute (callable): Called with no arguments on a worker thread.
+        slot (str): Which of the page's jobs this is; a new key in the same
+            slot supersedes the session's previous job.
+        label (str): Shown until the job reports its first stage.
+    """
+    cache = get_cache()
+    jobs = get_jobs()
+    owner = _owner(slot)
+    sentinel = object()
+    value = cache.get(key, sentinel)
+    if value is not sentinel:
+        jobs.release(owner)
+        return value
+
+    job = jobs.submit(key, compute, owner, label)
+    if job.state == "done":
+        jobs.release(owner)
+        return cache.put(key, job.result)
+    if job.state == "failed":
+        jobs.release(owner)
+        jobs.forget(key)
+        raise job.error
+
+    progress = job.progress
+    waiting = len(job.owners)
+    text = progress.describe() if job.state == "running" else f"{label}: queued"
+    if waiting > 1:
+        text += f" (shared by {waiting} sessions)"
+    st.progress(progress.fraction() or 0.0, text=text)
+    time.sleep(POLL_SECONDS)
+    st.experimental_rerun()
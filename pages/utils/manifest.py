@@ -0,0 +1,210 @@
+"""
+Manifest of the tick files under a data directory.
+
+For every market_data / trade_data CSV it records the header presence, the
+column schema, the row count and the min/max `time_ns`. The manifest is saved
+as JSON next to the Parquet cache and entries are refreshed only when their
+source file's mtime or size changes. `load` uses it to skip files that fall
+outside a requested time window.
+"""
+import datetime
+import hashlib
+import json
+import numbers
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from pages.utils.tick_store import (
+    CACHE_DIR,
+    MARKET_COLUMNS,
+    TRADE_COLUMNS,
+    build_caches,
+    cache_path,
+    list_files,
+    list_periods,
+    list_stocks,
+    read_tick_file,
+    sniff_header,
+)
+
+MANIFEST_VERSION = 1
+DEFAULT_DIRECTORY = "./TestData"
+
+
+def _manifest_path(directory):
+    key = hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, "manifests", f"{key}.json")
+
+
+def _file_index(path):
+    match = re.search(r"_(\d+)\.csv$", path)
+    return int(match.group(1)) if match else 0
+
+
+def _describe_file(path, period, stock, kind):
+    """
+    Build the manifest entry of one tick file.
+    """
+    stat = os.stat(path)
+    has_header, source_columns = sniff_header(path)
+    times = read_tick_file(path, columns=["time_ns"])["time_ns"]
+    schema = pq.read_schema(cache_path(path))
+    return {
+        "path": path,
+        "period": period,
+        "stock": stock,
+        "kind": kind,
+        "index": _file_index(path),
+        "header": has_header,
+        "source_columns": source_columns,
+        "schema": {name: str(schema.field(name).type) for name in schema.names},
+        "rows": int(len(times)),
+        "min_ns": int(times.min()) if len(times) else None,
+        "max_ns": int(times.max()) if len(times) else None,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+
+def _is_current(entry, path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+
+
+def _read_manifest(path):
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def _write_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def get_manifest(directory=DEFAULT_DIRECTORY):
+    """
+    Load the manifest of a data directory, refreshing entries whose source
+    file was added, changed or removed since it was last saved.
+
+    Returns:
+        dict: {"version", "directory", "files": {path: entry}}.
+    """
+    manifest_path = _manifest_path(directory)
+    manifest = _read_manifest(manifest_path) or {
+        "version": MANIFEST_VERSION,
+        "directory": os.path.abspath(directory),
+        "files": {},
+    }
+    previous = manifest["files"]
+    stale = []
+    files = {}
+    for period in list_periods(directory):
+        for stock in list_stocks(directory, period):
+            for kind in ("market_data", "trade_data"):
+                for path in list_files(directory, period, stock, kind):
+                    entry = previous.get(path)
+                    if entry is None or not _is_current(entry, path):
+                        stale.append((path, period, stock, kind))
+                    else:
+                        files[path] = entry
+    if stale:
+        # Convert the new files in parallel first; describing them then only reads Parquet
+        build_caches([path for path, _, _, _ in stale])
+        for path, period, stock, kind in stale:
+            files[path] = _describe_file(path, period, stock, kind)
+    if stale or len(files) != len(previous):
+        manifest["files"] = files
+        _write_manifest(manifest_path, manifest)
+    return manifest
+
+
+def select_files(manifest, stock, period, t0=None, t1=None, kind="market_data"):
+    """
+    Manifest entries of a stock/period whose time bounds overlap [t0, t1],
+    ordered by file index.
+    """
+    entries = [
+        entry for entry in manifest["files"].values()
+        if entry["stock"] == stock and entry["period"] == period and entry["kind"] == kind
+        and entry["rows"] > 0
+        and (t0 is None or entry["max_ns"] >= t0)
+        and (t1 is None or entry["min_ns"] <= t1)
+    ]
+    return sorted(entries, key=lambda entry: entry["index"])
+
+
+def time_bounds(stock, period, directory=DEFAULT_DIRECTORY, kind="market_data"):
+    """
+    (min, max) `time_ns` of a stock in a period, without reading any data.
+    """
+    entries = select_files(get_manifest(directory), stock, period, kind=kind)
+    if not entries:
+        return None, None
+    return min(e["min_ns"] for e in entries), max(e["max_ns"] for e in entries)
+
+
+def to_time_ns(value):
+    """
+    Convert a bound to nanoseconds since midnight. Accepts ints (already in
+    nanoseconds), datetime.time, timedeltas and anything pd.Timestamp understands.
+    """
+    if value is None:
+        return None
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, datetime.time):
+        seconds = (value.hour * 60 + value.minute) * 60 + value.second
+        return seconds * 1_000_000_000 + value.microsecond * 1_000
+    if isinstance(value, (datetime.timedelta, np.timedelta64)):
+        return int(pd.Timedelta(value).value)
+    timestamp = pd.Timestamp(value)
+    return int(timestamp.value - timestamp.normalize().value)
+
+
+def _empty_ticks(kind, columns=None):
+    """
+    A frame without rows but with the columns and dtypes `read_tick_file` returns.
+    """
+    names = TRADE_COLUMNS if kind == "trade_data" else MARKET_COLUMNS
+    data = pd.DataFrame({name: np.empty(0, dtype=np.float64) for name in names if name != "timestamp"})
+    data["time_ns"] = np.empty(0, dtype=np.int64)
+    data["timestamp"] = np.empty(0, dtype="datetime64[ns]")
+    return data[columns] if columns else data
+
+
+def load(stock, period, t0=None, t1=None, directory=DEFAULT_DIRECTORY, kind="market_data", columns=None):
+    """
+    Load a stock's ticks in a period between t0 and t1 (inclusive).
+    Args:
+        stock (str): Stock symbol.
+        period (str): Period folder name, e.g. "Period16".
+        t0, t1: Time-of-day bounds (see `to_time_ns`); None leaves that side open.
+        directory (str): Path to the data directory.
+        kind (str): "market_data" or "trade_data".
+        columns (list): Optional subset of columns to read.
+
+    Returns:
+        pd.DataFrame: Only files overlapping the window are opened, and rows
+        outside it are filtered inside the Parquet reader.
+    """
+    t0, t1 = to_time_ns(t0), to_time_ns(t1)
+    entries = select_files(get_manifest(directory), stock, period, t0, t1, kind)
+    frames = [read_tick_file(e["path"], columns, time_range=(t0, t1)) for e in entries]
+    frames = [frame for frame in frames if not frame.empty]
+    if frames:
+        return pd.concat(frames, ignore_index=True)
+    return _empty_ticks(kind, columns)
@@ -0,0 +1,239 @@
+"""
+Order book features from the level 1 quote columns.
+
+The sharp change features only look at the mid price, while every quote also
+carries the best bid/ask volumes. These features use the whole top of the
+book and are computed per (stock, period) group with NumPy only: prefix sums
+for the windows and `np.searchsorted` for the time windows.
+
+- spread: (ask - bid) / mid
+- queue_imbalance: (bidVolume - askVolume) / (bidVolume + askVolume)
+- microprice: the mid weighted towards the thinner side,
+  (bid x askVolume + ask x bidVolume) / (bidVolume + askVolume), and
+  microprice_offset, its distance from the mid relative to the mid
+- ofi_<w>: order flow imbalance (Cont, Kukanov & Stoikov) summed over the
+  quote changes of the last w ticks; volume joining the bid or leaving the
+  ask counts as buying pressure
+- quote_rate_<T>: quote updates per second over the last T
+- realized_vol_<w> / realized_vol_<T>: square root of the summed squared
+  log mid returns over the last w ticks / the last T
+
+Tick windows match `features.py`: a window of w ticks holds w prices and the
+w - 1 changes between them, and is NaN until the group has w ticks. Time
+windows are (t - T, t] like pandas' rolling("10s"). The columns are float32
+since the models train on float32 anyway.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pages.utils.features import GROUP_KEYS, WINDOWS, group_indices
+from pages.utils.rolling import window_ns
+
+TIME_WINDOWS = ("10s", "60s")
+DTYPE = np.float32
+
+
+def spread(bid, ask):
+    """
+    Quoted spread relative to the mid.
+    """
+    return (ask - bid) / ((bid + ask) / 2)
+
+
+def queue_imbalance(bid_volume, ask_volume):
+    """
+    (bid - ask) / (bid + ask) queue sizes, in [-1, 1]; 0 when both queues are empty.
+    """
+    total = bid_volume + ask_volume
+    return np.divide(bid_volume - ask_volume, total, out=np.zeros(len(total)), where=total > 0)
+
+
+def microprice(bid, ask, bid_volume, ask_volume):
+    """
+    Mid price weighted by the opposite queue sizes; the mid when both queues are empty.
+    """
+    total = bid_volume + ask_volume
+    weighted = bid * ask_volume + ask * bid_volume
+    return np.divide(weighted, total, out=(bid + ask) / 2, where=total > 0)
+
+
+def order_flow_imbalance(bid, ask, bid_volume, ask_volume):
+    """
+    Order flow imbalance of every quote change; 0 for the first quote.
+    """
+    flow = np.zeros(len(bid))
+    if len(bid) < 2:
+        return flow
+    bid_up, bid_down = bid[1:] >= bid[:-1], bid[1:] <= bid[:-1]
+    ask_down, ask_up = ask[1:] <= ask[:-1], ask[1:] >= ask[:-1]
+    flow[1:] = (
+        np.where(bid_up, bid_volume[1:], 0.0) - np.where(bid_down, bid_volume[:-1], 0.0)
+        - np.where(ask_down, ask_volume[1:], 0.0) + np.where(ask_up, ask_volume[:-1], 0.0)
+    )
+    return flow
+
+
+def log_returns(mid):
+    """
+    Log mid returns; 0 for the first quote.
+    """
+    returns = np.zeros(len(mid))
+    returns[1:] = np.log(mid[1:] / mid[:-1])
+    return returns
+
+
+def tick_window_sum(changes, window):
+    """
+    Sum of the last window - 1 `changes` (those inside a window of `window`
+    ticks), NaN before the window is full.
+    """
+    n = len(changes)
+    out = np.full(n, np.nan)
+    if n >= window:
+        sums = np.concatenate([[0.0], np.cumsum(changes)])
+        out[window - 1:] = sums[window:] - sums[1:n - window + 2]
+    return out
+
+
+def time_window_sum(changes, time_ns, window):
+    """
+    Sum and count of the `changes` at times in (t - window, t] for every tick.
+    """
+    sums = np.concatenate([[0.0], np.cumsum(changes)])
+    starts = np.searchsorted(time_ns, time_ns - window_ns(window), side="right")
+    ends = np.arange(1, len(time_ns) + 1)
+    return sums[ends] - sums[starts], ends - starts
+
+
+def quote_intensity(time_ns, window):
+    """
+    Quote updates per second over (t - window, t].
+    """
+    starts = np.searchsorted(time_ns, time_ns - window_ns(window), side="right")
+    return (np.arange(1, len(time_ns) + 1) - starts) / (window_ns(window) / 1e9)
+
+
+def realized_volatility(mid, window):
+    """
+    Realized volatility over the last `window` ticks.
+    """
+    return np.sqrt(np.maximum(tick_window_sum(log_returns(mid) ** 2, window), 0))
+
+
+def realized_volatility_time(mid, time_ns, window):
+    """
+    Realized volatility over the returns at times in (t - window, t].
+    """
+    total, _ = time_window_sum(log_returns(mid) ** 2, time_ns, window)
+    return np.sqrt(np.maximum(total, 0))
+
+
+def window_label(window):
+    """
+    Column suffix of a time window: the offset string itself, or "<n>ns".
+    """
+    return str(window) if isinstance(window, str) else f"{window}ns"
+
+
+def microstructure_columns(windows=WINDOWS, time_windows=TIME_WINDOWS):
+    """
+    Names of the columns `compute_microstructure` adds, in order.
+    """
+    columns = ["spread", "queue_imbalance", "microprice", "microprice_offset"]
+    columns += [f"ofi_{w}" for w in windows]
+    columns += [f"quote_rate_{window_label(t)}" for t in time_windows]
+    columns += [f"realized_vol_{w}" for w in windows]
+    return columns + [f"realized_vol_{window_label(t)}" for t in time_windows]
+
+
+MICROSTRUCTURE_FEATURES = tuple(name for name in microstructure_columns() if name != "microprice")
+
+
+def quote_features(bid, ask, bid_volume, ask_volume, time_ns, windows=WINDOWS, time_windows=TIME_WINDOWS):
+    """
+    Order book features of consecutive quotes of one stock, oldest first.
+    Args:
+        bid, ask, bid_volume, ask_volume (np.ndarray): float64 level 1 columns.
+        time_ns (np.ndarray): Quote times in ns, non-decreasing.
+        windows (tuple): Tick window lengths.
+        time_windows (tuple): Time windows as pandas offset strings or ns.
+
+    Returns:
+        dict: Column name -> float64 array, for every `microstructure_columns` name.
+    """
+    mid = (bid + ask) / 2
+    features = {
+        "spread": spread(bid, ask),
+        "queue_imbalance": queue_imbalance(bid_volume, ask_volume),
+        "microprice": microprice(bid, ask, bid_volume, ask_volume),
+    }
+    features["microprice_offset"] = features["microprice"] / mid - 1
+    flow = order_flow_imbalance(bid, ask, bid_volume, ask_volume)
+    squared = log_returns(mid) ** 2
+    for w in windows:
+        features[f"ofi_{w}"] = tick_window_sum(flow, w)
+        features[f"realized_vol_{w}"] = np.sqrt(np.maximum(tick_window_sum(squared, w), 0))
+    for t in time_windows:
+        total, count = time_window_sum(squared, time_ns, t)
+        features[f"quote_rate_{window_label(t)}"] = count / (window_ns(t) / 1e9)
+        features[f"realized_vol_{window_label(t)}"] = np.sqrt(np.maximum(total, 0))
+    return features
+
+
+def _fill_group(rows, columns, out, windows, time_windows):
+    """
+    Compute one group's features into `out` at `rows`.
+    """
+    features = quote_features(
+        columns["bidPrice"][rows],
+        columns["askPrice"][rows],
+        columns["bidVolume"][rows],
+        columns["askVolume"][rows],
+        columns["time_ns"][rows],
+        windows,
+        time_windows,
+    )
+    for name, values in features.items():
+        out[name][rows] = values
+
+
+def _time_ns(data):
+    if "time_ns" in data.columns:
+        return data["time_ns"].to_numpy(dtype=np.int64)
+    return data["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def compute_microstructure(data, windows=WINDOWS, time_windows=TIME_WINDOWS, keys=GROUP_KEYS, max_workers=None):
+    """
+    Add the order book features, each computed within its (stock, period) group.
+    Args:
+        data (pd.DataFrame): Market data with the level 1 columns and time_ns
+            (or timestamp), time ordered within each group. It is not modified.
+        windows (tuple): Tick window lengths.
+        time_windows (tuple): Time windows as pandas offset strings or ns.
+        keys (list): Grouping columns; missing ones are ignored.
+        max_workers (int): Threads used across groups; defaults to the CPU count.
+
+    Returns:
+        pd.DataFrame: The input rows with the `microstructure_columns` added.
+    """
+    n = len(data)
+    columns = {name: data[name].to_numpy(dtype=np.float64) for name in ("bidPrice", "askPrice", "bidVolume", "askVolume")}
+    columns["time_ns"] = _time_ns(data)
+    names = microstructure_columns(windows, time_windows)
+    out = {name: np.empty(n, dtype=DTYPE) for name in names}
+
+    groups = group_indices(data, keys)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(groups) == 1:
+        for rows in groups:
+            _fill_group(rows, columns, out, windows, time_windows)
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(lambda rows: _fill_group(rows, columns, out, windows, time_windows), groups))
+
+    features = pd.DataFrame(out, index=data.index)
+    return pd.concat([data.drop(columns=[name for name in names if name in data.columns]), features], axis=1)
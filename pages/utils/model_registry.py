@@ -0,0 +1,141 @@
+"""
+Registry of trained models, so pages reuse a model instead of retraining it
+on every rerun.
+
+An artifact holds the fitted model, its preprocessing, its CV metrics and
+the inputs it was trained from. It is stored under
+CACHE_DIR/models/<key>/, where <key> hashes the training data fingerprint,
+the feature definition and the hyperparameters. Any change to those trains
+a new model under a new key. The latest artifacts are also kept in the
+shared in-memory cache, so a rerun costs a dictionary lookup.
+"""
+import datetime
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import shutil
+
+from pages.utils.cache import get_cache
+from pages.utils.tick_store import CACHE_DIR
+
+REGISTRY_VERSION = 1
+REGISTRY_DIR = os.path.join(CACHE_DIR, "models")
+
+
+def model_key(name, data_fingerprint, features, params):
+    """
+    Short hash identifying one model's training inputs.
+    Args:
+        name (str): Model name, e.g. "sharp_change".
+        data_fingerprint (str): Fingerprint of the training data files.
+        features: JSON-serialisable description of the features.
+        params (dict): Hyperparameters and training settings.
+    """
+    inputs = {
+        "version": REGISTRY_VERSION,
+        "name": name,
+        "data": data_fingerprint,
+        "features": features,
+        "params": params,
+    }
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class ModelArtifact:
+    """
+    A trained model with its preprocessing, metrics and training inputs.
+    """
+
+    def __init__(self, model, metrics, preprocessing=None, key=None, params=None, trained_at=None):
+        self.model = model
+        self.metrics = metrics
+        self.preprocessing = preprocessing
+        self.key = key
+        self.params = params or {}
+        self.trained_at = trained_at or datetime.datetime.now().isoformat(timespec="seconds")
+
+    def save(self, directory=REGISTRY_DIR):
+        """
+        Write the artifact to <directory>/<key>/, replacing any older copy.
+        """
+        target = os.path.join(directory, self.key)
+        tmp_dir = f"{target}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        # Models with their own format (e.g. XGBoost's JSON) use it; anything else is pickled
+        if hasattr(self.model, "save_model"):
+            model_file = "model.json"
+            self.model.save_model(os.path.join(tmp_dir, model_file))
+        else:
+            model_file = "model.pkl"
+            with open(os.path.join(tmp_dir, model_file), "wb") as f:
+                pickle.dump(self.model, f)
+        with open(os.path.join(tmp_dir, "preprocessing.pkl"), "wb") as f:
+            pickle.dump(self.preprocessing, f)
+        meta = {
+            "key": self.key,
+            "model_file": model_file,
+            "model_class": f"{type(self.model).__module__}.{type(self.model).__name__}",
+            "metrics": self.metrics,
+            "params": self.params,
+            "trained_at": self.trained_at,
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2, default=str)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp_dir, target)
+
+    @classmethod
+    def load(cls, key, directory=REGISTRY_DIR):
+        """
+        Read an artifact back, or return None when it is missing or unreadable.
+        """
+        source = os.path.join(directory, key)
+        try:
+            with open(os.path.join(source, "meta.json")) as f:
+                meta = json.load(f)
+            model_path = os.path.join(source, meta["model_file"])
+            if meta["model_file"] == "model.json":
+                module, name = meta["model_class"].rsplit(".", 1)
+                model = getattr(importlib.import_module(module), name)()
+                model.load_model(model_path)
+            else:
+                with open(model_path, "rb") as f:
+                    model = pickle.load(f)
+            with open(os.path.join(source, "preprocessing.pkl"), "rb") as f:
+                preprocessing = pickle.load(f)
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+            return None
+        return cls(model, meta["metrics"], preprocessing, key, meta["params"], meta["trained_at"])
+
+
+def get_or_train(name, data_fingerprint, features, params, train, retrain=False, cache=None):
+    """
+    The registered model for these inputs, training and saving it if needed.
+    Args:
+        name (str): Model name.
+        data_fingerprint (str): Fingerprint of the training data files.
+        features: Description of the features (e.g. definition hash and columns).
+        params (dict): Hyperparameters and training settings.
+        train (callable): Called with no arguments on a miss; returns
+            (model, metrics, preprocessing).
+        retrain (bool): Train again even when a model is registered.
+        cache (TickCache): In-memory cache to use; `get_cache()` by default.
+            Pass it in when calling from a background thread.
+
+    Returns:
+        ModelArtifact: The cached, stored or freshly trained model.
+    """
+    key = model_key(name, data_fingerprint, features, params)
+    cache = cache or get_cache()
+    if not retrain:
+        artifact = cache.get(("model", key)) or ModelArtifact.load(key)
+        if artifact is not None:
+            return cache.put(("model", key), artifact)
+
+    model, metrics, preprocessing = train()
+    artifact = ModelArtifact(model, metrics, preprocessing, key, params)
+    artifact.save()
+    return cache.put(("model", key), artifact)
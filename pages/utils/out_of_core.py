@@ -0,0 +1,312 @@
+"""
+Memory-bounded training of the sharp change model, streamed from the
+feature store.
+
+SMOTE over every tick synthesises millions of minority rows in memory.
+Here the training set is streamed instead: the stored (stock, period) feature
+partitions are read in chunks and fed to a `xgboost.QuantileDMatrix` through
+a `DataIter`. The matrix only keeps one quantile bin per feature and row.
+Every positive row is kept; negatives are subsampled at the rate that fits
+the memory budget and weighted by 1 / rate. Positives are weighted so both
+classes carry the same total weight, which is what SMOTE was balancing for.
+Peak memory is then bounded by the budget plus one chunk, whatever the
+number of periods.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import xgboost as xgb
+
+from pages.utils.cross_validation import SCORES, fold_budget, summarize, walk_forward_splits
+from pages.utils.downsample import downsample_indices, target_points
+from pages.utils.feature_store import materialize
+from pages.utils.features import SHARP_CHANGE_THRESHOLD, WINDOWS
+from pages.utils.progress import advance, current, stage
+
+# Bytes the training rows may use in XGBoost; override with the TRAINING_MEMORY_BYTES env variable
+DEFAULT_MEMORY_BUDGET = int(os.environ.get("TRAINING_MEMORY_BYTES", 512 * 1024 ** 2))
+CHUNK_ROWS = 1 << 18
+# Measured bytes per row: quantile bins per feature, plus label, weight, gradients and
+# predictions that XGBoost keeps for every training row
+_BIN_BYTES = 2
+_ROW_BYTES = 48
+
+
+def iter_chunks(partitions, columns, periods=None, chunk_rows=CHUNK_ROWS):
+    """
+    Yield (period, {column: np.ndarray}) chunks of the stored partitions.
+    Args:
+        partitions (list): (stock, period, path) from `feature_store.materialize`.
+        columns (list): Columns to read.
+        periods (set): Only read these periods; every period when None.
+        chunk_rows (int): Rows per chunk at most.
+    """
+    for _, period, path in partitions:
+        if periods is not None and period not in periods:
+            continue
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield period, {name: batch.column(name).to_numpy(zero_copy_only=False) for name in columns}
+
+
+def class_counts(partitions, target, periods=None):
+    """
+    (positives, negatives) of a binary target, reading only that column.
+    """
+    positives = total = 0
+    for _, chunk in iter_chunks(partitions, [target], periods):
+        positives += int(chunk[target].sum())
+        total += len(chunk[target])
+    return positives, total - positives
+
+
+def negative_rate(positives, negatives, n_features, memory_budget):
+    """
+    Fraction of negative rows that fits the budget once every positive is kept.
+    """
+    bytes_per_row = n_features * _BIN_BYTES + _ROW_BYTES
+    room = memory_budget // bytes_per_row - positives
+    if negatives == 0 or room >= negatives:
+        return 1.0
+    return max(room, 0) / negatives
+
+
+class SampledChunks(xgb.DataIter):
+    """
+    Feeds subsampled, weighted feature chunks to XGBoost. Each chunk is
+    sampled with its own seed, so every pass XGBoost makes over the data sees
+    the same rows.
+    """
+
+    def __init__(self, partitions, features, target, periods=None, rate=1.0, positive_weight=1.0, seed=42,
+                 chunk_rows=CHUNK_ROWS):
+        self.partitions = partitions
+        self.features = list(features)
+        self.target = target
+        self.periods = periods
+        self.rate = rate
+        self.positive_weight = positive_weight
+        self.seed = seed
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._chunks = None
+        self._index = 0
+        super().__init__()
+
+    def reset(self):
+        self._chunks = None
+        self._index = 0
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = iter_chunks(self.partitions, self.features + [self.target], self.periods, self.chunk_rows)
+            self.rows = 0
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        _, columns = chunk
+        label = columns[self.target].astype(np.float32)
+        keep = label > 0
+        if self.rate < 1.0:
+            rng = np.random.default_rng([self.seed, self._index])
+            keep |= rng.random(len(label)) < self.rate
+        self._index += 1
+        weight = np.where(label[keep] > 0, self.positive_weight, 1.0 / self.rate).astype(np.float32)
+        data = np.column_stack([columns[name][keep] for name in self.features]).astype(np.float32)
+        self.rows += len(data)
+        input_data(data=data, label=label[keep], weight=weight)
+        return True
+
+
+class _JobRounds(xgb.callback.TrainingCallback):
+    """
+    Lets a background job cancel training between rounds, and optionally
+    counts the rounds as its progress.
+    """
+
+    def __init__(self, progress, count=False):
+        super().__init__()
+        self.progress = progress
+        self.count = count
+
+    def after_iteration(self, model, epoch, evals_log):
+        if self.progress is not None:
+            if self.count:
+                self.progress.advance()
+            else:
+                self.progress.check()
+        return False
+
+
+def train_booster(partitions, features, target="sharp_change", params=None, num_boost_round=100, periods=None,
+                  memory_budget=DEFAULT_MEMORY_BUDGET, seed=42, n_threads=None, callbacks=None):
+    """
+    Train an XGBoost booster from streamed chunks within a memory budget.
+    Args:
+        partitions (list): (stock, period, path) from `feature_store.materialize`.
+        features (list): Feature columns.
+        target (str): Binary target column.
+        params (dict): XGBoost training parameters.
+        num_boost_round (int): Boosting rounds.
+        periods (set): Train on these periods only; every period when None.
+        memory_budget (int): Bytes the training rows may use inside XGBoost.
+        seed (int): Seed for the negative subsampling and XGBoost.
+        n_threads (int): Threads XGBoost may use.
+        callbacks (list): XGBoost training callbacks.
+
+    Returns:
+        tuple: (xgb.Booster, dict with the positives, negatives, sampling rate
+        and rows trained on).
+    """
+    positives, negatives = class_counts(partitions, target, periods)
+    rate = negative_rate(positives, negatives, len(features), memory_budget)
+    # Both classes end up with the same total weight
+    positive_weight = negatives / positives if positives else 1.0
+    chunks = SampledChunks(partitions, features, target, periods, rate, positive_weight, seed)
+    matrix = xgb.QuantileDMatrix(chunks, nthread=n_threads)
+    params = {"objective": "binary:logistic", "tree_method": "hist", "seed": seed, **(params or {})}
+    if n_threads:
+        params["nthread"] = n_threads
+    booster = xgb.train(params, matrix, num_boost_round=num_boost_round, callbacks=callbacks)
+    return booster, {"positives": positives, "negatives": negatives, "negative_rate": rate, "rows": chunks.rows}
+
+
+def predict(booster, X, threshold=0.5):
+    """
+    0/1 sharp change predictions of a booster for a feature matrix.
+    """
+    probabilities = booster.predict(xgb.DMatrix(np.asarray(X, dtype=np.float32)))
+    return (probabilities > threshold).astype(np.int64)
+
+
+def predict_chart(booster, partitions, features, target="sharp_change", n_out=None, chunk_rows=CHUNK_ROWS):
+    """
+    Actual and predicted sharp changes of the stored rows for a chart,
+    predicted chunk by chunk. Each chunk keeps its share of `n_out` points,
+    the min and max per pixel bucket, so isolated 0/1 spikes stay visible.
+    Args:
+        booster (xgb.Booster): Trained model.
+        partitions (list): (stock, period, path) from `feature_store.materialize`.
+        features (list): Feature columns, in training order.
+        target (str): Binary target column.
+        n_out (int): Points per series; defaults to `downsample.target_points()`.
+        chunk_rows (int): Rows predicted at a time.
+
+    Returns:
+        pd.DataFrame: timestamp, actual and predicted columns.
+    """
+    n_out = n_out or target_points()
+    total = sum(pq.ParquetFile(path).metadata.num_rows for _, _, path in partitions)
+    frames = []
+    for _, columns in iter_chunks(partitions, ["timestamp", *features, target], chunk_rows=chunk_rows):
+        actual = columns[target].astype(np.int64)
+        predicted = predict(booster, np.column_stack([columns[name] for name in features]))
+        share = max(4, n_out * len(actual) // total)
+        rows = downsample_indices(columns["timestamp"], [actual, predicted], share, method="minmax")
+        frames.append(pd.DataFrame({
+            "timestamp": columns["timestamp"][rows],
+            "actual": actual[rows],
+            "predicted": predicted[rows],
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["timestamp", "actual", "predicted"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def evaluate(booster, partitions, features, target="sharp_change", periods=None):
+    """
+    Scores of a booster over every row of the given periods, chunk by chunk.
+    """
+    counts = np.zeros((2, 2), dtype=np.int64)
+    for _, columns in iter_chunks(partitions, list(features) + [target], periods):
+        X = np.column_stack([columns[name] for name in features])
+        y = columns[target].astype(np.int64)
+        np.add.at(counts, (y, predict(booster, X)), 1)
+    (tn, fp), (fn, tp) = counts
+    total = counts.sum()
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "accuracy": float((tp + tn) / total) if total else float("nan"),
+        "precision": float(precision),
+        "recall": float(recall),
+        "f1": float(2 * precision * recall / (precision + recall)) if precision + recall else 0.0,
+    }
+
+
+def train_out_of_core(directory, stocks, features, target="sharp_change", params=None, num_boost_round=100,
+                      memory_budget=DEFAULT_MEMORY_BUDGET, random_state=42, windows=WINDOWS,
+                      threshold=SHARP_CHANGE_THRESHOLD, max_workers=None, trades=False):
+    """
+    Walk-forward score and train the sharp change model without loading the
+    feature matrix into memory.
+    Args:
+        directory (str): Path to the data directory.
+        stocks (list): Stock symbols, or None for every stock folder found.
+        features (list): Feature columns.
+        target (str): Binary target column.
+        params (dict): XGBoost training parameters.
+        num_boost_round (int): Boosting rounds.
+        memory_budget (int): Bytes all concurrently trained matrices may use.
+        random_state (int): Seed for subsampling and XGBoost.
+        windows (tuple): Feature store rolling windows.
+        threshold (float): Feature store sharp change threshold.
+        max_workers (int): Folds trained at once.
+        trades (bool): Store the trade order flow columns too, for features
+            that use them.
+
+    Returns:
+        tuple: (xgb.Booster trained on every period, metrics dict with the
+        per-fold scores and wall times, preprocessing dict), as expected by
+        `model_registry.get_or_train`.
+    """
+    partitions, _ = materialize(directory, stocks, windows, threshold, trades=trades)
+    periods = list(dict.fromkeys(period for _, period, _ in partitions))
+    fold_periods = [
+        ({periods[i] for i in train}, {periods[i] for i in test}) for train, test in walk_forward_splits(periods)
+    ]
+    workers, threads = fold_budget(len(fold_periods), max_workers)
+    # Folds train on pool threads, so they get the job's progress explicitly
+    job = current()
+
+    def run(fold):
+        start = time.perf_counter()
+        train_periods, test_periods = fold_periods[fold]
+        if class_counts(partitions, target, train_periods)[0] == 0:
+            scores, sampling = {name: float("nan") for name in SCORES}, {}
+        else:
+            booster, sampling = train_booster(partitions, features, target, params, num_boost_round, train_periods,
+                                              memory_budget // workers, random_state, threads, [_JobRounds(job)])
+            scores = evaluate(booster, partitions, features, target, test_periods)
+        return {
+            "fold": fold,
+            "test_period": next(iter(test_periods)),
+            **sampling,
+            **scores,
+            "threads": threads,
+            "wall_time": time.perf_counter() - start,
+        }
+
+    stage("Walk-forward folds", len(fold_periods))
+    folds = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for fold in pool.map(run, range(len(fold_periods))):
+            folds.append(fold)
+            advance()
+
+    if class_counts(partitions, target)[0] == 0:
+        raise ValueError("The sharp change target has a single class, so there is nothing to train on.")
+    stage("Training the final model (rounds)", num_boost_round)
+    booster, sampling = train_booster(partitions, features, target, params, num_boost_round, None, memory_budget,
+                                      random_state, os.cpu_count(), [_JobRounds(job, count=True)])
+    summary = summarize(folds)
+    metrics = {"folds": folds, **summary, "avg_accuracy": summary["accuracy"], "sampling": sampling}
+    preprocessing = {
+        "feature_columns": list(features),
+        "negative_rate": sampling["negative_rate"],
+        "positive_weight": sampling["negatives"] / sampling["positives"],
+    }
+    return booster, metrics, preprocessing
@@ -0,0 +1,222 @@
+"""
+Aligned multi-stock panels on a common time grid.
+
+Stocks tick at different instants, so pivoting raw ticks on the timestamp
+gives one row per tick of any stock and is almost entirely NaN. A panel
+instead has one row per time bucket and one column per stock. Each cell holds
+the stock's last value seen before the bucket closes, carried forward through
+quiet buckets. Grids are built per period and never carry values from one
+period into the next.
+
+The correlation helpers work on plain (rows, stocks) NumPy arrays.
+"""
+import numpy as np
+import pandas as pd
+
+from pages.utils.bars import RESOLUTIONS
+from pages.utils.timestamps import period_date, to_datetime64
+
+
+def carry_forward(times, values, bucket_ends):
+    """
+    Last value observed strictly before each bucket end.
+    Args:
+        times (np.ndarray): Increasing observation times (int64 ns).
+        values (np.ndarray): Observed values, same length as times.
+        bucket_ends (np.ndarray): Increasing bucket end times (int64 ns).
+
+    Returns:
+        np.ndarray: float64 values per bucket, NaN before the first observation.
+    """
+    last = np.searchsorted(times, bucket_ends, side="left") - 1
+    aligned = np.asarray(values, dtype=np.float64)[np.maximum(last, 0)]
+    aligned[last < 0] = np.nan
+    return aligned
+
+
+def build_panel(series, resolution_ns, period):
+    """
+    Align several series from one period on a common grid.
+    Args:
+        series (dict): Stock -> (times, values), times in ns since midnight.
+        resolution_ns (int): Bucket width.
+        period (str): Period the series belong to, used for the timestamps.
+
+    Returns:
+        pd.DataFrame: `timestamp` (bucket start), `period` and one column per
+        stock, covering every bucket from the first to the last observation.
+    """
+    series = {stock: s for stock, s in series.items() if len(s[0])}
+    if not series:
+        return pd.DataFrame(columns=["timestamp", "period"])
+    start = min(times[0] for times, _ in series.values()) // resolution_ns * resolution_ns
+    end = max(times[-1] for times, _ in series.values())
+    starts = np.arange(start, end + 1, resolution_ns, dtype=np.int64)
+
+    panel = {"timestamp": to_datetime64(starts, period), "period": period}
+    for stock, (times, values) in series.items():
+        panel[stock] = carry_forward(times, values, starts + resolution_ns)
+    return pd.DataFrame(panel)
+
+
+def panel_from_ticks(ticks, column="midPrice", resolution="1s"):
+    """
+    Panel of every stock and period held in a CompactTicks.
+    Args:
+        ticks (CompactTicks): Tick data, ordered by time within each stock/period.
+        column (str): Value column to align; "midPrice" is also accepted.
+        resolution (str): Grid resolution, one of bars.RESOLUTIONS.
+
+    Returns:
+        pd.DataFrame: Per-period panels stacked in period order.
+    """
+    panels = []
+    for period in ticks.periods:
+        # CompactTicks timestamps include the period date, the grid works on time of day
+        day_start = period_date(period).astype("datetime64[ns]").astype(np.int64)
+        series = {}
+        for stock in ticks.stocks:
+            selected = ticks.select(stock=stock, period=period)
+            values = selected.mid_price() if column == "midPrice" else selected.column(column)
+            series[stock] = (selected.timestamp - day_start, values)
+        panels.append(build_panel(series, RESOLUTIONS[resolution], period))
+    return pd.concat(panels, ignore_index=True)
+
+
+def panel_from_bars(pyramids, period, column="close", resolution="1s"):
+    """
+    Panel of one period built from bar pyramids.
+    Args:
+        pyramids (dict): Stock -> bar pyramid from `bars.bar_pyramid`.
+        period (str): Period of the pyramids.
+        column (str): Bar column to align.
+        resolution (str): Pyramid level used, which is also the grid resolution.
+    """
+    series = {
+        stock: (pyramid[resolution]["bar"].to_numpy(), pyramid[resolution][column].to_numpy())
+        for stock, pyramid in pyramids.items()
+    }
+    return build_panel(series, RESOLUTIONS[resolution], period)
+
+
+def panel_returns(panel, stocks):
+    """
+    Bucket-to-bucket returns of `stocks`, computed within each period, next
+    to the panel's timestamp and period. Rows where no stock has a return
+    are dropped.
+    """
+    returns = panel.groupby("period", sort=False, observed=True)[stocks].pct_change()
+    returns["timestamp"] = panel["timestamp"]
+    returns["period"] = panel["period"]
+    return returns.dropna(subset=stocks, how="all")
+
+
+def _pair_sums(a, b):
+    """
+    Sums needed for the correlation of every column of `a` with every column
+    of `b`, over the rows where both are present. Leading axes other than the
+    rows are not supported; NaN marks a missing value.
+    """
+    a_mask, b_mask = ~np.isnan(a), ~np.isnan(b)
+    a0, b0 = np.where(a_mask, a, 0.0), np.where(b_mask, b, 0.0)
+    a_mask, b_mask = a_mask.astype(np.float64), b_mask.astype(np.float64)
+    return (
+        np.einsum("ti,tj->tij", a_mask, b_mask),
+        np.einsum("ti,tj->tij", a0, b_mask),
+        np.einsum("ti,tj->tij", a_mask, b0),
+        np.einsum("ti,tj->tij", a0 * a0, b_mask),
+        np.einsum("ti,tj->tij", a_mask, b0 * b0),
+        np.einsum("ti,tj->tij", a0, b0),
+    )
+
+
+def _corr_from_sums(n, sa, sb, saa, sbb, sab):
+    covariance = n * sab - sa * sb
+    a_variance = n * saa - sa * sa
+    b_variance = n * sbb - sb * sb
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlation = covariance / np.sqrt(np.clip(a_variance * b_variance, 0, None))
+    return np.where((n > 1) & (a_variance > 0) & (b_variance > 0), np.clip(correlation, -1, 1), np.nan)
+
+
+def _centred(matrix):
+    # Centring first keeps the sums of products well conditioned
+    matrix = np.asarray(matrix, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        means = np.nanmean(matrix, axis=0) if len(matrix) else np.zeros(matrix.shape[1])
+    return matrix - np.nan_to_num(means)
+
+
+def cross_correlation(a, b):
+    """
+    Pairwise-complete correlation of every column of `a` with every column of
+    `b` (both (rows, k) arrays, NaN where a value is missing).
+    """
+    sums = _pair_sums(_centred(a), _centred(b))
+    return _corr_from_sums(*(s.sum(axis=0) for s in sums))
+
+
+def correlation(matrix):
+    """
+    Correlation matrix of the columns of a (rows, k) array, each pair using
+    the rows where both columns are present.
+    """
+    return cross_correlation(matrix, matrix)
+
+
+def lagged_correlation(matrix, lags, groups=None):
+    """
+    Correlation of every column at t with every column at t + lag.
+    Args:
+        matrix (np.ndarray): (rows, k) array ordered in time, NaN where missing.
+        lags (iterable): Non-negative lags in rows.
+        groups (np.ndarray): Optional label per row (e.g. period); pairs of
+            rows with different labels are left out.
+
+    Returns:
+        np.ndarray: (len(lags), k, k) array; entry [l, i, j] correlates
+        column i with column j `lags[l]` rows later.
+    """
+    matrix = _centred(matrix)
+    n, k = matrix.shape
+    lags = list(lags)
+    result = np.full((len(lags), k, k), np.nan)
+    for index, lag in enumerate(lags):
+        if lag >= n:
+            continue
+        leading, lagging = matrix[:n - lag], matrix[lag:]
+        if groups is not None:
+            same = np.asarray(groups)[:n - lag] == np.asarray(groups)[lag:]
+            leading, lagging = leading[same], lagging[same]
+        result[index] = cross_correlation(leading, lagging)
+    return result
+
+
+def rolling_correlation(matrix, window):
+    """
+    Correlation matrices over a sliding window of rows, from running sums.
+    Args:
+        matrix (np.ndarray): (rows, k) array ordered in time, NaN where missing.
+        window (int): Rows per window.
+
+    Returns:
+        np.ndarray: (rows - window + 1, k, k) array; entry t covers rows
+        t .. t + window - 1.
+    """
+    matrix = _centred(matrix)
+    k = matrix.shape[1]
+    if len(matrix) < window:
+        return np.empty((0, k, k))
+    window_sums = []
+    for sums in _pair_sums(matrix, matrix):
+        running = np.concatenate([np.zeros((1, k, k)), np.cumsum(sums, axis=0)])
+        window_sums.append(running[window:] - running[:-window])
+    result = _corr_from_sums(*window_sums)
+
+    # Running sums cannot tell a flat window from rounding noise, so count moves exactly
+    filled = pd.DataFrame(matrix).ffill().to_numpy()
+    moves = (filled[1:] != filled[:-1]) & ~np.isnan(filled[1:]) & ~np.isnan(filled[:-1])
+    running = np.concatenate([np.zeros((1, k), dtype=np.int64), np.cumsum(moves, axis=0)])
+    flat = (running[window - 1:] - running[:len(running) - window + 1]) == 0
+    result[flat[:, :, None] | flat[:, None, :]] = np.nan
+    return result
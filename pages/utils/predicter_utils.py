@@ -0,0 +1,9 @@
+from pages.utils.features import compute_features
+from pages.utils.tick_store import load_all_data
+
+def generate_features(data):
+    """
+    Add midPrice, rolling averages/standard deviations, momentum and the
+    sharp change target, computed separately for every stock and period.
+    """
+    return compute_features(data)
@@ -0,0 +1,110 @@
+"""
+Progress reporting and cancellation points for code running as a background job.
+
+Loaders and trainers call `stage` when they start a step and `advance` as
+they get through it. Inside a job (see `jobs.py`) that updates the job's
+progress, which the page polls, and raises `Cancelled` once the job has been
+cancelled, so superseded work stops at the next file or fold. Outside a job
+both calls do nothing, so the same functions run unchanged from scripts and
+benchmarks.
+"""
+import threading
+import time
+
+_current = threading.local()
+
+
+class Cancelled(Exception):
+    """
+    Raised inside a job that was cancelled.
+    """
+
+
+class Progress:
+    """
+    Progress of one job: the current stage, items done of the stage's total,
+    and rows handled.
+    """
+
+    def __init__(self, label):
+        self.stage_name = label
+        self.done = 0
+        self.total = None
+        self.rows = 0
+        self.stage_started = time.monotonic()
+        self.cancelled = threading.Event()
+
+    def start_stage(self, name, total=None):
+        self.check()
+        self.stage_name, self.done, self.total = name, 0, total
+        self.stage_started = time.monotonic()
+
+    def advance(self, items=1, rows=0):
+        self.check()
+        self.done += items
+        self.rows += rows
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+    def fraction(self):
+        """
+        Share of the current stage done, or None when its size is unknown.
+        """
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+    def eta(self):
+        """
+        Seconds left in the current stage at its pace so far, or None.
+        """
+        fraction = self.fraction()
+        if not fraction:
+            return None
+        return (time.monotonic() - self.stage_started) * (1 - fraction) / fraction
+
+    def describe(self):
+        text = self.stage_name
+        if self.total:
+            text += f": {self.done:,} / {self.total:,}"
+        if self.rows:
+            text += f", {self.rows:,} rows"
+        eta = self.eta()
+        if eta is not None and self.done < self.total:
+            text += f", about {eta:.0f} s left"
+        return text
+
+
+def current():
+    """
+    Progress of the job running on this thread, or None.
+    """
+    return getattr(_current, "progress", None)
+
+
+def bind(progress):
+    """
+    Make `progress` the current job's progress on this thread (None to clear it).
+    """
+    _current.progress = progress
+
+
+def stage(name, total=None):
+    """
+    Start a new step of `total` items in the current job, if any.
+    """
+    progress = current()
+    if progress is not None:
+        progress.start_stage(name, total)
+
+
+def advance(items=1, rows=0):
+    """
+    Count items and rows done in the current job, if any; raises `Cancelled`
+    when it was cancelled.
+    """
+    progress = current()
+    if progress is not None:
+        progress.advance(items, rows)
@@ -0,0 +1,177 @@
+"""
+Density images for scatter plots with millions of points.
+
+`sns.scatterplot` draws one marker per tick, which is slow with millions of
+ticks and only shows overplotting. `DensityGrid` bins the points into a
+fixed-size 2D histogram instead, one layer per category:
+
+- a point's bin comes from two multiply-and-casts and one `np.bincount`, so
+  binning is linear in the points and the image has the same size whatever
+  their number; grids can also be filled chunk by chunk;
+- `render_density` draws the grid as an image on matplotlib axes, with a
+  log colour scale for a single layer, or each pixel blended from the
+  category colours by their counts and made more opaque where it is denser;
+- points in bins holding only a few of them would be near invisible in the
+  image, so they are drawn on top as individual markers.
+"""
+import numpy as np
+from matplotlib.colors import LogNorm, to_rgb
+from matplotlib.patches import Patch
+
+WIDTH = 400
+HEIGHT = 300
+# Bins with at most this many points have their points drawn as markers
+SPARSE_THRESHOLD = 2
+# Markers drawn at most; sparse points beyond that are subsampled
+MAX_SPARSE = 5000
+
+
+def data_range(values, quantiles=None):
+    """
+    (low, high) of the finite values, or of the given quantiles of them.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return 0.0, 1.0
+    low, high = np.quantile(values, quantiles) if quantiles else (values.min(), values.max())
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return float(low), float(high)
+
+
+class DensityGrid:
+    """
+    Point counts on a width x height grid over fixed ranges, per category.
+    Args:
+        x_range (tuple): (low, high) of the x axis; points outside are not counted.
+        y_range (tuple): (low, high) of the y axis.
+        width (int): Bins along x.
+        height (int): Bins along y.
+        categories (int): Number of layers; points carry a category code below this.
+    """
+
+    def __init__(self, x_range, y_range, width=WIDTH, height=HEIGHT, categories=1):
+        self.x_range = tuple(x_range)
+        self.y_range = tuple(y_range)
+        self.width = width
+        self.height = height
+        self.categories = categories
+        self.counts = np.zeros((categories, height, width), dtype=np.int64)
+        self.points = 0
+
+    @property
+    def extent(self):
+        """(left, right, bottom, top) for `imshow`."""
+        return (*self.x_range, *self.y_range)
+
+    def bins(self, x, y, category=None):
+        """
+        Flat bin of every point in `counts`, -1 for points outside the ranges or not finite.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        (x0, x1), (y0, y1) = self.x_range, self.y_range
+        with np.errstate(invalid="ignore"):
+            column = np.floor((x - x0) * (self.width / (x1 - x0)))
+            row = np.floor((y - y0) * (self.height / (y1 - y0)))
+            # The high edge belongs to the last bin, as in np.histogram2d
+            column[x == x1] = self.width - 1
+            row[y == y1] = self.height - 1
+            inside = (column >= 0) & (column < self.width) & (row >= 0) & (row < self.height)
+        flat = np.full(len(x), -1, dtype=np.int64)
+        layer = 0 if category is None else np.asarray(category, dtype=np.int64)[inside]
+        row, column = row[inside].astype(np.int64), column[inside].astype(np.int64)
+        flat[inside] = (layer * self.height + row) * self.width + column
+        return flat
+
+    def add(self, x, y, category=None):
+        """
+        Count points, e.g. one chunk at a time.
+        """
+        flat = self.bins(x, y, category)
+        flat = flat[flat >= 0]
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        self.points += len(flat)
+        return self
+
+    def sparse(self, x, y, category=None, threshold=SPARSE_THRESHOLD):
+        """
+        Mask of the points that fall in bins holding at most `threshold` points
+        of their category.
+        """
+        flat = self.bins(x, y, category)
+        mask = flat >= 0
+        mask[mask] = self.counts.ravel()[flat[mask]] <= threshold
+        return mask
+
+
+def density_grid(x, y, category=None, categories=1, width=WIDTH, height=HEIGHT, x_range=None, y_range=None):
+    """
+    A `DensityGrid` of all the points at once, over their full range unless given.
+    """
+    grid = DensityGrid(x_range or data_range(x), y_range or data_range(y), width, height, categories)
+    return grid.add(x, y, category)
+
+
+def sparse_points(grid, x, y, category=None, threshold=SPARSE_THRESHOLD, limit=MAX_SPARSE, seed=0):
+    """
+    Positions of the points in sparse bins, at most `limit` of them.
+    """
+    positions = np.flatnonzero(grid.sparse(x, y, category, threshold))
+    if len(positions) > limit:
+        positions = np.sort(np.random.default_rng(seed).choice(positions, limit, replace=False))
+    return positions
+
+
+def _blend(counts, colors, log):
+    """
+    RGBA image of per-category counts: colours mixed by count, opacity by density.
+    """
+    total = counts.sum(axis=0)
+    filled = total > 0
+    rgb = np.tensordot(np.asarray(colors, dtype=np.float64).T, counts, axes=1)
+    rgb = np.divide(rgb, total, out=np.zeros_like(rgb), where=filled).transpose(1, 2, 0)
+    density = np.log1p(total) if log else total.astype(np.float64)
+    alpha = np.where(filled, 0.25 + 0.75 * density / max(density.max(), 1e-12), 0.0)
+    return np.dstack([rgb, alpha])
+
+
+def render_density(ax, grid, log=True, cmap="viridis", colors=None, labels=None, sparse=None, marker_size=4):
+    """
+    Draw a grid on matplotlib axes.
+    Args:
+        ax: Matplotlib axes.
+        grid (DensityGrid): The counts.
+        log (bool): Log-scale the counts.
+        cmap (str): Colour map of a single-layer grid.
+        colors (list): One colour per category of a multi-layer grid; the
+            default colour cycle otherwise.
+        labels (list): Legend labels of the categories.
+        sparse (tuple): (x, y, category) of points to draw as markers, e.g.
+            from `sparse_points`; category may be None.
+        marker_size (float): Size of those markers.
+
+    Returns:
+        The image artist, for a colorbar.
+    """
+    if grid.categories == 1:
+        counts = np.ma.masked_equal(grid.counts[0], 0)
+        norm = LogNorm(vmin=1, vmax=max(int(counts.max() or 1), 2)) if log else None
+        image = ax.imshow(counts, extent=grid.extent, origin="lower", aspect="auto", interpolation="nearest",
+                          cmap=cmap, norm=norm)
+    else:
+        colors = [to_rgb(color) for color in (colors or [f"C{i}" for i in range(grid.categories)])]
+        image = ax.imshow(_blend(grid.counts, colors, log), extent=grid.extent, origin="lower", aspect="auto",
+                          interpolation="nearest")
+        if labels is not None:
+            ax.legend(handles=[Patch(color=color, label=label) for color, label in zip(colors, labels)])
+    if sparse is not None:
+        x, y, category = sparse
+        if len(x):
+            multi = grid.categories > 1 and category is not None
+            color = np.asarray(colors)[np.asarray(category)] if multi else "black"
+            ax.scatter(x, y, s=marker_size, c=color, linewidths=0)
+    ax.set_xlim(*grid.x_range)
+    ax.set_ylim(*grid.y_range)
+    return image
@@ -0,0 +1,239 @@
+"""
+Incremental rolling statistics over time-based windows.
+
+`RollingStats` keeps, for several windows at once (e.g. 30s and 60s), the
+tick count, mean, sample std, min, max and volume-weighted average of the
+ticks in (t - window, t], the same window pandas' `rolling("30s")` uses.
+
+- `push(timestamp, value, volume)` updates every window in amortised O(1):
+  Welford-style running mean/variance with removal, running sums for VWAP and
+  monotonic deques for min/max.
+- `push_many(timestamps, values, volumes)` takes NumPy arrays and returns the
+  statistics after every tick, computed with prefix sums and range min/max
+  queries instead of a Python loop. The streaming state is then rebuilt from
+  the ticks still inside the windows, so both calls can be mixed freely.
+"""
+import datetime
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+STATS = ("count", "mean", "std", "min", "max", "vwap")
+# Rows handled per block by the vectorised min/max queries, to bound memory
+_BLOCK = 1 << 16
+
+
+def window_ns(window):
+    """
+    Window length in ns from an int (ns) or a pandas offset string like "30s".
+    """
+    if isinstance(window, (int, np.integer)):
+        return int(window)
+    return int(pd.Timedelta(window).value)
+
+
+def _to_ns(timestamps):
+    if isinstance(timestamps, (pd.Timestamp, datetime.datetime, np.datetime64)):
+        return pd.Timestamp(timestamps).value
+    timestamps = np.asarray(timestamps)
+    if np.issubdtype(timestamps.dtype, np.datetime64):
+        return timestamps.astype("datetime64[ns]").view(np.int64)
+    return timestamps.astype(np.int64)
+
+
+class _Window:
+    """
+    Streaming state of one time window.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.clear()
+
+    def clear(self):
+        self.ticks = deque()
+        self.lows = deque()
+        self.highs = deque()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.weighted = 0.0
+        self.volume = 0.0
+
+    def add(self, timestamp, value, volume):
+        self.ticks.append((timestamp, value, volume))
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.weighted += value * volume
+        self.volume += volume
+        # Each deque holds the candidates for the extreme that are still to come
+        while self.lows and self.lows[-1][1] >= value:
+            self.lows.pop()
+        self.lows.append((timestamp, value))
+        while self.highs and self.highs[-1][1] <= value:
+            self.highs.pop()
+        self.highs.append((timestamp, value))
+
+    def evict(self, now):
+        cutoff = now - self.length
+        while self.ticks and self.ticks[0][0] <= cutoff:
+            _, value, volume = self.ticks.popleft()
+            self.count -= 1
+            if self.count == 0:
+                self.mean = self.m2 = self.weighted = self.volume = 0.0
+            else:
+                delta = value - self.mean
+                self.mean -= delta / self.count
+                self.m2 -= delta * (value - self.mean)
+                self.weighted -= value * volume
+                self.volume -= volume
+        while self.lows and self.lows[0][0] <= cutoff:
+            self.lows.popleft()
+        while self.highs and self.highs[0][0] <= cutoff:
+            self.highs.popleft()
+
+    def read(self):
+        if self.count == 0:
+            return {"count": 0, "mean": math.nan, "std": math.nan, "min": math.nan, "max": math.nan, "vwap": math.nan}
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": math.sqrt(max(self.m2, 0.0) / (self.count - 1)) if self.count > 1 else math.nan,
+            "min": self.lows[0][1],
+            "max": self.highs[0][1],
+            "vwap": self.weighted / self.volume if self.volume else math.nan,
+        }
+
+
+def _range_extreme(values, starts, ends, reduce):
+    """
+    reduce(values[starts[i]:ends[i] + 1]) for every i, from a sparse table built
+    per block of queries.
+    """
+    result = np.empty(len(starts))
+    for block in range(0, len(starts), _BLOCK):
+        block_starts, block_ends = starts[block:block + _BLOCK], ends[block:block + _BLOCK]
+        if len(block_starts) == 0:
+            continue
+        offset = int(block_starts.min())
+        lengths = block_ends - block_starts + 1
+        table = [values[offset:int(block_ends.max()) + 1]]
+        while (1 << len(table)) <= lengths.max():
+            previous, step = table[-1], 1 << (len(table) - 1)
+            table.append(reduce(previous[:-step], previous[step:]))
+        level = np.floor(np.log2(lengths)).astype(np.int64)
+        left, right = block_starts - offset, block_ends - offset - (1 << level) + 1
+        extremes = np.empty(len(block_starts))
+        for k in np.unique(level):
+            rows = level == k
+            extremes[rows] = reduce(table[k][left[rows]], table[k][right[rows]])
+        result[block:block + _BLOCK] = extremes
+    return result
+
+
+class RollingStats:
+    """
+    Count, mean, std, min, max and VWAP over several time windows, updated
+    one tick or one array of ticks at a time.
+    Args:
+        windows (iterable): Window lengths as offset strings ("30s") or ns.
+    """
+
+    def __init__(self, windows=("30s", "60s")):
+        self.names = [str(window) for window in windows]
+        self.windows = {name: _Window(window_ns(window)) for name, window in zip(self.names, windows)}
+        self.last_timestamp = None
+
+    def _check_order(self, timestamp):
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            raise ValueError(f"Tick at {timestamp} is older than the previous tick at {self.last_timestamp}")
+
+    def push(self, timestamp, value, volume=1.0):
+        """
+        Add one tick; timestamps must not decrease.
+        """
+        timestamp = int(_to_ns(timestamp))
+        self._check_order(timestamp)
+        self.last_timestamp = timestamp
+        for window in self.windows.values():
+            window.add(timestamp, float(value), float(volume))
+            window.evict(timestamp)
+
+    def read(self, window=None):
+        """
+        Current statistics of one window, or of every window keyed by name.
+        """
+        if window is not None:
+            return self.windows[str(window)].read()
+        return {name: w.read() for name, w in self.windows.items()}
+
+    def push_many(self, timestamps, values, volumes=None):
+        """
+        Add an array of ticks and return the statistics as of every tick.
+        Args:
+            timestamps (np.ndarray): Non-decreasing ns ints or datetime64 values.
+            values (np.ndarray): Tick values (e.g. prices).
+            volumes (np.ndarray): Weights for the VWAP; 1 per tick when omitted.
+
+        Returns:
+            dict: (window name, stat) -> np.ndarray with one entry per new tick.
+        """
+        timestamps = _to_ns(timestamps)
+        values = np.asarray(values, dtype=np.float64)
+        volumes = np.ones(len(values)) if volumes is None else np.asarray(volumes, dtype=np.float64)
+        if len(timestamps) == 0:
+            return {(name, stat): np.empty(0) for name in self.names for stat in STATS}
+        if (np.diff(timestamps) < 0).any():
+            raise ValueError("push_many needs non-decreasing timestamps")
+        self._check_order(int(timestamps[0]))
+
+        # Ticks still inside the longest window carry over into this batch
+        history = max(self.windows.values(), key=lambda w: w.length).ticks
+        all_times = np.concatenate([np.array([t for t, _, _ in history], dtype=np.int64), timestamps])
+        all_values = np.concatenate([np.array([v for _, v, _ in history], dtype=np.float64), values])
+        all_volumes = np.concatenate([np.array([w for _, _, w in history], dtype=np.float64), volumes])
+        new = np.arange(len(history), len(all_times))
+
+        # Centring on the batch mean keeps the prefix sums of squares well conditioned
+        centre = all_values.mean()
+        centred = all_values - centre
+        sums = np.concatenate([[0.0], np.cumsum(centred)])
+        squares = np.concatenate([[0.0], np.cumsum(centred * centred)])
+        weighted = np.concatenate([[0.0], np.cumsum(all_values * all_volumes)])
+        weights = np.concatenate([[0.0], np.cumsum(all_volumes)])
+
+        result = {}
+        for name, window in self.windows.items():
+            starts = np.searchsorted(all_times, timestamps - window.length, side="right")
+            count = new - starts + 1
+            total = sums[new + 1] - sums[starts]
+            mean = total / count
+            with np.errstate(invalid="ignore", divide="ignore"):
+                variance = (squares[new + 1] - squares[starts] - total * mean) / (count - 1)
+                volume = weights[new + 1] - weights[starts]
+                vwap = (weighted[new + 1] - weighted[starts]) / volume
+            result[(name, "count")] = count
+            result[(name, "mean")] = mean + centre
+            result[(name, "std")] = np.where(count > 1, np.sqrt(np.clip(variance, 0, None)), np.nan)
+            result[(name, "min")] = _range_extreme(all_values, starts, new, np.minimum)
+            result[(name, "max")] = _range_extreme(all_values, starts, new, np.maximum)
+            result[(name, "vwap")] = np.where(volume != 0, vwap, np.nan)
+
+        # Rebuild the streaming state from the ticks the windows still hold
+        self.last_timestamp = int(timestamps[-1])
+        for window in self.windows.values():
+            window.clear()
+            start = int(np.searchsorted(all_times, self.last_timestamp - window.length, side="right"))
+            for i in range(start, len(all_times)):
+                window.add(int(all_times[i]), float(all_values[i]), float(all_volumes[i]))
+        return result
+
+    def frame(self, stats, index=None):
+        """
+        `push_many` output as a DataFrame with "<stat>_<window>" columns.
+        """
+        return pd.DataFrame({f"{stat}_{name}": values for (name, stat), values in stats.items()}, index=index)
@@ -0,0 +1,365 @@
+"""
+Low-latency scoring of new quotes with a registered sharp change model.
+
+`SharpChangeScorer` takes micro-batches of quotes per stock and returns the
+model's sharp change probability for every tick. For each stock it keeps
+only the state the features need:
+
+- the last max(window) quotes, for the rolling averages, rolling standard
+  deviations and momentum, and the order flow and realized volatility tick
+  windows of `microstructure.py`;
+- when the model uses the time windows (quote rate, realized volatility over
+  10s/60s), the times of the quotes in the longest window and the running
+  sums of their squared log returns. A new quote's window sum is the
+  difference of two running sums, found with `np.searchsorted`.
+
+A batch is therefore scored from that state plus the new ticks with the same
+vectorised NumPy kernels as the feature store and one `inplace_predict`
+call; the feature cost grows with the batch, not with the time windows.
+Ticks that do not have a full window yet (right after start or `reset`) get
+NaN, matching the rows the training data drops.
+
+Latencies of the last batches are kept to report throughput and percentiles.
+`serve` exposes the scorer over a small local HTTP endpoint:
+
+    POST /score  {"stock": "A", "bidPrice": [...], "askPrice": [...],
+                  "bidVolume": [...], "askVolume": [...], "time_ns": [...]}
+    GET  /stats
+
+The volumes and times (ns since midnight) are only required by models using
+order book features.
+
+Run from the repository root:
+    python -m pages.utils.scoring --key <model key> --port 8765
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from pages.utils.features import WINDOWS
+from pages.utils.microstructure import TIME_WINDOWS, log_returns, microstructure_columns, quote_features, window_label
+from pages.utils.model_registry import ModelArtifact
+from pages.utils.rolling import window_ns
+
+# Batch latencies kept for the percentiles
+LATENCY_HISTORY = 10000
+# Quote fields the order book features need besides the prices
+QUOTE_FIELDS = ("bidVolume", "askVolume", "time_ns")
+
+
+def rolling_features(mids, windows=WINDOWS):
+    """
+    Tick-window features of every position of `mids`.
+    Args:
+        mids (np.ndarray): Mid prices, oldest first.
+        windows (tuple): Rolling window lengths in ticks.
+
+    Returns:
+        dict: Feature name -> np.ndarray like `features.compute_features`;
+        NaN where the window is not full yet.
+    """
+    n = len(mids)
+    centre = mids.mean() if n else 0.0
+    centred = mids - centre
+    sums = np.concatenate([[0.0], np.cumsum(centred)])
+    squares = np.concatenate([[0.0], np.cumsum(centred * centred)])
+    # Price moves up to each position, to find flat windows exactly
+    moves = np.concatenate([[0], np.cumsum(mids[1:] != mids[:-1])])
+    features = {}
+    for w in windows:
+        mean = np.full(n, np.nan)
+        std = np.full(n, np.nan)
+        if n >= w:
+            total = sums[w:] - sums[:-w]
+            mean[w - 1:] = total / w + centre
+            variance = (squares[w:] - squares[:-w] - total * total / w) / (w - 1)
+            # The running sums leave rounding residue where the price did not move
+            variance[moves[w - 1:] == moves[:n - w + 1]] = 0.0
+            std[w - 1:] = np.sqrt(np.maximum(variance, 0))
+        features[f"rolling_avg_{w}"] = mean
+        features[f"rolling_std_{w}"] = std
+    momentum = np.full(n, np.nan)
+    momentum[1:] = mids[1:] / mids[:-1] - 1
+    features["midPrice"] = mids
+    features["momentum"] = momentum
+    return features
+
+
+class _TimeWindows:
+    """
+    Running sums of one stock's squared log returns over the time windows.
+    Args:
+        time_windows (tuple): Time windows as pandas offset strings or ns.
+    """
+
+    def __init__(self, time_windows):
+        self.windows = [(window_label(t), window_ns(t)) for t in time_windows]
+        self.longest = max(width for _, width in self.windows)
+        # Times of the quotes a later quote's window can still reach, and the
+        # sums of the returns before each of them (one more entry: the total)
+        self.time_ns = np.empty(0, dtype=np.int64)
+        self.sums = np.zeros(1)
+
+    def update(self, time_ns, squared):
+        """
+        Quote rate and realized volatility of new quotes, moving the state on.
+        Args:
+            time_ns (np.ndarray): Times of the new quotes, not before the kept ones.
+            squared (np.ndarray): Their squared log returns.
+
+        Returns:
+            dict: Column name -> float64 array, like `quote_features`.
+        """
+        kept = len(self.time_ns)
+        sums = np.concatenate([self.sums, self.sums[-1] + np.cumsum(squared)])
+        ends = np.arange(kept + 1, kept + len(time_ns) + 1)
+        features = {}
+        for label, width in self.windows:
+            # Quotes at or before t - width, among the kept ones and the new ones
+            bounds = time_ns - width
+            starts = np.searchsorted(self.time_ns, bounds, side="right") + np.searchsorted(time_ns, bounds, side="right")
+            features[f"quote_rate_{label}"] = (ends - starts) / (width / 1e9)
+            features[f"realized_vol_{label}"] = np.sqrt(np.maximum(sums[ends] - sums[starts], 0))
+
+        times = np.concatenate([self.time_ns, time_ns])
+        first = int(np.searchsorted(times, times[-1] - self.longest, side="right")) if len(times) else 0
+        self.time_ns = times[first:]
+        # Sums from the first kept quote on, so they do not grow over the day
+        self.sums = sums[first:] - sums[first]
+        return features
+
+
+class SharpChangeScorer:
+    """
+    Scores micro-batches of quotes, keeping rolling feature state per stock.
+    Args:
+        model: Booster or estimator with `inplace_predict` or `predict_proba`.
+        feature_columns (list): Model input columns, in training order.
+        windows (tuple): Rolling window lengths the features use.
+        time_windows (tuple): Time windows of the order book features.
+    """
+
+    def __init__(self, model, feature_columns, windows=WINDOWS, time_windows=TIME_WINDOWS):
+        book = set(microstructure_columns(windows, time_windows))
+        missing = [
+            name for name in feature_columns
+            if name not in rolling_features(np.empty(0), windows) and name not in book
+        ]
+        if missing:
+            raise ValueError(f"The scorer cannot compute {missing} from level 1 quotes")
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        self.windows = tuple(windows)
+        self.time_windows = tuple(time_windows)
+        self.history = max(self.windows) if self.windows else 1
+        # Quote columns kept per stock; volumes and times only when the model reads the order book
+        self.order_book = any(name in book for name in self.feature_columns)
+        self.fields = ("bidPrice", "askPrice", *(QUOTE_FIELDS if self.order_book else ()))
+        self.tails = {}
+        # Time window state per stock, when the model reads the order book
+        self.time_states = {}
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.ticks = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_registry(cls, key):
+        """
+        Scorer for a model saved by `model_registry`.
+        """
+        artifact = ModelArtifact.load(key)
+        if artifact is None:
+            raise ValueError(f"No registered model with key {key}")
+        return cls(artifact.model, artifact.preprocessing["feature_columns"])
+
+    def reset(self, stock=None):
+        """
+        Forget the rolling state of one stock (e.g. at a new period) or of all.
+        """
+        with self._lock:
+            if stock is None:
+                self.tails.clear()
+                self.time_states.clear()
+            else:
+                self.tails.pop(stock, None)
+                self.time_states.pop(stock, None)
+
+    def _probabilities(self, X):
+        if hasattr(self.model, "inplace_predict"):
+            return np.asarray(self.model.inplace_predict(X), dtype=np.float64)
+        return self.model.predict_proba(X)[:, 1]
+
+    def transform(self, stock, bid_prices, ask_prices, bid_volumes=None, ask_volumes=None, time_ns=None):
+        """
+        Model input rows of the new ticks of one stock, moving its state on.
+        Args:
+            stock (str): Stock symbol.
+            bid_prices (array-like): Bid prices of the new ticks, oldest first.
+            ask_prices (array-like): Ask prices of the new ticks.
+            bid_volumes, ask_volumes (array-like): Queue sizes of the new ticks;
+                required by models using order book features.
+            time_ns (array-like): Times of the new ticks in ns since midnight,
+                non-decreasing across batches; required with the volumes.
+
+        Returns:
+            np.ndarray: One row per tick, columns in `feature_columns` order;
+            NaN where a window is not full yet.
+        """
+        given = {
+            "bidPrice": bid_prices,
+            "askPrice": ask_prices,
+            "bidVolume": bid_volumes,
+            "askVolume": ask_volumes,
+            "time_ns": time_ns,
+        }
+        missing = [name for name in self.fields if given[name] is None]
+        if missing:
+            raise ValueError(f"The model's order book features also need {missing} for every tick")
+        batch = {
+            name: np.asarray(given[name], dtype=np.int64 if name == "time_ns" else np.float64)
+            for name in self.fields
+        }
+        n = len(batch["bidPrice"])
+        if any(len(values) != n for values in batch.values()):
+            raise ValueError(f"{list(self.fields)} must have one value per tick")
+        with self._lock:
+            tail = self.tails.get(stock) or {name: batch[name][:0] for name in self.fields}
+            series = {name: np.concatenate([tail[name], batch[name]]) for name in self.fields}
+            if self.order_book and (np.diff(series["time_ns"]) < 0).any():
+                raise ValueError(f"Ticks of {stock} must arrive in time order")
+            self.tails[stock] = {name: values[-self.history:] for name, values in series.items()}
+            mids = (series["bidPrice"] + series["askPrice"]) / 2
+            new = slice(len(mids) - n, len(mids))
+            # Columns of the new ticks only
+            latest = {}
+            if self.order_book and self.time_windows:
+                state = self.time_states.get(stock)
+                if state is None:
+                    state = self.time_states[stock] = _TimeWindows(self.time_windows)
+                latest = state.update(batch["time_ns"], log_returns(mids)[new] ** 2)
+
+        features = rolling_features(mids, self.windows)
+        if self.order_book:
+            features.update(quote_features(
+                series["bidPrice"], series["askPrice"], series["bidVolume"], series["askVolume"], series["time_ns"],
+                self.windows, (),
+            ))
+        latest.update((name, values[new]) for name, values in features.items())
+        return np.column_stack([latest[name] for name in self.feature_columns])
+
+    def score(self, stock, bid_prices, ask_prices, bid_volumes=None, ask_volumes=None, time_ns=None):
+        """
+        Sharp change probability of every new tick of one stock; the arguments
+        are those of `transform`.
+
+        Returns:
+            np.ndarray: One probability per tick; NaN until a full window exists.
+        """
+        start = time.perf_counter()
+        X = self.transform(stock, bid_prices, ask_prices, bid_volumes, ask_volumes, time_ns)
+        ready = ~np.isnan(X).any(axis=1)
+        probabilities = np.full(len(X), np.nan)
+        if ready.any():
+            probabilities[ready] = self._probabilities(X[ready])
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.ticks += len(X)
+            self.busy_seconds += elapsed
+        return probabilities
+
+    def stats(self):
+        """
+        Batches and ticks scored, throughput while scoring, and batch latency
+        percentiles in milliseconds over the recent batches.
+        """
+        with self._lock:
+            latencies = np.array(self.latencies) * 1000
+            ticks, busy = self.ticks, self.busy_seconds
+        if len(latencies) == 0:
+            return {"batches": 0, "ticks": ticks}
+        return {
+            "batches": len(latencies),
+            "ticks": ticks,
+            "ticks_per_second": ticks / busy if busy else float("nan"),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p90_ms": float(np.percentile(latencies, 90)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(latencies.max()),
+        }
+
+
+def _handler(scorer):
+    class ScoringHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._reply(200, scorer.stats())
+            else:
+                self._reply(404, {"error": "unknown path"})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self._reply(404, {"error": "unknown path"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                probabilities = scorer.score(
+                    request["stock"],
+                    request["bidPrice"],
+                    request["askPrice"],
+                    request.get("bidVolume"),
+                    request.get("askVolume"),
+                    request.get("time_ns"),
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {"error": str(e)})
+                return
+            # JSON has no NaN, so warm-up ticks come back as null
+            self._reply(200, {"probabilities": [None if np.isnan(p) else float(p) for p in probabilities]})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ScoringHandler
+
+
+def serve(scorer, host="127.0.0.1", port=8765):
+    """
+    Start the scoring endpoint in a background thread.
+
+    Returns:
+        ThreadingHTTPServer: Call `shutdown()` on it to stop serving.
+    """
+    server = ThreadingHTTPServer((host, port), _handler(scorer))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a registered sharp change model over HTTP.")
+    parser.add_argument("--key", required=True, help="Model key from the model registry")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = serve(SharpChangeScorer.from_registry(args.key), args.host, args.port)
+    print(f"Scoring on http://{args.host}:{args.port}/score (stats on /stats)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
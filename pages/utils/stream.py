@@ -0,0 +1,251 @@
+"""
+Time-ordered stream of a period's ticks across files, stocks and trades.
+
+A stock's quotes are split over market_data_<stock>_<n>.csv files, and the
+loaders concatenate them in file order. Nothing checks that the result is
+in time order, and a whole period has to be in memory before a feature or
+chart can look at it. `TickStream` merges the files instead and yields
+time-ordered batches:
+
+- every file is a source that is read one Parquet chunk at a time, and it
+  is only opened once the merge reaches the first timestamp the manifest
+  records for it, so files that follow each other are never open together;
+- a heap orders the open sources by the last timestamp they have buffered.
+  Its top is the horizon up to which every source's rows are known, so
+  each step emits all buffered rows up to the horizon, merges those runs
+  with a stable sort, and refills the source that set it;
+- memory is bounded by one chunk per open source plus the batch being
+  built, whatever the length of the period.
+
+A tick earlier than the one before it in the same file cannot be put in
+its place without reading the file in full. It is counted in `disorder`
+and either kept right after the tick it follows or dropped, and a warning
+lists the files involved at the end of the stream.
+"""
+import heapq
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from pages.utils.manifest import get_manifest, select_files
+from pages.utils.tick_store import MARKET_COLUMNS, TRADE_COLUMNS, build_caches, cache_path, list_stocks
+
+# Rows read from a file at a time
+CHUNK_ROWS = 65536
+# Rows per yielded batch (a step can add up to one chunk per open source on top)
+BATCH_ROWS = 262144
+DISORDER_POLICIES = ("keep", "drop")
+KINDS = ("market_data", "trade_data")
+
+
+class _Source:
+    """
+    One tick file read chunk by chunk, with the rows buffered but not yet emitted.
+    """
+
+    def __init__(self, entry, order, columns, chunk_rows):
+        self.entry = entry
+        self.order = order
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.batches = None
+        self.buffer = None
+        self.effective = None
+        self.running_max = None
+        self.exhausted = False
+
+    @property
+    def path(self):
+        return self.entry["path"]
+
+    def open(self):
+        parquet = pq.ParquetFile(cache_path(self.path))
+        present = [name for name in self.columns if name in parquet.schema_arrow.names]
+        self.batches = parquet.iter_batches(batch_size=self.chunk_rows, columns=present)
+
+    def refill(self, on_disorder):
+        """
+        Append the next chunk to the buffer.
+
+        Returns:
+            int: Out-of-order rows in the chunk.
+        """
+        try:
+            batch = next(self.batches)
+        except StopIteration:
+            self.exhausted = True
+            return 0
+        chunk = {name: batch.column(name).to_numpy(zero_copy_only=False) for name in batch.schema.names}
+        times = chunk["time_ns"]
+        previous = self.running_max if self.running_max is not None else np.iinfo(np.int64).min
+        # A late tick travels with the tick it follows: it is merged at that tick's time
+        effective = np.maximum.accumulate(np.concatenate([[previous], times]))[1:]
+        late = times < effective
+        count = int(late.sum())
+        if count and on_disorder == "drop":
+            chunk = {name: values[~late] for name, values in chunk.items()}
+            effective = effective[~late]
+        if len(effective):
+            self.running_max = int(effective[-1])
+        if self.buffer is None or not len(self.effective):
+            self.buffer, self.effective = chunk, effective
+        else:
+            self.buffer = {name: np.concatenate([self.buffer[name], chunk[name]]) for name in chunk}
+            self.effective = np.concatenate([self.effective, effective])
+        return count
+
+    def take(self, horizon):
+        """
+        Remove and return the buffered rows up to `horizon`, with their merge times.
+        """
+        end = int(np.searchsorted(self.effective, horizon, side="right"))
+        rows = {name: values[:end] for name, values in self.buffer.items()}
+        times = self.effective[:end]
+        self.buffer = {name: values[end:] for name, values in self.buffer.items()}
+        self.effective = self.effective[end:]
+        return rows, times
+
+    @property
+    def buffered(self):
+        return len(self.effective) if self.effective is not None else 0
+
+
+class TickStream:
+    """
+    Iterates over a period's ticks in time order, in batches.
+    Args:
+        directory (str): Path to the data directory.
+        period (str): Period folder name, e.g. "Period16".
+        stocks (list): Stock symbols, or None for every stock folder of the period.
+        trades (bool): Merge the trade_data files in as well.
+        chunk_rows (int): Rows read from a file at a time.
+        batch_rows (int): Target rows per yielded batch.
+        on_disorder (str): "keep" or "drop" ticks that are earlier than the
+            tick before them in their file.
+
+    Each batch is a DataFrame with categorical `stock` and `kind`
+    ("market_data" / "trade_data") columns, time_ns, timestamp and the value
+    columns of both kinds (NaN where a row's kind has no such column).
+    """
+
+    def __init__(self, directory, period, stocks=None, trades=False, chunk_rows=CHUNK_ROWS, batch_rows=BATCH_ROWS,
+                 on_disorder="keep"):
+        if on_disorder not in DISORDER_POLICIES:
+            raise ValueError(f"on_disorder must be one of {DISORDER_POLICIES}, not {on_disorder!r}")
+        self.directory = directory
+        self.period = period
+        self.stocks = list(stocks or list_stocks(directory, period))
+        self.kinds = KINDS if trades else KINDS[:1]
+        self.chunk_rows = chunk_rows
+        self.batch_rows = batch_rows
+        self.on_disorder = on_disorder
+        self.value_columns = [c for c in MARKET_COLUMNS if c != "timestamp"]
+        if trades:
+            self.value_columns += [c for c in TRADE_COLUMNS if c != "timestamp"]
+        self.disorder = {}
+        self.stats = {"rows": 0, "batches": 0, "files": 0, "peak_open": 0, "peak_buffered": 0}
+
+    def _entries(self):
+        manifest = get_manifest(self.directory)
+        entries = []
+        for stock in self.stocks:
+            for kind in self.kinds:
+                entries += select_files(manifest, stock, self.period, kind=kind)
+        build_caches([entry["path"] for entry in entries])
+        return entries
+
+    def __iter__(self):
+        entries = self._entries()
+        columns = ["time_ns", "timestamp", *self.value_columns]
+        sources = [_Source(entry, order, columns, self.chunk_rows) for order, entry in enumerate(entries)]
+        # Files not opened yet, by the first timestamp they hold
+        pending = [(entry["min_ns"], source.order) for entry, source in zip(entries, sources)]
+        heapq.heapify(pending)
+        # Open sources by the last timestamp they have buffered
+        ready = []
+        runs = []
+        buffered_rows = 0
+
+        while ready or pending:
+            # Open every file that starts before the earliest buffered end
+            while pending and (not ready or pending[0][0] <= ready[0][0]):
+                _, order = heapq.heappop(pending)
+                source = sources[order]
+                source.open()
+                self.stats["files"] += 1
+                self._refill(source, ready)
+            if not ready:
+                continue
+            horizon = ready[0][0]
+            self.stats["peak_open"] = max(self.stats["peak_open"], len(ready))
+            self.stats["peak_buffered"] = max(self.stats["peak_buffered"], sum(sources[o].buffered for _, o in ready))
+
+            for _, order in list(ready):
+                source = sources[order]
+                rows, times = source.take(horizon)
+                if len(times):
+                    runs.append((source, rows, times))
+                    buffered_rows += len(times)
+            # Refill the sources that ran dry; one of them set the horizon
+            still_open = []
+            for _, order in ready:
+                source = sources[order]
+                if source.buffered:
+                    still_open.append((int(source.effective[-1]), order))
+                else:
+                    self._refill(source, still_open)
+            ready = still_open
+            heapq.heapify(ready)
+
+            if buffered_rows >= self.batch_rows or not (ready or pending):
+                if runs:
+                    yield self._batch(runs)
+                runs, buffered_rows = [], 0
+        self._report()
+
+    def _refill(self, source, ready):
+        while not source.buffered and not source.exhausted:
+            late = source.refill(self.on_disorder)
+            if late:
+                self.disorder[source.path] = self.disorder.get(source.path, 0) + late
+        if source.buffered:
+            heapq.heappush(ready, (int(source.effective[-1]), source.order))
+
+    def _batch(self, runs):
+        """
+        Merge the emitted runs into one time-ordered DataFrame.
+        """
+        times = np.concatenate([run_times for _, _, run_times in runs])
+        # Every run is sorted, so the stable sort only merges them; ties keep source order
+        order = np.argsort(times, kind="stable")
+        lengths = [len(run_times) for _, _, run_times in runs]
+        n = len(times)
+        stock_codes = np.repeat([self.stocks.index(source.entry["stock"]) for source, _, _ in runs], lengths)
+        kind_codes = np.repeat([KINDS.index(source.entry["kind"]) for source, _, _ in runs], lengths)
+        data = {
+            "stock": pd.Categorical.from_codes(stock_codes[order].astype(np.int8), categories=self.stocks),
+            "kind": pd.Categorical.from_codes(kind_codes[order].astype(np.int8), categories=list(self.kinds)),
+        }
+        for name in ["time_ns", "timestamp", *self.value_columns]:
+            parts = []
+            for (_, rows, _), length in zip(runs, lengths):
+                parts.append(rows[name] if name in rows else np.full(length, np.nan))
+            data[name] = np.concatenate(parts)[order] if n else np.empty(0)
+        self.stats["rows"] += n
+        self.stats["batches"] += 1
+        return pd.DataFrame(data)
+
+    def _report(self):
+        if self.disorder:
+            files = ", ".join(f"{path} ({count})" for path, count in self.disorder.items())
+            action = "kept after the tick they follow" if self.on_disorder == "keep" else "dropped"
+            warnings.warn(f"Out-of-order ticks {action}: {files}")
+
+
+def stream_period(directory, period, stocks=None, trades=False, **options):
+    """
+    Time-ordered batches of a period's ticks; see `TickStream` for the options.
+    """
+    return iter(TickStream(directory, period, stocks, trades, **options))
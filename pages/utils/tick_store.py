@@ -0,0 +1,408 @@
+"""
+Shared loader for the market_data / trade_data tick files.
+
+The first time a CSV is read it is converted into a typed Parquet file under
+CACHE_DIR. Later reads come straight from that file, and it is rebuilt whenever
+the source CSV's mtime or size changes.
+"""
+import os
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+from pages.utils.progress import advance, stage
+from pages.utils.timestamps import parse_time_column, period_from_path, to_datetime64
+
+MARKET_COLUMNS = ['bidVolume', 'bidPrice', 'askVolume', 'askPrice', 'timestamp']
+TRADE_COLUMNS = ['price', 'volume', 'timestamp']
+STOCKS = ["A", "B", "C", "D", "E"]
+
+# Where the Parquet copies live; override with the TICK_CACHE_DIR env variable
+CACHE_DIR = os.environ.get("TICK_CACHE_DIR", "./.tick_cache")
+# Bump whenever the cached layout changes so stale files get rebuilt
+CACHE_VERSION = 2
+
+
+def natural_sort(lst):
+    """
+    Sorts a list using natural sorting (e.g., Period10 comes after Period9).
+    """
+    return sorted(lst, key=lambda x: [int(t) if t.isdigit() else t.lower() for t in re.split(r'(\d+)', x)])
+
+
+def list_periods(directory):
+    """
+    List the Period folders of a data directory in natural order.
+    """
+    if not os.path.exists(directory):
+        return []
+    return natural_sort(
+        [p for p in os.listdir(directory) if os.path.isdir(os.path.join(directory, p))]
+    )
+
+
+def list_stocks(directory, period):
+    """
+    List the stock folders present in a period.
+    """
+    period_path = stock_path(directory, period, "")
+    if not os.path.isdir(period_path):
+        return []
+    return natural_sort(
+        [s for s in os.listdir(period_path) if os.path.isdir(os.path.join(period_path, s))]
+    )
+
+
+def stock_path(directory, period, stock):
+    """
+    Folder holding a stock's files, coping with the double nested `Period` folder.
+    """
+    nested = os.path.join(directory, period, period)
+    if os.path.isdir(nested):
+        return os.path.join(nested, stock)
+    return os.path.join(directory, period, stock)
+
+
+def list_files(directory, period, stock, prefix="market_data"):
+    """
+    Paths of a stock's files starting with `prefix`, in natural order so that
+    market_data_C_10.csv comes after market_data_C_9.csv.
+    """
+    path = stock_path(directory, period, stock)
+    if not os.path.isdir(path):
+        return []
+    files = [f for f in os.listdir(path) if f.startswith(prefix) and f.endswith(".csv")]
+    return [os.path.join(path, f) for f in natural_sort(files)]
+
+
+def list_all_files(directory, stocks=None, prefix="market_data"):
+    """
+    Every file of the selected stocks across all periods.
+    Args:
+        directory (str): Path to the data directory.
+        stocks (list): Stock symbols, or None for every stock folder found.
+        prefix (str): File name prefix, "market_data" or "trade_data".
+
+    Returns:
+        tuple: (paths, labels) where labels holds the (stock, period) of each
+        path, ordered by period, stock and file index.
+    """
+    paths, labels = [], []
+    for period in list_periods(directory):
+        for stock in stocks or list_stocks(directory, period):
+            for path in list_files(directory, period, stock, prefix):
+                paths.append(path)
+                labels.append((stock, period))
+    return paths, labels
+
+
+def columns_for(path):
+    """
+    Column names of a tick file, based on its file name.
+    """
+    return TRADE_COLUMNS if os.path.basename(path).startswith("trade_data") else MARKET_COLUMNS
+
+
+def _is_number(field):
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+
+def sniff_header(path):
+    """
+    Work out whether a tick CSV starts with a header line.
+    Args:
+        path (str): Path to the source CSV.
+
+    Returns:
+        tuple: (has_header, column names). Headerless files get the default
+        names for their kind, which must match their field count.
+    """
+    with open(path, "r") as f:
+        first_line = f.readline().strip()
+    fields = [field.strip() for field in first_line.split(",")]
+    if first_line and not all(_is_number(field) for field in fields[:-1]):
+        return True, fields
+    columns = columns_for(path)
+    if first_line and len(fields) != len(columns):
+        raise ValueError(f"{path}: expected {len(columns)} columns, found {len(fields)}")
+    return False, columns
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return str(stat.st_mtime_ns), str(stat.st_size)
+
+
+def cache_path(path):
+    """
+    Location of the Parquet copy of a source CSV.
+    """
+    relative = os.path.splitdrive(os.path.abspath(path))[1].lstrip(os.sep)
+    return os.path.join(CACHE_DIR, os.path.splitext(relative)[0] + ".parquet")
+
+
+def is_fresh(path, cached, version=CACHE_VERSION):
+    """
+    Whether a derived Parquet file was built from the current version of
+    `path` with the given layout version.
+    """
+    if not os.path.exists(cached):
+        return False
+    try:
+        metadata = pq.read_schema(cached).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    mtime, size = _source_signature(path)
+    return (
+        metadata.get(b"cache_version") == str(version).encode()
+        and metadata.get(b"source_mtime_ns") == mtime.encode()
+        and metadata.get(b"source_size") == size.encode()
+    )
+
+
+def parse_csv(path):
+    """
+    Parse a raw tick CSV into a typed DataFrame.
+    Args:
+        path (str): Path to a market_data or trade_data CSV.
+
+    Returns:
+        pd.DataFrame: Float price/volume columns, a `time_ns` column holding
+        nanoseconds since midnight and a datetime64 `timestamp` on the period's
+        session date. Rows with a malformed timestamp are dropped with a warning.
+    """
+    has_header, columns = sniff_header(path)
+    return parse_ticks(path, path, columns, skip_rows=1 if has_header else 0)
+
+
+def parse_ticks(source, path, columns, skip_rows=0):
+    """
+    Parse tick CSV rows from a file or an in-memory block of complete lines.
+    Args:
+        source: Path, or file-like object (e.g. `pa.BufferReader`) holding the rows.
+        path (str): The source file's path, for its period and in warnings.
+        columns (list): Column names of the rows.
+        skip_rows (int): Leading lines to skip (the header).
+
+    Returns:
+        pd.DataFrame: Typed ticks, as described in `parse_csv`.
+    """
+    column_types = {name: pa.float64() for name in columns}
+    column_types["timestamp"] = pa.binary()
+    table = pv.read_csv(
+        source,
+        read_options=pv.ReadOptions(
+            column_names=columns,
+            skip_rows=skip_rows,
+        ),
+        convert_options=pv.ConvertOptions(column_types=column_types),
+    )
+    time_ns, malformed = parse_time_column(table.column("timestamp"))
+    data = table.drop(["timestamp"]).to_pandas()
+    data["time_ns"] = time_ns
+    data["timestamp"] = to_datetime64(time_ns, period_from_path(path))
+    if malformed.any():
+        warnings.warn(f"{path}: dropped {int(malformed.sum())} rows with a malformed timestamp")
+        data = data[~malformed].reset_index(drop=True)
+    return data
+
+
+def write_cache(path, data, cached, version=CACHE_VERSION):
+    """
+    Write a Parquet file derived from `path`, stamped with the source's
+    mtime/size and the layout version so `is_fresh` can check it later.
+    """
+    mtime, size = _source_signature(path)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"cache_version": str(version).encode(),
+        b"source_mtime_ns": mtime.encode(),
+        b"source_size": size.encode(),
+    })
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    # Write next to the target and swap it in so concurrent readers never see half a file
+    tmp_path = f"{cached}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, cached)
+
+
+def read_tick_file(path, columns=None, time_range=None):
+    """
+    Read one tick CSV through the Parquet cache, converting it on first access.
+    Args:
+        path (str): Path to the source CSV.
+        columns (list): Optional subset of columns to read.
+        time_range (tuple): Optional inclusive (start, end) bounds on `time_ns`;
+            either end may be None. Pushed down into the Parquet reader.
+
+    Returns:
+        pd.DataFrame: Typed tick data.
+    """
+    filters = []
+    if time_range is not None:
+        start, end = time_range
+        if start is not None:
+            filters.append(("time_ns", ">=", int(start)))
+        if end is not None:
+            filters.append(("time_ns", "<=", int(end)))
+
+    cached = cache_path(path)
+    if is_fresh(path, cached):
+        return pd.read_parquet(cached, columns=columns, filters=filters or None)
+    data = parse_csv(path)
+    write_cache(path, data, cached)
+    for name, op, value in filters:
+        data = data[data[name] >= value] if op == ">=" else data[data[name] <= value]
+    data = data.reset_index(drop=True)
+    return data[columns] if columns else data
+
+
+def _concat(frames, columns):
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_stock(directory, stock, period, columns=None):
+    """
+    Load the market data of a single stock in a selected period.
+    """
+    files = list_files(directory, period, stock, "market_data")
+    return _concat([read_tick_file(f, columns) for f in files], columns or MARKET_COLUMNS)
+
+
+def load_trades(directory, stock, period, columns=None):
+    """
+    Load the trade data of a single stock in a selected period.
+    """
+    files = list_files(directory, period, stock, "trade_data")
+    return _concat([read_tick_file(f, columns) for f in files], columns or TRADE_COLUMNS)
+
+
+def load_period(directory, stocks, period):
+    """
+    Load the market data of several stocks in one period.
+
+    Returns:
+        dict: Stock symbol -> DataFrame, for stocks with data only.
+    """
+    combined_data = {}
+    for stock in stocks:
+        stock_data = load_stock(directory, stock, period)
+        if not stock_data.empty:
+            combined_data[stock] = stock_data
+    return combined_data
+
+
+def _build_cache(path):
+    # Runs inside the worker processes: parse the CSV and write its Parquet copy
+    write_cache(path, parse_csv(path), cache_path(path))
+
+
+def build_caches(paths, max_workers=None):
+    """
+    Make sure every path has a fresh Parquet copy, fanning the CSV parsing of
+    stale files out over a process pool.
+    Args:
+        paths (list): Source CSV paths.
+        max_workers (int): Pool size; None uses every core and 0 or 1 parses serially.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    stale = [path for path in paths if not is_fresh(path, cache_path(path))]
+    if stale:
+        stage("Converting new CSV files", len(stale))
+    max_workers = min(max_workers, len(stale))
+    if max_workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                for _ in executor.map(_build_cache, stale):
+                    advance()
+            return
+        except (OSError, BrokenProcessPool):
+            # No usable process pool here (e.g. no /dev/shm); parse serially instead
+            pass
+    for path in stale:
+        _build_cache(path)
+        advance()
+
+
+def read_tick_files(paths, max_workers=None):
+    """
+    Read several tick files, building any stale Parquet copies in parallel
+    first (see `build_caches`).
+
+    Returns:
+        list: One DataFrame per path, in the order of `paths`.
+    """
+    build_caches(paths, max_workers)
+    return [read_tick_file(path) for path in paths]
+
+
+def assemble(frames, labels):
+    """
+    Copy per-file frames into preallocated column buffers, adding `stock`
+    and `period` as categoricals.
+    Args:
+        frames (list): Frames with the same columns.
+        labels (list): (stock, period) of every frame.
+
+    Returns:
+        pd.DataFrame: The frames, one after the other.
+    """
+    columns = list(frames[0].columns)
+    lengths = [len(frame) for frame in frames]
+    total = sum(lengths)
+    buffers = {name: np.empty(total, dtype=frames[0][name].dtype) for name in columns}
+    stocks = natural_sort({stock for stock, _ in labels})
+    periods = natural_sort({period for _, period in labels})
+    stock_codes = np.empty(total, dtype=np.int8)
+    period_codes = np.empty(total, dtype=np.int8)
+
+    start = 0
+    for frame, (stock, period), length in zip(frames, labels, lengths):
+        end = start + length
+        for name in columns:
+            buffers[name][start:end] = frame[name].to_numpy()
+        stock_codes[start:end] = stocks.index(stock)
+        period_codes[start:end] = periods.index(period)
+        start = end
+
+    data = pd.DataFrame(buffers, copy=False)
+    data["stock"] = pd.Categorical.from_codes(stock_codes, categories=stocks)
+    data["period"] = pd.Categorical.from_codes(period_codes, categories=periods)
+    return data
+
+
+def load_all_data(directory, stocks=None, max_workers=None):
+    """
+    Load and combine market data for all periods and selected stocks.
+    Args:
+        directory (str): Path to the data directory.
+        stocks (list): Stock symbols to load, or None for every stock folder found.
+        max_workers (int): Parsing processes; None uses every core and 0 or 1
+            loads serially.
+
+    Returns:
+        pd.DataFrame: Combined DataFrame ordered by (period, stock, file index),
+        with categorical `stock` and `period` columns.
+    """
+    paths, labels = list_all_files(directory, stocks)
+    frames = read_tick_files(paths, max_workers)
+    kept = [(frame, label) for frame, label in zip(frames, labels) if not frame.empty]
+    if not kept:
+        return pd.DataFrame()
+    return assemble([frame for frame, _ in kept], [label for _, label in kept])
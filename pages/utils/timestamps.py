@@ -0,0 +1,130 @@
+"""
+Vectorised parser for the `HH:MM:SS.fffffffff` tick timestamps.
+
+The tick files only carry a time of day, so each value is turned into int64
+nanoseconds since the start of the session day, and the day itself comes from
+the `PeriodNN` folder the file sits in. Parsing works on the raw bytes of an
+Arrow string/binary column in bulk, without creating a Python object per row.
+"""
+import os
+import re
+
+import numpy as np
+import pyarrow as pa
+
+TIME_WIDTH = 18  # len("08:40:00.011740370")
+NS_PER_SECOND = 1_000_000_000
+
+# The data carries no calendar dates: period N is placed on day N after this
+# epoch so that periods stay ordered and apart on a shared datetime axis.
+SESSION_EPOCH = np.datetime64("2000-01-01", "ns")
+
+_DIGIT_POSITIONS = np.array([0, 1, 3, 4, 6, 7, 9, 10, 11, 12, 13, 14, 15, 16, 17])
+_SEPARATORS = {2: ord(":"), 5: ord(":"), 8: ord(".")}
+_FRACTION_WEIGHTS = 10 ** np.arange(8, -1, -1, dtype=np.int64)
+
+
+def parse_time_bytes(chars):
+    """
+    Parse a block of fixed-width `HH:MM:SS.fffffffff` values.
+    Args:
+        chars (np.ndarray): uint8 array of shape (n, 18), one timestamp per row.
+
+    Returns:
+        tuple: (int64 nanoseconds since midnight, bool mask of malformed rows).
+        Malformed rows get 0 nanoseconds.
+    """
+    chars = np.asarray(chars, dtype=np.uint8).reshape(-1, TIME_WIDTH)
+    digits = chars.astype(np.int64) - ord("0")
+
+    bad = ((digits[:, _DIGIT_POSITIONS] < 0) | (digits[:, _DIGIT_POSITIONS] > 9)).any(axis=1)
+    for position, separator in _SEPARATORS.items():
+        bad |= chars[:, position] != separator
+
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 3] * 10 + digits[:, 4]
+    seconds = digits[:, 6] * 10 + digits[:, 7]
+    bad |= (hours > 23) | (minutes > 59) | (seconds > 59)
+
+    ns = ((hours * 60 + minutes) * 60 + seconds) * NS_PER_SECOND + digits[:, 9:] @ _FRACTION_WEIGHTS
+    ns[bad] = 0
+    return ns, bad
+
+
+def _parse_chunk(chunk):
+    n = len(chunk)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+    if pa.types.is_large_string(chunk.type) or pa.types.is_large_binary(chunk.type):
+        offset_type = np.int64
+    else:
+        offset_type = np.int32
+    validity, offsets_buffer, data_buffer = chunk.buffers()[:3]
+    offsets = np.frombuffer(offsets_buffer, dtype=offset_type)[chunk.offset:chunk.offset + n + 1]
+    data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.empty(0, np.uint8)
+
+    starts = offsets[:-1].astype(np.int64)
+    wrong_width = np.diff(offsets) != TIME_WIDTH
+    if validity is not None:
+        wrong_width |= chunk.is_null().to_numpy(zero_copy_only=False)
+    if len(data) < TIME_WIDTH:
+        return np.zeros(n, dtype=np.int64), np.ones(n, dtype=bool)
+    # Point rows of the wrong width at a safe window; they are masked below
+    starts = np.where(wrong_width, 0, starts)
+    chars = data[starts[:, None] + np.arange(TIME_WIDTH)]
+
+    ns, bad = parse_time_bytes(chars)
+    bad |= wrong_width
+    ns[bad] = 0
+    return ns, bad
+
+
+def parse_time_column(column):
+    """
+    Parse an Arrow string/binary column of tick timestamps.
+    Args:
+        column (pa.Array or pa.ChunkedArray): Raw timestamp strings.
+
+    Returns:
+        tuple: (int64 nanoseconds since midnight, bool mask of malformed rows).
+    """
+    chunks = column.chunks if isinstance(column, pa.ChunkedArray) else [column]
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+    parsed = [_parse_chunk(chunk) for chunk in chunks]
+    return np.concatenate([p[0] for p in parsed]), np.concatenate([p[1] for p in parsed])
+
+
+def period_number(period):
+    """
+    Number of a `PeriodNN` name, e.g. 16 for "Period16".
+    """
+    match = re.search(r"Period(\d+)", period)
+    if match is None:
+        raise ValueError(f"Not a PeriodNN name: {period!r}")
+    return int(match.group(1))
+
+
+def period_from_path(path):
+    """
+    The `PeriodNN` folder a tick file sits in, or None.
+    """
+    for part in reversed(os.path.normpath(path).split(os.sep)):
+        if re.fullmatch(r"Period\d+", part):
+            return part
+    return None
+
+
+def period_date(period):
+    """
+    Session date of a period as a datetime64[ns] midnight.
+    """
+    return SESSION_EPOCH + np.timedelta64(period_number(period), "D")
+
+
+def to_datetime64(ns, period=None):
+    """
+    Combine nanoseconds since midnight with a period's session date.
+    """
+    base = period_date(period) if period is not None else SESSION_EPOCH
+    return base + np.asarray(ns, dtype=np.int64).astype("timedelta64[ns]")
@@ -0,0 +1,181 @@
+"""
+Trades joined to the quote prevailing when they happened.
+
+The trade_data files (price, volume, timestamp) were never linked to the
+market_data quotes. `join_trades` attaches to every trade the latest bid/ask
+at or before its timestamp. Within a stock and period both files are already
+time ordered, so the join is a merge of two sorted int64 `time_ns` arrays:
+`np.searchsorted` finds each trade's quote in O(trades x log quotes). There
+is no sort and no per-row Python object, and the ~80k trades of a period
+join against millions of quotes in milliseconds.
+
+From the prevailing quote every trade gets:
+
+- `direction`: +1 for a buy, -1 for a sell (Lee-Ready). A trade above the
+  mid is a buy, one below is a sell, and one at the mid (or before the first
+  quote) takes the sign of the last price change (tick test). It is 0 when
+  neither applies;
+- `effective_spread`: 2 x direction x (price - mid) / mid, the round-trip cost
+  relative to the mid;
+- `signed_volume`: direction x volume.
+
+`add_trade_features` turns the joined trades back into columns on the quote
+rows: the signed volume and number of trades over the last `w` quote ticks,
+using only trades before each quote. `feature_store.materialize(trades=True)`
+stores them next to the other features for the sharp change model.
+"""
+import numpy as np
+
+from pages.utils.features import WINDOWS
+from pages.utils.tick_store import load_stock, load_trades
+
+QUOTE_COLUMNS = ["bidPrice", "askPrice", "time_ns"]
+TRADE_FIELDS = ["price", "volume", "time_ns"]
+
+
+def _check_sorted(times, name):
+    if len(times) > 1 and (times[1:] < times[:-1]).any():
+        raise ValueError(f"{name} must be sorted by time_ns")
+
+
+def asof_positions(left, right):
+    """
+    Position in `right` of the last entry at or before each entry of `left`.
+    Args:
+        left (np.ndarray): Sorted int64 times, e.g. of trades.
+        right (np.ndarray): Sorted int64 times, e.g. of quotes.
+
+    Returns:
+        np.ndarray: int64 positions, -1 where `right` has nothing that early.
+    """
+    left = np.asarray(left, dtype=np.int64)
+    right = np.asarray(right, dtype=np.int64)
+    _check_sorted(left, "left")
+    _check_sorted(right, "right")
+    return np.searchsorted(right, left, side="right").astype(np.int64) - 1
+
+
+def tick_test(prices):
+    """
+    Sign of the last nonzero price change up to each trade; 0 before the first.
+    """
+    change = np.sign(np.diff(prices, prepend=np.nan))
+    moved = np.flatnonzero(change != 0)
+    moved = moved[~np.isnan(change[moved])]
+    last = np.full(len(prices), -1)
+    last[moved] = moved
+    last = np.maximum.accumulate(last) if len(last) else last
+    return np.where(last >= 0, change[np.maximum(last, 0)], 0).astype(np.int8)
+
+
+def classify_trades(prices, mids):
+    """
+    Lee-Ready trade direction: quote rule against the mid, tick test at the mid.
+    Args:
+        prices (np.ndarray): Trade prices, time ordered.
+        mids (np.ndarray): Prevailing mid of each trade, NaN when unknown.
+
+    Returns:
+        np.ndarray: int8 direction, +1 buy, -1 sell, 0 unknown.
+    """
+    direction = tick_test(prices)
+    above, below = prices > mids, prices < mids
+    direction[above] = 1
+    direction[below] = -1
+    return direction
+
+
+def join_trades(trades, quotes):
+    """
+    Attach the prevailing quote to every trade of one stock and period.
+    Args:
+        trades (pd.DataFrame): price, volume and time_ns, time ordered.
+        quotes (pd.DataFrame): bidPrice, askPrice and time_ns, time ordered.
+
+    Returns:
+        pd.DataFrame: The trades with `quote` (row position in `quotes`,
+        -1 before the first quote), bidPrice, askPrice, midPrice, direction,
+        effective_spread and signed_volume. The quote columns are NaN before
+        the first quote.
+    """
+    positions = asof_positions(trades["time_ns"].to_numpy(), quotes["time_ns"].to_numpy())
+    found = positions >= 0
+    prevailing = {}
+    for name in ("bidPrice", "askPrice"):
+        values = np.full(len(positions), np.nan)
+        values[found] = quotes[name].to_numpy(dtype=np.float64)[positions[found]]
+        prevailing[name] = values
+    mid = (prevailing["bidPrice"] + prevailing["askPrice"]) / 2
+    price = trades["price"].to_numpy(dtype=np.float64)
+    direction = classify_trades(price, mid)
+
+    joined = trades.copy()
+    joined["quote"] = positions
+    joined["bidPrice"] = prevailing["bidPrice"]
+    joined["askPrice"] = prevailing["askPrice"]
+    joined["midPrice"] = mid
+    joined["direction"] = direction
+    joined["effective_spread"] = 2 * direction * (price - mid) / mid
+    joined["signed_volume"] = direction * trades["volume"].to_numpy(dtype=np.float64)
+    return joined
+
+
+def load_joined_trades(directory, stock, period):
+    """
+    A stock's trades in one period joined to its quotes (see `join_trades`).
+
+    Returns:
+        tuple: (joined trades, quotes with QUOTE_COLUMNS).
+    """
+    quotes = load_stock(directory, stock, period, QUOTE_COLUMNS)
+    trades = load_trades(directory, stock, period)
+    return join_trades(trades, quotes), quotes
+
+
+def trade_feature_columns(windows=WINDOWS):
+    """
+    Names of the columns `add_trade_features` adds, in order.
+    """
+    return [f"signed_volume_{w}" for w in windows] + [f"trades_{w}" for w in windows]
+
+
+def add_trade_features(quotes, joined, windows=WINDOWS):
+    """
+    Order flow of the joined trades as columns on the quote rows.
+
+    A trade counts towards the first quote after its prevailing one, so a
+    quote's features only use trades that happened before it.
+    Args:
+        quotes (pd.DataFrame): The quotes the trades were joined to, same rows and order.
+        joined (pd.DataFrame): Output of `join_trades`.
+        windows (tuple): Window lengths in quote ticks.
+
+    Returns:
+        pd.DataFrame: `quotes` with signed_volume_<w> and trades_<w> added;
+        NaN where the window is not full yet.
+    """
+    n = len(quotes)
+    # Trades before the first quote count towards it, those after the last quote towards nothing
+    slots = joined["quote"].to_numpy() + 1
+    volume = np.bincount(slots, weights=joined["signed_volume"].to_numpy(), minlength=n + 1)[:n]
+    count = np.bincount(slots, minlength=n + 1)[:n].astype(np.float64)
+    out = quotes.copy()
+    for name, values in (("signed_volume", volume), ("trades", count)):
+        sums = np.concatenate([[0.0], np.cumsum(values)])
+        for w in windows:
+            column = np.full(n, np.nan)
+            if n >= w:
+                column[w - 1:] = sums[w:] - sums[:-w]
+            out[f"{name}_{w}"] = column
+    return out
+
+
+def trade_features(quotes, trades, windows=WINDOWS):
+    """
+    `add_trade_features` of one stock and period's trades joined to its quotes.
+    Args:
+        quotes (pd.DataFrame): Quotes with QUOTE_COLUMNS, time ordered.
+        trades (pd.DataFrame): Trades with TRADE_FIELDS, time ordered; may be empty.
+        windows (tuple): Window lengths in quote ticks.
+    """
+    return add_trade_features(quotes, join_trades(trades, quotes), windows)